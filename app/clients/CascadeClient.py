@@ -0,0 +1,151 @@
+import logging
+import threading
+from collections import Counter
+from typing import Optional
+
+from app.models.schemas import CascadeEvaluationResponse
+from app.services.GradingCache import client_fingerprint
+from app.utils.normalization import canonical_tokens
+
+""" Grades with a cheap model first and escalates only uncertain answers to stronger models. """
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIDENCE_THRESHOLD = 0.8
+
+# OpenAI models of MODEL_CONFIG from cheapest to strongest, for `CascadeClient.openai`
+OPENAI_TIERS = ('gpt-4o-mini', 'gpt-4o')
+
+# Reasons an answer is passed on to the next tier
+ESCALATE_LOW_CONFIDENCE = 'low_confidence'
+ESCALATE_DISAGREEMENT = 'disagreement'
+ESCALATE_ERROR = 'unparseable'
+
+
+def deterministic_grade(model: str, student: str) -> Optional[str]:
+    """
+    Grade suggested by token overlap alone: 'Pass' if the student answer contains every token of the
+    model answer, 'Fail' if it shares none of them, else None. Only used to second-guess a model's grade.
+    """
+    expected = set(canonical_tokens(model))
+    if not expected:
+        return None
+    given = set(canonical_tokens(student))
+    if expected <= given:
+        return "Pass"
+    if not expected & given:
+        return "Fail"
+    return None
+
+
+class CascadeClient:
+    """
+    Client with the evaluate/evaluation_review interface that grades with a list of clients ordered
+    from cheapest to strongest. Every answer is graded by the first tier; it is re-graded by the next
+    tier when the grade's confidence is below `confidence_threshold` (or missing), when it contradicts
+    `deterministic_grade`, or when the response could not be parsed. The last tier's grade is final.
+    Responses are CascadeEvaluationResponse objects whose `tier` names the model that decided.
+    Reviews go to the strongest tier.
+    Packed and batch grading are not supported, since every answer needs its own escalation decision.
+    """
+    def __init__(self, tiers: list, confidence_threshold: float = DEFAULT_CONFIDENCE_THRESHOLD):
+        if not tiers:
+            raise ValueError("At least one tier is required.")
+        self.tiers = list(tiers)
+        self.confidence_threshold = confidence_threshold
+        self.decided = Counter()
+        self.escalations = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def openai(cls, api_key: str, models=OPENAI_TIERS, confidence_threshold: float = DEFAULT_CONFIDENCE_THRESHOLD,
+               **client_kwargs):
+        """ Cascade over OpenAPIClient instances of the given MODEL_CONFIG models, cheapest first. """
+        from app.clients.OpenAPIClient import OpenAPIClient
+        return cls([OpenAPIClient(model, api_key, **client_kwargs) for model in models], confidence_threshold)
+
+    @staticmethod
+    def _name(client) -> str:
+        model = client.get_model() if hasattr(client, 'get_model') else None
+        return model or type(client).__name__
+
+    def get_model(self):
+        """ Models of every tier, cheapest first. """
+        return " > ".join(self._name(client) for client in self.tiers)
+
+    def get_config(self) -> dict:
+        """ Configuration of every tier and the escalation threshold, so cached grades are keyed on both. """
+        return {
+            "tiers": [client_fingerprint(client) for client in self.tiers],
+            "confidence_threshold": self.confidence_threshold,
+        }
+
+    def format_prompt(self, question, model, student) -> str:
+        """ Prompt of the first tier, which every answer is sent to, e.g. for token estimates. """
+        return self.tiers[0].format_prompt(question, model, student)
+
+    def report(self) -> dict:
+        """ Answers decided by each tier, and escalations by reason. """
+        with self._lock:
+            return {"decided": dict(self.decided), "escalations": dict(self.escalations)}
+
+    def _escalation(self, evaluation_response, model, student) -> Optional[str]:
+        """ Why a grade should be passed on to the next tier, or None to keep it. """
+        confidence = evaluation_response.confidence
+        if confidence is None or confidence < self.confidence_threshold:
+            return ESCALATE_LOW_CONFIDENCE
+        expected = deterministic_grade(model, student)
+        if expected is not None and expected.lower() != (evaluation_response.grade or "").strip().lower():
+            return ESCALATE_DISAGREEMENT
+        return None
+
+    def _decide(self, tier: int, result, model, student) -> Optional[CascadeEvaluationResponse]:
+        """ The final response if tier `tier` decided, else None after counting the escalation. """
+        client = self.tiers[tier]
+        last = tier == len(self.tiers) - 1
+        if isinstance(result, Exception):
+            if last:
+                raise result
+            reason = ESCALATE_ERROR
+        else:
+            reason = None if last else self._escalation(result, model, student)
+        with self._lock:
+            if reason is None:
+                self.decided[self._name(client)] += 1
+            else:
+                self.escalations[reason] += 1
+        if reason is not None:
+            logger.debug("Escalating from %s (%s).", self._name(client), reason)
+            return None
+        return CascadeEvaluationResponse(**result.model_dump(), tier=self._name(client))
+
+    def evaluate(self, question, model, student) -> CascadeEvaluationResponse:
+        """ Grade with the cheapest tier, escalating uncertain answers. """
+        for tier, client in enumerate(self.tiers):
+            try:
+                result = client.evaluate(question, model, student)
+            except ValueError as e:
+                result = e
+            decision = self._decide(tier, result, model, student)
+            if decision is not None:
+                return decision
+
+    async def evaluate_async(self, question, model, student) -> CascadeEvaluationResponse:
+        """ Asynchronous variant of `evaluate`. """
+        for tier, client in enumerate(self.tiers):
+            try:
+                result = await client.evaluate_async(question, model, student)
+            except ValueError as e:
+                result = e
+            decision = self._decide(tier, result, model, student)
+            if decision is not None:
+                return decision
+
+    def evaluation_review(self, question, model, student, evaluation):
+        """ Review a previous evaluation with the strongest tier. """
+        return self.tiers[-1].evaluation_review(question, model, student, evaluation)
+
+    async def evaluation_review_async(self, question, model, student, evaluation):
+        """ Asynchronous variant of `evaluation_review`. """
+        return await self.tiers[-1].evaluation_review_async(question, model, student, evaluation)
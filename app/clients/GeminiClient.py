@@ -1,52 +1,114 @@
+from functools import lru_cache
+
 from google import genai
 from google.genai import types
 from pydantic import ValidationError
 
-from app.models.schemas import EvaluationResponse
+import app.config.prompts as p
+from app.clients.prompt_assembly import PromptAssembler
+from app.clients.transport import shared_transport
+from app.models.schemas import EvaluationResponse, ReviewResponse
+from app.utils.metrics import metrics
 
 """ Implements a client for interacting with Google's Gemini API to evaluate student answers"""
 
 
+# Model configuration used for every Gemini evaluation request
+GEMINI_CONFIG = {
+    'model': "gemini-2.5-flash",
+    'temperature': 0.0,
+    'max_output_tokens': 150,
+    'system_prompt': p.SYSTEM_PROMPT_EXAM_GRADER,
+    'prompt_template': p.PROMPT_4o_TEMPLATE,
+}
+
+# The system prompt is sent as the system instruction, so the assembled prompt holds no system messages
+_ASSEMBLER = PromptAssembler([], GEMINI_CONFIG['prompt_template'])
+
+
 class GeminiClient:
     """ Client for interacting with Google's Gemini API for evaluating student answers."""
-    def __init__(self, api_key: str):
-        """ Initialize the GeminiClient with an API key."""
+    def __init__(self, api_key: str, transport=None):
+        """
+        Initialize the GeminiClient with an API key.
+        `transport` is the SharedTransport whose connection pool requests go through;
+        by default the process-wide one, shared with every other client.
+        """
         if not api_key:
             raise ValueError("An API key is required to initialize the client.")
-        self._api_key = api_key
-        self.client = genai.Client(api_key=self._api_key)
+        self._transport = transport or shared_transport()
+        self.set_api_key(api_key)
 
     def set_api_key(self, api_key: str):
-        """ Set or update the API key for the GeminiClient."""
+        """ Set or update the API key for the GeminiClient. Connections in the shared pool are kept."""
         if not api_key:
             raise ValueError("API key cannot be empty.")
         self._api_key = api_key
-        self.client = genai.Client(api_key=self._api_key)
+        self.client = self._build_client(self._transport.async_client())
 
-    def evaluate(self, question, model, student):
-        """ Evaluate a student answer against the question and model answer."""
-        prompt = f"""
-            Based on the question and model answer, grade the student answer as binary 'Pass/Fail' and give a simple explanation no more than 20 words.
+    def _build_client(self, async_http_client) -> genai.Client:
+        """ Build an SDK client sending its requests through the shared transport."""
+        self._async_http_client = async_http_client
+        return genai.Client(api_key=self._api_key, http_options=types.HttpOptions(
+            httpx_client=self._transport.client(),
+            httpx_async_client=async_http_client,
+        ))
 
-            Question: {question}
+    def _aio(self):
+        """ The async SDK interface on the transport's pool of the running event loop."""
+        http_client = self._transport.async_client()
+        if http_client is not self._async_http_client:
+            self.client = self._build_client(http_client)
+        return self.client.aio
 
-            Model answer: {model}
+    def get_model(self):
+        """ Get the current model name."""
+        return GEMINI_CONFIG.get('model')
 
-            Student answer: {student}
-            """
+    def get_config(self):
+        """ Get the current configuration dictionary."""
+        return GEMINI_CONFIG
 
-        config = types.GenerateContentConfig(
-            system_instruction="You are an expert exam grader.",
-            temperature=0.0,
-            max_output_tokens=150
-        )
+    @staticmethod
+    def _build_prompt(question, model, student) -> str:
+        """
+        Build the grading prompt for a single student answer.
+        Prompts for a question share a pre-rendered prefix (instructions, question, model answer),
+        which Gemini's implicit context caching can reuse.
+        """
+        return _ASSEMBLER.user_prompt(question, model, student)
+
+    def format_prompt(self, question, model, student) -> str:
+        """ Get the full prompt text sent for one evaluation, e.g. for token estimates."""
+        return GEMINI_CONFIG['system_prompt'] + "\n" + self._build_prompt(question, model, student)
 
-        response = self.client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config=config
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _build_config(response_schema=EvaluationResponse) -> types.GenerateContentConfig:
+        """ Build the generation config, constraining the output to the given response schema. Built once per schema."""
+        return types.GenerateContentConfig(
+            system_instruction=GEMINI_CONFIG['system_prompt'],
+            temperature=GEMINI_CONFIG['temperature'],
+            max_output_tokens=GEMINI_CONFIG['max_output_tokens'],
+            response_mime_type="application/json",
+            response_schema=response_schema,
         )
 
+    def _track_call(self):
+        """ Metrics context for one API request (see Metrics.track_call)."""
+        return metrics.track_call(type(self).__name__, self.get_model())
+
+    @staticmethod
+    def _record_usage(call, response) -> None:
+        """ Report the token counts of a Gemini response to the metrics call context."""
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            call.usage(usage.prompt_token_count, usage.candidates_token_count,
+                       getattr(usage, 'cached_content_token_count', None))
+
+    @staticmethod
+    def _parse_evaluation(response) -> EvaluationResponse:
+        """ Parse a Gemini response into an EvaluationResponse."""
         # Safely get the model output content
         try:
             content = response.text
@@ -54,9 +116,77 @@ class GeminiClient:
             content = ""
 
         try:
-            evaluation_response = EvaluationResponse.model_validate(content)
+            evaluation_response = EvaluationResponse.model_validate_json(content)
             return evaluation_response
         except ValidationError as e:
             raise ValueError(f"Failed to parse evaluation response: {e}")
         except Exception as e:
-            raise ValueError(f"An unexpected error occurred while parsing the response: {e}")
\ No newline at end of file
+            raise ValueError(f"An unexpected error occurred while parsing the response: {e}")
+
+    def evaluate(self, question, model, student):
+        """ Evaluate a student answer against the question and model answer."""
+        with self._track_call() as call:
+            response = self.client.models.generate_content(
+                model=GEMINI_CONFIG['model'],
+                contents=self._build_prompt(question, model, student),
+                config=self._build_config()
+            )
+            self._record_usage(call, response)
+        return self._parse_evaluation(response)
+
+    async def evaluate_async(self, question, model, student):
+        """ Asynchronous variant of `evaluate`, used by the concurrent grading engine."""
+        with self._track_call() as call:
+            response = await self._aio().models.generate_content(
+                model=GEMINI_CONFIG['model'],
+                contents=self._build_prompt(question, model, student),
+                config=self._build_config()
+            )
+            self._record_usage(call, response)
+        return self._parse_evaluation(response)
+
+    @staticmethod
+    def _build_review_prompt(question, model, student, evaluation) -> str:
+        """ Build the prompt for reviewing a previous evaluation."""
+        return p.PROMPT_REVIEW_TEMPLATE.format(
+            grade=evaluation.get('grade', ''),
+            explanation=evaluation.get('explanation', ''),
+            question=question,
+            model=model,
+            student=student
+        )
+
+    @staticmethod
+    def _parse_review(response) -> ReviewResponse:
+        """ Parse a Gemini response into a ReviewResponse."""
+        try:
+            content = response.text
+        except Exception:
+            content = ""
+
+        try:
+            return ReviewResponse.model_validate_json(content or "")
+        except ValidationError as e:
+            raise ValueError(f"Failed to parse review response: {e}")
+
+    def evaluation_review(self, question, model, student, evaluation) -> ReviewResponse:
+        """ Review a previous evaluation of a student answer."""
+        with self._track_call() as call:
+            response = self.client.models.generate_content(
+                model=GEMINI_CONFIG['model'],
+                contents=self._build_review_prompt(question, model, student, evaluation),
+                config=self._build_config(ReviewResponse)
+            )
+            self._record_usage(call, response)
+        return self._parse_review(response)
+
+    async def evaluation_review_async(self, question, model, student, evaluation) -> ReviewResponse:
+        """ Asynchronous variant of `evaluation_review`."""
+        with self._track_call() as call:
+            response = await self._aio().models.generate_content(
+                model=GEMINI_CONFIG['model'],
+                contents=self._build_review_prompt(question, model, student, evaluation),
+                config=self._build_config(ReviewResponse)
+            )
+            self._record_usage(call, response)
+        return self._parse_review(response)
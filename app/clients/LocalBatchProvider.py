@@ -0,0 +1,105 @@
+import io, json, os, time, uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+""" Local, file-based stand-in for the OpenAI files/batches endpoints, used to run batch mode offline. """
+
+
+def default_responder(body: dict) -> str:
+    """ Answer every request with a fixed, schema-valid evaluation. """
+    return json.dumps({"grade": "Pass", "explanation": "Graded by the local batch stand-in."})
+
+
+class _Files:
+    """ Mimics `client.files` for batch input and output files. """
+    def __init__(self, root: Path):
+        self._root = root
+
+    def create(self, file, purpose):
+        """ Store an uploaded file and return an object with its id. """
+        file_id = f"file-{uuid.uuid4().hex}"
+        (self._root / file_id).write_bytes(file.read())
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def content(self, file_id):
+        """ Return an object whose `text` is the stored file content. """
+        return SimpleNamespace(text=(self._root / file_id).read_text(encoding='utf-8'))
+
+
+class _Batches:
+    """ Mimics `client.batches`; jobs complete once `completion_delay` seconds have passed. """
+    def __init__(self, root: Path, files: _Files, responder, completion_delay: float):
+        self._root = root
+        self._files = files
+        self._responder = responder
+        self._completion_delay = completion_delay
+
+    def _state_path(self, batch_id) -> Path:
+        return self._root / f"{batch_id}.json"
+
+    def _save(self, state: dict) -> None:
+        self._state_path(state['id']).write_text(json.dumps(state), encoding='utf-8')
+
+    def create(self, input_file_id, endpoint, completion_window):
+        """ Register a batch job over a previously uploaded input file. """
+        state = {
+            "id": f"batch-{uuid.uuid4().hex}",
+            "status": "in_progress",
+            "endpoint": endpoint,
+            "completion_window": completion_window,
+            "input_file_id": input_file_id,
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": time.time(),
+        }
+        self._save(state)
+        return SimpleNamespace(**state)
+
+    def retrieve(self, batch_id):
+        """ Return the job state, running the job if it is due. """
+        state = json.loads(self._state_path(batch_id).read_text(encoding='utf-8'))
+        if state['status'] == 'in_progress' and time.time() - state['created_at'] >= self._completion_delay:
+            self._run(state)
+        return SimpleNamespace(**state)
+
+    def _run(self, state: dict) -> None:
+        """ Answer every request in the input file and write an output file in the batch output format. """
+        output = []
+        for line in self._files.content(state['input_file_id']).text.splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            content = self._responder(request['body'])
+            output.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": request['custom_id'],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "model": request['body'].get('model'),
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                    },
+                },
+                "error": None,
+            }))
+        output_file = self._files.create(file=io.BytesIO("\n".join(output).encode('utf-8')), purpose='batch_output')
+        state['status'] = 'completed'
+        state['output_file_id'] = output_file.id
+        self._save(state)
+
+
+class LocalBatchProvider:
+    """
+    Drop-in replacement for the `files` and `batches` endpoints of the OpenAI client.
+    State lives under `root`, so a run can be polled and merged again after a restart.
+    Args:
+        root (str): Directory holding uploaded files and batch state.
+        responder (callable): Maps a chat completion request body to the message content to return.
+        completion_delay (float): Seconds before a submitted batch reports as completed.
+    """
+    def __init__(self, root='target/local_batches', responder=default_responder, completion_delay=0.0):
+        path = Path(root)
+        os.makedirs(path, exist_ok=True)
+        self.files = _Files(path)
+        self.batches = _Batches(path, self.files, responder, completion_delay)
@@ -0,0 +1,195 @@
+import os
+from pydantic import ValidationError
+import app.config.prompts as p
+from app.clients.prompt_assembly import PromptAssembler
+from app.clients.transport import shared_transport
+from app.models.schemas import EvaluationResponse, ReviewResponse
+from app.utils.metrics import metrics
+
+""" Implements a client for grading student answers with models served locally by Ollama. """
+
+
+DEFAULT_OLLAMA_HOST = 'http://localhost:11434'
+
+# Predefined model configurations; any model pulled into Ollama can be added here
+OLLAMA_MODEL_CONFIG = {
+    'llama3.1:8b': {
+        'model': "llama3.1:8b",
+        'temperature': 0.0,
+        'num_predict': 150,
+        'num_ctx': 4096,
+        'keep_alive': "30m",
+        'timeout': 300.0,
+        'system_prompt': [p.SYSTEM_PROMPT_EXAM_GRADER],
+        'prompt_template': p.PROMPT_4o_mini_TEMPLATE,
+    },
+    'qwen2.5:7b': {
+        'model': "qwen2.5:7b",
+        'temperature': 0.0,
+        'num_predict': 150,
+        'num_ctx': 4096,
+        'keep_alive': "30m",
+        'timeout': 300.0,
+        'system_prompt': [p.SYSTEM_PROMPT_EXAM_GRADER],
+        'prompt_template': p.PROMPT_4o_mini_TEMPLATE,
+    },
+}
+
+
+# JSON schemas sent as Ollama's `format`, rendered once
+RESPONSE_SCHEMAS = {schema: schema.model_json_schema() for schema in (EvaluationResponse, ReviewResponse)}
+
+
+class OllamaError(Exception):
+    """ Error response of the Ollama server, shaped like an SDK API error so RateLimitedClient can retry it. """
+    def __init__(self, status_code: int, message: str = ""):
+        super().__init__(f"Ollama request failed with status {status_code}: {message}")
+        self.status_code = status_code
+
+
+class OllamaClient:
+    """
+    Client for grading with a local Ollama server through its /api/chat endpoint.
+    Outputs are constrained to the EvaluationResponse/ReviewResponse JSON schema with Ollama's `format`.
+    Every request asks the server to keep the model loaded for `keep_alive`, and `load` loads it
+    before the first answer, so grading never waits for the model to be read from disk.
+    Requests go through the shared keep-alive connection pool, so the async grading engine can keep
+    several requests in flight; set its max_concurrency to the server's OLLAMA_NUM_PARALLEL so
+    every slot stays busy while the next requests queue on the server.
+    """
+    def __init__(self, model='llama3.1:8b', host=None, transport=None):
+        """
+        Initialize the OllamaClient with a model from OLLAMA_MODEL_CONFIG.
+        `host` defaults to the OLLAMA_HOST environment variable, else http://localhost:11434.
+        `transport` is the SharedTransport whose connection pool requests go through.
+        """
+        self.set_model(model)
+        self.host = (host or os.getenv('OLLAMA_HOST') or DEFAULT_OLLAMA_HOST).rstrip('/')
+        self._transport = transport or shared_transport()
+
+    def set_model(self, model):
+        """ Set or update the model configuration for the client. """
+        if model not in OLLAMA_MODEL_CONFIG:
+            raise ValueError(f"Model '{model}' is not supported.")
+        self.config = OLLAMA_MODEL_CONFIG.get(model)
+        self._assembler = PromptAssembler(self.config.get('system_prompt', []), self.config.get('prompt_template'))
+        self._options = {k: self.config[k] for k in ('temperature', 'num_predict', 'num_ctx') if k in self.config}
+
+    def get_model(self):
+        """ Get the current model name. """
+        return self.config.get('model')
+
+    def get_config(self):
+        """ Get the current configuration dictionary. """
+        return self.config
+
+    def format_prompt(self, question, model, student) -> str:
+        """ Get the full prompt text sent for one evaluation, e.g. for token estimates. """
+        return "\n".join(message["content"] for message in self._assembler.messages(question, model, student))
+
+    def _body(self, messages, response_format) -> dict:
+        """ Build the /api/chat request body for one non-streamed, schema-constrained completion. """
+        return {
+            "model": self.get_model(),
+            "messages": messages,
+            "stream": False,
+            "format": RESPONSE_SCHEMAS[response_format],
+            "options": self._options,
+            "keep_alive": self.config.get('keep_alive'),
+        }
+
+    def _review_messages(self, question, model, student, evaluation) -> list:
+        """ Build the chat messages for reviewing a previous evaluation. """
+        return [*self._assembler.system_messages, {"role": "user", "content": p.PROMPT_REVIEW_TEMPLATE.format(
+            grade=evaluation.get('grade', ''),
+            explanation=evaluation.get('explanation', ''),
+            question=question,
+            model=model,
+            student=student
+        )}]
+
+    def _track_call(self):
+        """ Metrics context for one API request (see Metrics.track_call). """
+        return metrics.track_call(type(self).__name__, self.get_model())
+
+    @staticmethod
+    def _content(call, response) -> str:
+        """ Check an /api/chat response, report its token counts and return the message content. """
+        if response.status_code != 200:
+            raise OllamaError(response.status_code, response.text)
+        data = response.json()
+        call.usage(data.get('prompt_eval_count'), data.get('eval_count'))
+        return (data.get('message') or {}).get('content') or ""
+
+    @staticmethod
+    def _parse(content, schema):
+        """ Parse model output into the given response schema. """
+        try:
+            return schema.model_validate_json(content)
+        except ValidationError as e:
+            raise ValueError(f"Failed to parse {schema.__name__}: {e}")
+
+    def _chat(self, messages, schema):
+        """ Send one chat request and parse its output into `schema`. """
+        with self._track_call() as call:
+            response = self._transport.client().post(
+                f"{self.host}/api/chat", json=self._body(messages, schema), timeout=self.config.get('timeout'))
+            content = self._content(call, response)
+        return self._parse(content, schema)
+
+    async def _chat_async(self, messages, schema):
+        """ Asynchronous variant of `_chat`. """
+        with self._track_call() as call:
+            response = await self._transport.async_client().post(
+                f"{self.host}/api/chat", json=self._body(messages, schema), timeout=self.config.get('timeout'))
+            content = self._content(call, response)
+        return self._parse(content, schema)
+
+    def load(self) -> None:
+        """ Load the model into memory and keep it resident for `keep_alive`, e.g. before grading starts. """
+        response = self._transport.client().post(
+            f"{self.host}/api/generate", json={"model": self.get_model(), "keep_alive": self.config.get('keep_alive')},
+            timeout=self.config.get('timeout'))
+        if response.status_code != 200:
+            raise OllamaError(response.status_code, response.text)
+
+    def unload(self) -> None:
+        """ Release the model's memory on the server. """
+        response = self._transport.client().post(
+            f"{self.host}/api/generate", json={"model": self.get_model(), "keep_alive": 0},
+            timeout=self.config.get('timeout'))
+        if response.status_code != 200:
+            raise OllamaError(response.status_code, response.text)
+
+    def evaluate(self, question, model, student) -> EvaluationResponse:
+        """
+        Evaluate a student's answer against the model answer for a given question.
+        Args:
+            question (str): The question text.
+            model (str): The model answer text.
+            student (str): The student's answer text.
+        Returns:
+            EvaluationResponse: The evaluation result containing grade and explanation.
+        """
+        return self._chat(self._assembler.messages(question, model, student), EvaluationResponse)
+
+    async def evaluate_async(self, question, model, student) -> EvaluationResponse:
+        """ Asynchronous variant of `evaluate`, used by the concurrent grading engine. """
+        return await self._chat_async(self._assembler.messages(question, model, student), EvaluationResponse)
+
+    def evaluation_review(self, question, model, student, evaluation) -> ReviewResponse:
+        """
+        Review a previous evaluation of a student's answer.
+        Args:
+            question (str): The question text.
+            model (str): The model answer text.
+            student (str): The student's answer text.
+            evaluation (dict): The previous evaluation containing 'grade' and 'explanation'.
+        Returns:
+            ReviewResponse: Whether the reviewer agrees with the grade, and why.
+        """
+        return self._chat(self._review_messages(question, model, student, evaluation), ReviewResponse)
+
+    async def evaluation_review_async(self, question, model, student, evaluation) -> ReviewResponse:
+        """ Asynchronous variant of `evaluation_review`, used by the concurrent review pass. """
+        return await self._chat_async(self._review_messages(question, model, student, evaluation), ReviewResponse)
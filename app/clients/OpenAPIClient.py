@@ -1,13 +1,21 @@
-from openai import OpenAI
+import json, os, time
+from pathlib import Path
+from openai import OpenAI, AsyncOpenAI, LengthFinishReasonError
 from pydantic import ValidationError
 import app.config.prompts as p
-from app.models.schemas import EvaluationResponse
+from app.clients.prompt_assembly import PromptAssembler
+from app.clients.transport import shared_transport
+from app.models.schemas import EvaluationResponse, PackedEvaluationResponse, ReviewResponse
+from app.utils.metrics import metrics
 
 """ Implements a client for interacting with OpenAI's API to evaluate student answers
     against model answers using predefined prompts and configurations.
 """
 
 
+# Batch jobs in these states will not change any further
+BATCH_FINAL_STATES = ('completed', 'failed', 'expired', 'cancelled')
+
 # Predefined model configurations
 MODEL_CONFIG = {
     'gpt-4o': {
@@ -51,24 +59,60 @@ class OpenAPIClient:
     Client for interacting with OpenAI's API for evaluating student answers.
     Uses predefined model configurations and prompts.
     """
-    def __init__(self, model, api_key: str):
-        """ Initialize the OpenAPIClient with a specific model and API key."""
+    def __init__(self, model, api_key: str, batch_provider=None, transport=None, max_retries: int = 2):
+        """
+        Initialize the OpenAPIClient with a specific model and API key.
+        `batch_provider` replaces the OpenAI files/batches endpoints used by batch mode,
+        e.g. with a LocalBatchProvider for offline runs.
+        `transport` is the SharedTransport whose connection pool requests go through;
+        by default the process-wide one, shared with every other client.
+        `max_retries` are the OpenAI SDK's own retries; use 0 when wrapped in a RateLimitedClient,
+        which retries with backoff itself.
+        """
         if not api_key:
             raise ValueError("An API key is required to initialize the client.")
         self.config = MODEL_CONFIG.get(model)
-        self._client = OpenAI(api_key=api_key)
+        self._prepare()
+        self._transport = transport or shared_transport()
+        self._max_retries = max_retries
+        self._batch_provider = batch_provider
+        self.set_api_key(api_key)
 
     def set_api_key(self, api_key: str):
-        """ Set or update the API key for the OpenAI client. """
+        """ Set or update the API key for the OpenAI client. Connections in the shared pool are kept. """
         if not api_key:
             raise ValueError("API key cannot be empty.")
-        self._client = OpenAI(api_key=api_key)
+        self._api_key = api_key
+        self._client = OpenAI(api_key=api_key, http_client=self._transport.client(), max_retries=self._max_retries)
+        self._async_sdk = None
+
+    @property
+    def _async_client(self) -> AsyncOpenAI:
+        """ The async SDK client on the transport's pool of the running event loop. """
+        http_client = self._transport.async_client()
+        if self._async_sdk is None or self._async_sdk[0] is not http_client:
+            self._async_sdk = (http_client, AsyncOpenAI(api_key=self._api_key, http_client=http_client,
+                                                        max_retries=self._max_retries))
+        return self._async_sdk[1]
 
     def set_model(self, model):
         """ Set or update the model configuration for the client. """
         if model not in MODEL_CONFIG:
             raise ValueError(f"Model '{model}' is not supported.")
         self.config = MODEL_CONFIG.get(model)
+        self._prepare()
+
+    def _prepare(self):
+        """
+        Pre-render what every request of the current model shares: the system messages and per-question
+        prompt prefixes (see PromptAssembler), and the parameters passed through to the completions API.
+        """
+        if self.config is None:
+            self._assembler, self._kwargs = None, {}
+            return
+        self._assembler = PromptAssembler(self.config.get('system_prompt', []), self.config.get('prompt_template'))
+        self._kwargs = {k: v for k, v in self.config.items()
+                        if (k != 'system_prompt') and (k != 'prompt_template')}
 
     def get_model(self):
         """ Get the current model name. """
@@ -78,31 +122,37 @@ class OpenAPIClient:
         """ Get the current configuration dictionary. """
         return self.config
 
-    def evaluate(self, question, model, student) -> EvaluationResponse:
+    def _build_messages(self, question, model, student) -> list:
         """
-        Evaluate a student's answer against the model answer for a given question.
-        Args:
-            question (str): The question text.
-            model (str): The model answer text.
-            student (str): The student's answer text.
-        Returns:
-            EvaluationResponse: The evaluation result containing grade and explanation.
+        Build the chat messages for evaluating a single student answer.
+        Every request for a question starts with the same system messages, instructions, question and
+        model answer, so the provider can serve that prefix from its prompt cache.
         """
-        messages = []
-        for sys_message in self.config.get('system_prompt', []):
-            messages.append({"role": "system", "content": sys_message})
-        user_prompt = self.config.get('prompt_template').format(
-            question=question, model=model, student=student)
-        messages.append({"role": "user", "content": user_prompt})
+        return self._assembler.messages(question, model, student)
 
-        call_kwargs = {k: v for k, v in self.config.items()
-                       if (k != 'system_prompt') and (k != 'prompt_template')}
+    def format_prompt(self, question, model, student) -> str:
+        """ Get the full prompt text sent for one evaluation, e.g. for token estimates. """
+        return "\n".join(message["content"] for message in self._build_messages(question, model, student))
 
-        response = self._client.chat.completions.parse(
-            messages=messages,
-            **call_kwargs,
-        )
+    def _call_kwargs(self) -> dict:
+        """ Get the model parameters passed through to the completions API. Callers must not modify it. """
+        return self._kwargs
+
+    def _track_call(self):
+        """ Metrics context for one API request (see Metrics.track_call). """
+        return metrics.track_call(type(self).__name__, self.get_model())
+
+    @staticmethod
+    def _record_usage(call, response) -> None:
+        """ Report the token counts of a completions API response to the metrics call context. """
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            details = getattr(usage, 'prompt_tokens_details', None)
+            call.usage(usage.prompt_tokens, usage.completion_tokens, getattr(details, 'cached_tokens', None))
 
+    @staticmethod
+    def _parse_evaluation(response) -> EvaluationResponse:
+        """ Parse a completions API response into an EvaluationResponse. """
         # Safely get the model output content
         try:
             content = response.choices[0].message.content
@@ -117,50 +167,270 @@ class OpenAPIClient:
         except Exception as e:
             raise ValueError(f"An unexpected error occurred while parsing the response: {e}")
 
-    def evaluation_review(self, question, model, student, evaluation) -> str:
+    def evaluate(self, question, model, student) -> EvaluationResponse:
         """
-        Review a previous evaluation of a student's answer.
+        Evaluate a student's answer against the model answer for a given question.
         Args:
             question (str): The question text.
             model (str): The model answer text.
             student (str): The student's answer text.
-            evaluation (dict): The previous evaluation containing 'grade' and 'explanation'.
         Returns:
-            str: The review response from the model.
+            EvaluationResponse: The evaluation result containing grade and explanation.
         """
-        grade = evaluation.get('grade', '')
-        explanation = evaluation.get('explanation', '')
-        review_prompt = f"""
-            The student answer was graded as '{grade}' with the explanation: {explanation}.
-            Review this evaluation based on the question, model answer, and student answer provided below.
+        with self._track_call() as call:
+            response = self._client.chat.completions.parse(
+                messages=self._build_messages(question, model, student),
+                **self._call_kwargs(),
+            )
+            self._record_usage(call, response)
+        return self._parse_evaluation(response)
 
-            Question: {question}
+    async def evaluate_async(self, question, model, student) -> EvaluationResponse:
+        """
+        Asynchronous variant of `evaluate`, used by the concurrent grading engine.
+        Args:
+            question (str): The question text.
+            model (str): The model answer text.
+            student (str): The student's answer text.
+        Returns:
+            EvaluationResponse: The evaluation result containing grade and explanation.
+        """
+        with self._track_call() as call:
+            response = await self._async_client.chat.completions.parse(
+                messages=self._build_messages(question, model, student),
+                **self._call_kwargs(),
+            )
+            self._record_usage(call, response)
+        return self._parse_evaluation(response)
+
+    def _build_packed_request(self, items) -> tuple:
+        """ Build the messages and call parameters for grading several answers in one request. """
+        messages = list(self._assembler.system_messages)
+        answers = "".join(
+            p.PROMPT_PACKED_ITEM_TEMPLATE.format(question_id=question_id, question=question, model=model, student=student)
+            for question_id, question, model, student in items)
+        messages.append({"role": "user", "content": p.PROMPT_PACKED_TEMPLATE.format(answers=answers)})
+
+        call_kwargs = dict(self._call_kwargs())
+        if hasattr(call_kwargs.get('response_format'), 'model_json_schema'):
+            call_kwargs['response_format'] = PackedEvaluationResponse
+        # Leave room for one full evaluation per packed answer
+        call_kwargs['max_tokens'] = call_kwargs.get('max_tokens', 150) * len(items)
+        return messages, call_kwargs
+
+    @staticmethod
+    def _parse_packed_evaluation(response, items) -> list:
+        """
+        Parse a packed response into EvaluationResponse objects in the order of `items`.
+        Raises ValueError if the output was truncated, does not parse, or misses a question_id.
+        """
+        try:
+            choice = response.choices[0]
+            content = choice.message.content
+        except Exception:
+            raise ValueError("Packed evaluation response has no content.")
+        if choice.finish_reason == 'length':
+            raise ValueError("Packed evaluation response was truncated.")
 
-            Model answer: {model}
+        try:
+            packed = PackedEvaluationResponse.model_validate_json(content)
+        except ValidationError as e:
+            raise ValueError(f"Failed to parse packed evaluation response: {e}")
 
-            Student answer: {student}
+        by_question = {evaluation.question_id: evaluation for evaluation in packed.evaluations}
+        missing = [question_id for question_id, *_ in items if question_id not in by_question]
+        if missing:
+            raise ValueError(f"Packed evaluation response is missing question_ids {missing}.")
+        return [EvaluationResponse(grade=by_question[question_id].grade,
+                                   explanation=by_question[question_id].explanation,
+                                   confidence=by_question[question_id].confidence)
+                for question_id, *_ in items]
 
-            Is the evaluation accurate? Provide a brief justification.
+    def evaluate_packed(self, items) -> list:
         """
+        Evaluate several student answers in a single request.
+        Args:
+            items (list): (question_id, question, model, student) tuples with unique question_ids.
+        Returns:
+            list: EvaluationResponse objects in the same order as `items`.
+        """
+        messages, call_kwargs = self._build_packed_request(items)
+        try:
+            with self._track_call() as call:
+                response = self._client.chat.completions.parse(
+                    messages=messages,
+                    **call_kwargs,
+                )
+                self._record_usage(call, response)
+        except (LengthFinishReasonError, ValidationError) as e:
+            # The SDK raises before returning when structured output is truncated or invalid
+            raise ValueError(f"Packed evaluation response could not be parsed: {e}")
+        return self._parse_packed_evaluation(response, items)
 
-        messages = []
-        for sys_message in self.config.get('system_prompt', []):
-            messages.append({"role": "system", "content": sys_message})
-        messages.append({"role": "user", "content": review_prompt})
+    async def evaluate_packed_async(self, items) -> list:
+        """ Asynchronous variant of `evaluate_packed`. """
+        messages, call_kwargs = self._build_packed_request(items)
+        try:
+            with self._track_call() as call:
+                response = await self._async_client.chat.completions.parse(
+                    messages=messages,
+                    **call_kwargs,
+                )
+                self._record_usage(call, response)
+        except (LengthFinishReasonError, ValidationError) as e:
+            raise ValueError(f"Packed evaluation response could not be parsed: {e}")
+        return self._parse_packed_evaluation(response, items)
+
+    def _batch_body(self, question, model, student) -> dict:
+        """ Build the JSON request body for one evaluation in a batch file. """
+        body = dict(self._call_kwargs())
+        response_format = body.get('response_format')
+        if hasattr(response_format, 'model_json_schema'):
+            # Batch files are plain JSON, so pydantic formats are sent as a strict JSON schema
+            schema = response_format.model_json_schema()
+            schema['additionalProperties'] = False
+            # Strict schemas list every property as required; optional ones stay nullable
+            schema['required'] = list(schema.get('properties', {}))
+            for field in schema.get('properties', {}).values():
+                field.pop('default', None)
+            body['response_format'] = {
+                "type": "json_schema",
+                "json_schema": {"name": response_format.__name__, "schema": schema, "strict": True}
+            }
+        body['messages'] = self._build_messages(question, model, student)
+        return body
 
-        call_kwargs = {k: v for k, v in self.config.items()
-                       if (k != 'system_prompt')
-                       and (k != 'prompt_template')
-                       and (k != 'response_format')}
+    def _batches(self):
+        """ Get the provider used for batch files and jobs. """
+        return self._batch_provider or self._client
 
-        response = self._client.chat.completions.parse(
-            messages=messages,
-            **call_kwargs,
+    def write_batch_file(self, requests, path) -> Path:
+        """
+        Write evaluation requests to a JSONL batch input file.
+        Args:
+            requests (iterable): (custom_id, question, model, student) tuples.
+            path (str): Destination of the JSONL file.
+        Returns:
+            Path: The path of the written file.
+        """
+        path = Path(path)
+        os.makedirs(path.parent, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for custom_id, question, model, student in requests:
+                f.write(json.dumps({
+                    "custom_id": str(custom_id),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": self._batch_body(question, model, student),
+                }) + "\n")
+        return path
+
+    def submit_batch(self, path) -> str:
+        """ Upload a JSONL batch input file and start a batch job. Returns the batch id. """
+        provider = self._batches()
+        with open(path, 'rb') as f:
+            input_file = provider.files.create(file=f, purpose='batch')
+        batch = provider.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h',
         )
+        return batch.id
 
+    def wait_for_batch(self, batch_id, poll_interval=30.0, timeout=None):
+        """ Poll a batch job until it reaches a final state. Returns the batch object. """
+        provider = self._batches()
+        started = time.monotonic()
+        while True:
+            batch = provider.batches.retrieve(batch_id)
+            if batch.status in BATCH_FINAL_STATES:
+                return batch
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError(f"Batch '{batch_id}' did not finish within {timeout} seconds.")
+            time.sleep(poll_interval)
+
+    def fetch_batch_results(self, batch) -> dict:
+        """
+        Download and parse the output of a finished batch job.
+        Returns:
+            dict: custom_id -> EvaluationResponse for every request that succeeded.
+                  Failed or unparseable requests are left out so the caller can retry them.
+        """
+        if not batch.output_file_id:
+            return {}
+        content = self._batches().files.content(batch.output_file_id).text
+        results = {}
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get('response') or {}
+            if record.get('error') or response.get('status_code') != 200:
+                continue
+            try:
+                message = response['body']['choices'][0]['message']['content']
+                results[record['custom_id']] = EvaluationResponse.model_validate_json(message)
+            except (KeyError, IndexError, TypeError, ValidationError):
+                continue
+        return results
+
+    def _build_review_request(self, question, model, student, evaluation) -> tuple:
+        """ Build the messages and call parameters for reviewing a previous evaluation. """
+        messages = list(self._assembler.system_messages)
+        call_kwargs = dict(self._call_kwargs())
+        if hasattr(call_kwargs.get('response_format'), 'model_json_schema'):
+            call_kwargs['response_format'] = ReviewResponse
+        else:
+            messages.append({"role": "system", "content": p.SYSTEM_PROMPT_REVIEW_JSON})
+        messages.append({"role": "user", "content": p.PROMPT_REVIEW_TEMPLATE.format(
+            grade=evaluation.get('grade', ''),
+            explanation=evaluation.get('explanation', ''),
+            question=question,
+            model=model,
+            student=student
+        )})
+        return messages, call_kwargs
+
+    @staticmethod
+    def _parse_review(response) -> ReviewResponse:
+        """ Parse a completions API response into a ReviewResponse. """
         try:
             content = response.choices[0].message.content
         except Exception:
             content = ""
 
-        return content
\ No newline at end of file
+        try:
+            return ReviewResponse.model_validate_json(content)
+        except ValidationError as e:
+            raise ValueError(f"Failed to parse review response: {e}")
+
+    def evaluation_review(self, question, model, student, evaluation) -> ReviewResponse:
+        """
+        Review a previous evaluation of a student's answer.
+        Args:
+            question (str): The question text.
+            model (str): The model answer text.
+            student (str): The student's answer text.
+            evaluation (dict): The previous evaluation containing 'grade' and 'explanation'.
+        Returns:
+            ReviewResponse: Whether the reviewer agrees with the grade, and why.
+        """
+        messages, call_kwargs = self._build_review_request(question, model, student, evaluation)
+        with self._track_call() as call:
+            response = self._client.chat.completions.parse(
+                messages=messages,
+                **call_kwargs,
+            )
+            self._record_usage(call, response)
+        return self._parse_review(response)
+
+    async def evaluation_review_async(self, question, model, student, evaluation) -> ReviewResponse:
+        """ Asynchronous variant of `evaluation_review`, used by the concurrent review pass. """
+        messages, call_kwargs = self._build_review_request(question, model, student, evaluation)
+        with self._track_call() as call:
+            response = await self._async_client.chat.completions.parse(
+                messages=messages,
+                **call_kwargs,
+            )
+            self._record_usage(call, response)
+        return self._parse_review(response)
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from app.services.GradingCache import client_fingerprint
+
+""" Routes grading requests across several LLM clients by health, with failover and optional hedged requests. """
+
+
+logger = logging.getLogger(__name__)
+
+# Hedge delay used until a provider has enough latency samples for a percentile
+DEFAULT_HEDGE_DELAY = 2.0
+MIN_SAMPLES_FOR_PERCENTILE = 20
+# Seconds for the error penalty of a provider to halve once it stops failing
+DEFAULT_RECOVERY = 60.0
+
+
+class ProviderStats:
+    """ Rolling latency window and smoothed error rate of one provider. """
+    def __init__(self, name: str, window: int = 200, error_decay: float = 0.1, recovery: float = DEFAULT_RECOVERY):
+        self.name = name
+        self.latencies = deque(maxlen=window)
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self._error_decay = error_decay
+        self._recovery = recovery
+        self._last_failure = None
+        self._lock = threading.Lock()
+
+    def record(self, latency: float = None, error: bool = False) -> None:
+        """ Record the outcome of one request. """
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.failures += 1
+                self._last_failure = time.monotonic()
+            else:
+                self.latencies.append(latency)
+            self.error_rate += self._error_decay * ((1.0 if error else 0.0) - self.error_rate)
+
+    def percentile(self, q: float):
+        """ Latency percentile (0-1) over the window, or None without enough samples. """
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < MIN_SAMPLES_FOR_PERCENTILE:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def penalty(self) -> float:
+        """ Error rate, halved for every `recovery` seconds since the last failure. """
+        if self._last_failure is None:
+            return self.error_rate
+        return self.error_rate * 0.5 ** ((time.monotonic() - self._last_failure) / self._recovery)
+
+    def score(self) -> float:
+        """
+        Lower is healthier: median latency inflated by the error penalty.
+        Untried providers score 0 so they get sampled. Providers that have only failed score an assumed
+        latency scaled by their penalty, so they go last at first and are probed again as it decays.
+        """
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return 10 * DEFAULT_HEDGE_DELAY * self.penalty()
+        median = samples[len(samples) // 2]
+        return median * (1 + 10 * self.penalty())
+
+    def report(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 4),
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+        }
+
+
+class ProviderRouter:
+    """
+    Client with the evaluate/evaluation_review interface that dispatches to the healthiest of several clients.
+    Requests go to the provider with the best health score and fail over to the next provider on any error.
+    With `hedge=True`, a duplicate request is sent to the next provider if the first has not answered
+    within its p95 latency, and whichever answer arrives first is used.
+    Async requests also route to clients that only implement the `_async` methods.
+    """
+    def __init__(self, clients: list, hedge: bool = False, hedge_quantile: float = 0.95,
+                 default_hedge_delay: float = DEFAULT_HEDGE_DELAY, window: int = 200,
+                 recovery: float = DEFAULT_RECOVERY):
+        if not clients:
+            raise ValueError("At least one client is required.")
+        self.clients = list(clients)
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.default_hedge_delay = default_hedge_delay
+        self.stats = {id(client): ProviderStats(self._name(client), window, recovery=recovery)
+                      for client in self.clients}
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(self.clients)) if hedge else None
+
+    @staticmethod
+    def _name(client) -> str:
+        """ Provider type and model, looking through wrappers such as RateLimitedClient. """
+        model = client.get_model() if hasattr(client, 'get_model') else None
+        kind = type(getattr(client, '__wrapped__', client)).__name__
+        return f"{kind}:{model}" if model else kind
+
+    def get_config(self) -> dict:
+        """ Configuration of every routed provider, so cached grades are keyed on the whole chain. """
+        return {"providers": [client_fingerprint(client) for client in self.clients]}
+
+    def report(self) -> dict:
+        """ Per-provider request counts, error rates and latency percentiles. """
+        return {stats.name: stats.report() for stats in self.stats.values()}
+
+    def _ranked(self, method: str, asynchronous: bool = False) -> list:
+        """ Clients supporting `method` (or its `_async` variant for async requests), healthiest first. """
+        candidates = [client for client in self.clients
+                      if hasattr(client, method) or (asynchronous and hasattr(client, method + '_async'))]
+        return sorted(candidates, key=lambda client: self.stats[id(client)].score())
+
+    def _hedge_delay(self, client) -> float:
+        delay = self.stats[id(client)].percentile(self.hedge_quantile)
+        return delay if delay is not None else self.default_hedge_delay
+
+    def _call(self, client, method: str, args):
+        """ Call one provider and record its latency or failure. """
+        started = time.monotonic()
+        try:
+            result = getattr(client, method)(*args)
+        except Exception:
+            self.stats[id(client)].record(error=True)
+            raise
+        self.stats[id(client)].record(latency=time.monotonic() - started)
+        return result
+
+    async def _call_async(self, client, method: str, args):
+        """ Asynchronous variant of `_call`, running sync-only clients in a worker thread. """
+        started = time.monotonic()
+        try:
+            if hasattr(client, method + '_async'):
+                result = await getattr(client, method + '_async')(*args)
+            else:
+                result = await asyncio.to_thread(getattr(client, method), *args)
+        except Exception:
+            self.stats[id(client)].record(error=True)
+            raise
+        self.stats[id(client)].record(latency=time.monotonic() - started)
+        return result
+
+    def _log_failure(self, client, error: Exception) -> None:
+        logger.warning("Provider %s failed (%s); failing over.", self._name(client), error)
+
+    def _dispatch(self, method: str, args):
+        """ Run a request with failover, hedging if enabled. """
+        remaining = self._ranked(method)
+        if not remaining:
+            raise AttributeError(f"No routed client supports '{method}'.")
+        errors = []
+        if not self.hedge:
+            for client in remaining:
+                try:
+                    return self._call(client, method, args)
+                except Exception as e:
+                    self._log_failure(client, e)
+                    errors.append(e)
+            raise errors[-1]
+
+        in_flight = {}
+
+        def launch():
+            client = remaining.pop(0)
+            in_flight[self._executor.submit(self._call, client, method, args)] = client
+
+        launch()
+        hedged = False
+        while in_flight:
+            timeout = None
+            if remaining and not hedged:
+                timeout = self._hedge_delay(next(iter(in_flight.values())))
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                launch()
+                continue
+            for future in done:
+                client = in_flight.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    self._log_failure(client, e)
+                    errors.append(e)
+            if not in_flight and remaining:
+                launch()
+        raise errors[-1]
+
+    async def _dispatch_async(self, method: str, args):
+        """
+        Asynchronous variant of `_dispatch`. Losing hedged requests are cancelled and awaited before
+        returning, so their clean-up (such as releasing a rate limiter slot) has run.
+        """
+        remaining = self._ranked(method, asynchronous=True)
+        if not remaining:
+            raise AttributeError(f"No routed client supports '{method}'.")
+        errors = []
+        in_flight = {}
+
+        def launch():
+            client = remaining.pop(0)
+            in_flight[asyncio.ensure_future(self._call_async(client, method, args))] = client
+
+        launch()
+        hedged = not self.hedge
+        try:
+            while in_flight:
+                timeout = None
+                if remaining and not hedged:
+                    timeout = self._hedge_delay(next(iter(in_flight.values())))
+                done, _ = await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    launch()
+                    continue
+                for task in done:
+                    client = in_flight.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        self._log_failure(client, e)
+                        errors.append(e)
+                if not in_flight and remaining:
+                    launch()
+        finally:
+            for task in in_flight:
+                task.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+        raise errors[-1]
+
+    def evaluate(self, question, model, student):
+        """ Evaluate a student answer with the healthiest provider, failing over on errors. """
+        return self._dispatch('evaluate', (question, model, student))
+
+    async def evaluate_async(self, question, model, student):
+        """ Asynchronous variant of `evaluate`; sync-only providers run in worker threads. """
+        return await self._dispatch_async('evaluate', (question, model, student))
+
+    def evaluation_review(self, question, model, student, evaluation):
+        """ Review a previous evaluation with the healthiest provider that supports reviews. """
+        return self._dispatch('evaluation_review', (question, model, student, evaluation))
+
+    async def evaluation_review_async(self, question, model, student, evaluation):
+        """ Asynchronous variant of `evaluation_review`. """
+        return await self._dispatch_async('evaluation_review', (question, model, student, evaluation))
+
+    def close(self) -> None:
+        """ Shut down the worker threads used for hedged requests. """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,266 @@
+import asyncio
+import email.utils
+import logging
+import math
+import random
+import threading
+import time
+
+import openai
+
+from app.utils.metrics import metrics
+
+""" Client middleware adding rate limiting, retries with backoff and adaptive concurrency to any LLM client. """
+
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes worth retrying: timeouts, conflicts, rate limits and transient server errors
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+# Client methods that are wrapped; everything else is passed straight through
+WRAPPED_METHODS = ('evaluate', 'evaluate_packed', 'evaluation_review')
+WRAPPED_ASYNC_METHODS = ('evaluate_async', 'evaluate_packed_async', 'evaluation_review_async')
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('cl100k_base')
+except Exception:  # tiktoken is optional; fall back to a character based estimate
+    _ENCODING = None
+
+
+def estimate_tokens(text: str) -> int:
+    """ Estimate the number of tokens in a prompt. """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def status_code(error: Exception):
+    """ Get the HTTP status code of an OpenAI or Gemini API error, if any. """
+    code = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    """ Whether an error is transient and the request should be retried. """
+    if isinstance(error, (openai.APIConnectionError, ConnectionError, TimeoutError)):
+        return True
+    return status_code(error) in RETRYABLE_STATUS_CODES
+
+
+def retry_after(error: Exception):
+    """ Get the delay in seconds requested by a `Retry-After` (or `retry-after-ms`) header, if any. """
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time()) if retry_at else None
+
+
+class TokenBucket:
+    """ Token bucket refilled continuously at `rate_per_minute`, holding at most one minute of budget. """
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self._tokens = self.capacity
+        self._rate = rate_per_minute / 60.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """ Take `amount` from the bucket and return how long the caller must wait before using it. """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit that adapts to errors (additive increase, multiplicative decrease).
+    The limit halves on every rate limit or transient error and grows back by one per `limit` successes.
+    """
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        # (event loop, future) of async callers waiting for a slot, possibly on several loops
+        self._waiters = []
+
+    def _try_acquire(self) -> bool:
+        if self._in_flight < int(self.limit):
+            self._in_flight += 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        """ Block until a request slot is free. """
+        with self._condition:
+            while not self._try_acquire():
+                self._condition.wait()
+
+    async def acquire_async(self) -> None:
+        """ Wait without blocking the event loop until a request slot is free. """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._try_acquire():
+                    return
+                waiter = (loop, loop.create_future())
+                self._waiters.append(waiter)
+            try:
+                await waiter[1]
+            finally:
+                with self._condition:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+
+    @staticmethod
+    def _wake(future) -> None:
+        if not future.done():
+            future.set_result(None)
+
+    def release(self, throttle: bool = False) -> None:
+        """ Free a request slot, halving the limit if the request hit a rate limit or transient error. """
+        with self._condition:
+            self._in_flight -= 1
+            if throttle:
+                self.limit = max(self.min_limit, self.limit / 2)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._wake, future)
+
+    @property
+    def in_flight(self) -> int:
+        """ Requests currently holding a slot. """
+        return self._in_flight
+
+
+class RateLimitedClient:
+    """
+    Wraps an LLM client (OpenAPIClient, GeminiClient, ...) with the same interface and adds:
+      - token buckets for requests per minute and tokens per minute, with token counts
+        estimated from the formatted prompt before sending
+      - retries of rate limit and transient errors with exponential backoff and full jitter,
+        honoring `Retry-After` headers
+      - a concurrency limit that is throttled automatically when errors appear
+    A single instance should be shared by every caller so the limits apply to the whole run.
+    """
+    def __init__(self, client, requests_per_minute=None, tokens_per_minute=None, max_concurrency=16,
+                 max_retries=6, base_delay=1.0, max_delay=60.0):
+        self.__wrapped__ = client
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def __getattr__(self, name):
+        """ Wrap the grading methods of the inner client and pass everything else through. """
+        attribute = getattr(self.__wrapped__, name)
+        if name in WRAPPED_METHODS:
+            return lambda *args: self._call(attribute, name, args)
+        if name in WRAPPED_ASYNC_METHODS:
+            return lambda *args: self._call_async(attribute, name, args)
+        return attribute
+
+    def _estimate(self, name, args) -> int:
+        """ Estimate the prompt plus completion tokens of a request. """
+        format_prompt = getattr(self.__wrapped__, 'format_prompt', None)
+        if format_prompt is None:
+            return 0
+        if name.startswith('evaluate_packed'):
+            prompts = [format_prompt(question, model, student) for _, question, model, student in args[0]]
+        else:
+            prompts = [format_prompt(*args[:3])]
+        config = self.__wrapped__.get_config() if hasattr(self.__wrapped__, 'get_config') else {}
+        completion = config.get('max_tokens') or config.get('max_output_tokens') or config.get('num_predict') or 0
+        return sum(estimate_tokens(prompt) + completion for prompt in prompts)
+
+    def _reserve(self, name, args) -> float:
+        """ Take one request and the estimated tokens from the buckets; returns the required wait. """
+        wait = 0.0
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(self._estimate(name, args)))
+        return wait
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """ Delay before the next attempt: full jitter exponential backoff, at least `Retry-After`. """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        requested = retry_after(error)
+        return max(delay, requested) if requested is not None else delay
+
+    def _should_retry(self, attempt: int, error: Exception, name: str) -> bool:
+        if attempt >= self.max_retries or not is_retryable(error):
+            return False
+        self.retries += 1
+        metrics.inc('retries', provider=type(self.__wrapped__).__name__, method=name,
+                    status=status_code(error) or type(error).__name__)
+        logger.warning("%s failed with %s (attempt %d/%d); retrying.",
+                       name, status_code(error) or type(error).__name__, attempt + 1, self.max_retries)
+        return True
+
+    def _call(self, method, name, args):
+        """ Call a sync client method under the rate limits, retrying transient errors. """
+        attempt = 0
+        while True:
+            time.sleep(self._reserve(name, args))
+            self.concurrency.acquire()
+            throttle = False
+            try:
+                return method(*args)
+            except Exception as e:
+                throttle = is_retryable(e)
+                if not self._should_retry(attempt, e, name):
+                    raise
+                delay = self._backoff(attempt, e)
+            finally:
+                # Also on KeyboardInterrupt and the like, so the slot is never lost
+                self.concurrency.release(throttle=throttle)
+            time.sleep(delay)
+            attempt += 1
+
+    async def _call_async(self, method, name, args):
+        """ Call an async client method under the rate limits, retrying transient errors. """
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._reserve(name, args))
+            await self.concurrency.acquire_async()
+            throttle = False
+            try:
+                return await method(*args)
+            except Exception as e:
+                throttle = is_retryable(e)
+                if not self._should_retry(attempt, e, name):
+                    raise
+                delay = self._backoff(attempt, e)
+            finally:
+                # Also when the call is cancelled (a timeout or a losing hedge), so the slot is never lost
+                self.concurrency.release(throttle=throttle)
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,56 @@
+from typing import List, Tuple
+
+""" Prompt assembly with a stable, pre-rendered prefix per question, so provider-side prompt caching applies. """
+
+
+# Number of (question, model answer) prefixes kept per assembler; an assignment has far fewer questions
+DEFAULT_MAX_PREFIXES = 4096
+
+
+def split_template(template: str, variable: str = 'student') -> Tuple[str, str]:
+    """
+    Split a prompt template into the part before the line holding `{variable}` and the rest,
+    e.g. PROMPT_4o_TEMPLATE into the instructions, question and model answer, and the student answer.
+    Formatting both parts and concatenating them gives exactly `template.format(...)`.
+    """
+    placeholder = '{' + variable + '}'
+    index = template.find(placeholder)
+    if index == -1:
+        raise ValueError(f"Template has no {placeholder} placeholder.")
+    line_start = template.rfind('\n', 0, index) + 1
+    return template[:line_start], template[line_start:]
+
+
+class PromptAssembler:
+    """
+    Builds grading messages as: system prompts, then a user message whose text starts with the
+    instructions, question and model answer (identical for every student answering that question)
+    and ends with the student answer. The system messages and the rendered prefix of each question
+    are built once and reused, so every request for a question shares a byte-identical prefix and only
+    the student answer is formatted per call.
+    """
+    def __init__(self, system_prompts: List[str], template: str, max_prefixes: int = DEFAULT_MAX_PREFIXES):
+        self.system_messages = tuple({"role": "system", "content": content} for content in system_prompts)
+        self._prefix_template, self._suffix_template = split_template(template)
+        self._prefixes = {}
+        self.max_prefixes = max_prefixes
+
+    def prefix(self, question, model) -> str:
+        """ The rendered instructions, question and model answer of a question. """
+        key = (question, model)
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            if len(self._prefixes) >= self.max_prefixes:
+                # Drop the oldest prefix; dicts keep insertion order
+                self._prefixes.pop(next(iter(self._prefixes)))
+            prefix = self._prefix_template.format(question=question, model=model)
+            self._prefixes[key] = prefix
+        return prefix
+
+    def user_prompt(self, question, model, student) -> str:
+        """ The full user prompt, equal to `template.format(question=..., model=..., student=...)`. """
+        return self.prefix(question, model) + self._suffix_template.format(student=student)
+
+    def messages(self, question, model, student) -> list:
+        """ Chat messages for one evaluation; the system messages are shared between calls. """
+        return [*self.system_messages, {"role": "user", "content": self.user_prompt(question, model, student)}]
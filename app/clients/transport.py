@@ -0,0 +1,164 @@
+import asyncio
+import importlib.util
+import threading
+import weakref
+
+import httpx
+
+""" Shared, connection-pooled HTTP transport for the LLM clients. """
+
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_POOL_TIMEOUT = 30.0
+
+
+def http2_available() -> bool:
+    """ Whether httpx can speak HTTP/2, which needs the optional `h2` package. """
+    return importlib.util.find_spec('h2') is not None
+
+
+async def _close_on_shutdown(client):
+    """
+    Async generator that closes `client` when it is finalized. Started within an event loop, it is
+    finalized by the loop's `shutdown_asyncgens`, e.g. at the end of `asyncio.run`, while the loop can
+    still close the client's connections.
+    """
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+def _start(generator) -> None:
+    """ Run an async generator up to its first `yield` without awaiting, registering it with the running loop. """
+    try:
+        generator.asend(None).send(None)
+    except StopIteration:
+        pass
+
+
+class SharedTransport:
+    """
+    One keep-alive connection pool for every client, so connections and TLS sessions are set up once
+    per host instead of once per client, model or API key.
+    Pass it to OpenAPIClient/GeminiClient as `transport`; clients created without one share the
+    process-wide `shared_transport()`.
+    The synchronous httpx.Client is shared by all threads. An httpx.AsyncClient is bound to the event
+    loop it first runs on, so one is kept for the running loop and replaced when a later
+    `asyncio.run` starts a new loop; each is closed when its loop shuts down.
+    Use it as a context manager, or call `close`/`aclose` when done.
+    """
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT, pool_timeout: float = DEFAULT_POOL_TIMEOUT,
+                 http2: bool = None):
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=pool_timeout)
+        self.http2 = http2_available() if http2 is None else http2
+        self._client = None
+        self._async_client = None
+        self._async_loop = None
+        # Per event loop, its client and the generator closing it at shutdown; holding the generator keeps
+        # it from being finalized early
+        self._shutdown_guards = weakref.WeakKeyDictionary()
+        self._closing = None
+        self._lock = threading.Lock()
+
+    def _options(self) -> dict:
+        return {"limits": self.limits, "timeout": self.timeout, "http2": self.http2}
+
+    def client(self) -> httpx.Client:
+        """ The shared synchronous client, created on first use. """
+        with self._lock:
+            if self._client is None or self._client.is_closed:
+                self._client = httpx.Client(**self._options())
+            return self._client
+
+    def async_client(self) -> httpx.AsyncClient:
+        """
+        The asynchronous client of the running event loop, created on first use in that loop.
+        Outside of an event loop, the client of the last loop is returned (or a new one), to be used by the next.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        with self._lock:
+            stale = loop is not None and self._async_loop is not None and loop is not self._async_loop
+            if self._async_client is None or self._async_client.is_closed or stale:
+                # Connections of a finished loop cannot be reused or closed from another loop
+                self._async_client = httpx.AsyncClient(**self._options())
+                self._async_loop = loop
+            elif self._async_loop is None:
+                self._async_loop = loop
+            if loop is not None and self._shutdown_guards.get(loop, (None,))[0] is not self._async_client:
+                guard = _close_on_shutdown(self._async_client)
+                _start(guard)
+                self._shutdown_guards[loop] = (self._async_client, guard)
+            return self._async_client
+
+    def close(self) -> None:
+        """
+        Close both clients. The asynchronous client is closed on its event loop if that loop is still
+        open; once the loop has shut down, the client was already closed with it.
+        """
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            async_client, loop = self._async_client, self._async_loop
+            self._client = None
+            self._async_client = None
+            self._async_loop = None
+        if async_client is None or async_client.is_closed or loop is None or loop.is_closed():
+            return
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if current is loop:
+            # Called from a coroutine of that loop, which cannot block on it; use `aclose` to wait
+            self._closing = loop.create_task(async_client.aclose())
+        elif loop.is_running():
+            asyncio.run_coroutine_threadsafe(async_client.aclose(), loop).result()
+        else:
+            loop.run_until_complete(async_client.aclose())
+
+    async def aclose(self) -> None:
+        """ Close both clients from within the event loop the asynchronous client runs on. """
+        with self._lock:
+            async_client, self._async_client, self._async_loop = self._async_client, None, None
+        if async_client is not None:
+            await async_client.aclose()
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_transport() -> SharedTransport:
+    """ The process-wide transport used by clients created without one. """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SharedTransport()
+        return _shared
@@ -3,10 +3,12 @@
 
 SYSTEM_PROMPT_EXAM_GRADER = "You are an expert exam grader."
 
-SYSTEM_PROMPT_JSON = "Your response must be a valid JSON object with 'grade' and 'explanation' fields."
+SYSTEM_PROMPT_JSON = ("Your response must be a valid JSON object with 'grade', 'explanation' and 'confidence' fields, "
+                      "where 'confidence' is a number from 0 (a guess) to 1 (certain).")
 
 PROMPT_4o_TEMPLATE = """
             Based on the question and model answer, grade the student answer as binary 'Pass/Fail' and give a simple explanation no more than 20 words.
+            Also give your confidence in the grade as a number from 0 (a guess) to 1 (certain).
 
             Question: {question}
 
@@ -17,6 +19,7 @@ PROMPT_4o_TEMPLATE = """
 
 PROMPT_4o_mini_TEMPLATE = """
             Based on the question and model answer, grade the student answer as binary 'Pass/Fail' and give a simple explanation no more than 20 words.
+            Also give your confidence in the grade as a number from 0 (a guess) to 1 (certain).
             Score based solely on factual accuracy and disregard format.
             Example: If the model answer is RFC 792 and the student answer is RFC 0792, the grade is 'Pass'.
 
@@ -28,11 +31,46 @@ PROMPT_4o_mini_TEMPLATE = """
             """
 
 PROMPT_35_turbo_TEMPLATE = """
-            Based on the question and model answer, grade the student answer as binary 'Pass/Fail' and give a simple explanation no more than 20 words. 
+            Based on the question and model answer, grade the student answer as binary 'Pass/Fail' and give a simple explanation no more than 20 words.
+            Also give your confidence in the grade as a number from 0 (a guess) to 1 (certain).
+
+            Question: {question}
+
+            Model answer: {model}
+
+            Student answer: {student}
+            """
+
+PROMPT_PACKED_TEMPLATE = """
+            Based on each question and model answer, grade each student answer below as binary 'Pass/Fail' and give a simple explanation no more than 20 words.
+            Also give your confidence in each grade as a number from 0 (a guess) to 1 (certain).
+            Score based solely on factual accuracy and disregard format.
+            Grade every answer independently and return exactly one evaluation per question_id.
+
+            {answers}
+            """
+
+PROMPT_PACKED_ITEM_TEMPLATE = """
+            question_id: {question_id}
+
+            Question: {question}
+
+            Model answer: {model}
+
+            Student answer: {student}
+            """
+
+SYSTEM_PROMPT_REVIEW_JSON = "Your response must be a valid JSON object with 'agree' (true or false) and 'reason' fields."
+
+PROMPT_REVIEW_TEMPLATE = """
+            The student answer was graded as '{grade}' with the explanation: {explanation}.
+            Review this evaluation based on the question, model answer, and student answer provided below.
 
             Question: {question}
 
             Model answer: {model}
 
             Student answer: {student}
-            """
\ No newline at end of file
+
+            Do you agree with the grade? Give a brief reason no more than 20 words.
+            """
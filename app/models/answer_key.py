@@ -0,0 +1,75 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Tuple
+
+from app.utils.normalization import canonical_tokens, normalize_answer
+
+""" Indexed answer key: model answers keyed by question_id with precomputed normalized forms. """
+
+
+@dataclass(frozen=True)
+class AnswerKeyEntry:
+    """ One question and model answer, with normalized and tokenized forms computed once. """
+    question_id: int
+    question_text: str
+    answer_text: str
+    normalized_question: str
+    normalized_answer: str
+    question_tokens: Tuple[str, ...]
+    answer_tokens: Tuple[str, ...]
+
+    @classmethod
+    def create(cls, question_id: int, question_text: str, answer_text: str) -> 'AnswerKeyEntry':
+        """ Build an entry, precomputing the normalized forms. """
+        return cls(
+            question_id=question_id,
+            question_text=question_text,
+            answer_text=answer_text,
+            normalized_question=normalize_answer(question_text),
+            normalized_answer=normalize_answer(answer_text),
+            question_tokens=tuple(canonical_tokens(question_text)),
+            answer_tokens=tuple(canonical_tokens(answer_text)),
+        )
+
+    def to_dict(self) -> dict:
+        """ The entry in the question_id/question_text/answer_text dict format of the repositories. """
+        return {
+            "question_id": self.question_id,
+            "question_text": self.question_text,
+            "answer_text": self.answer_text
+        }
+
+
+class AnswerKey(Mapping):
+    """
+    Read-only mapping of question_id -> AnswerKeyEntry.
+    If a question_id appears more than once, the first entry wins.
+    """
+    def __init__(self, entries: Iterable[AnswerKeyEntry] = ()):
+        self._entries = {}
+        for entry in entries:
+            self._entries.setdefault(entry.question_id, entry)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> 'AnswerKey':
+        """ Build an answer key from question_id/question_text/answer_text dicts. """
+        return cls(AnswerKeyEntry.create(record['question_id'], record['question_text'], record['answer_text'])
+                   for record in records)
+
+    @classmethod
+    def of(cls, model_qna) -> 'AnswerKey':
+        """ Return `model_qna` if it already is an AnswerKey, else index the list of dicts. """
+        return model_qna if isinstance(model_qna, AnswerKey) else cls.from_records(model_qna)
+
+    def __getitem__(self, question_id) -> AnswerKeyEntry:
+        return self._entries[question_id]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def to_records(self) -> list:
+        """ The answer key as a list of dicts, in question order. """
+        return [entry.to_dict() for entry in self._entries.values()]
@@ -1,3 +1,4 @@
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 """ Pydantic schema for the evaluation response from the OpenAI API. """
@@ -5,4 +6,22 @@ from pydantic import BaseModel, Field
 
 class EvaluationResponse(BaseModel):
     grade: str = Field(..., description="The evaluation result, either 'Pass' or 'Fail'.")
-    explanation: str = Field(..., description="A brief explanation for the evaluation result, no more than 20 words.")
\ No newline at end of file
+    explanation: str = Field(..., description="A brief explanation for the evaluation result, no more than 20 words.")
+    confidence: Optional[float] = Field(None, description="How certain the grade is, from 0 (a guess) to 1 (certain).")
+
+
+class CascadeEvaluationResponse(EvaluationResponse):
+    tier: Optional[str] = Field(None, description="The model of the cascade tier whose grade was kept.")
+
+
+class QuestionEvaluationResponse(EvaluationResponse):
+    question_id: int = Field(..., description="The question_id of the answer this evaluation belongs to.")
+
+
+class PackedEvaluationResponse(BaseModel):
+    evaluations: List[QuestionEvaluationResponse] = Field(..., description="One evaluation for every answer in the request.")
+
+
+class ReviewResponse(BaseModel):
+    agree: bool = Field(..., description="Whether the reviewer agrees with the original grade.")
+    reason: str = Field(..., description="A brief justification of the review, no more than 20 words.")
@@ -0,0 +1,205 @@
+import csv
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator, Tuple
+
+from app.models.answer_key import AnswerKey
+from app.repositories.model_qna_repository import model_qna_repository
+from app.repositories.student_answers_repository import IngestionReport, iter_student_answers
+
+""" Pluggable sources of an answer key and student answers: submission folders, SQL tables and spreadsheets. """
+
+
+# Rows fetched or read per batch by the SQL and spreadsheet loaders
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _question_id(value):
+    """ Question ids as ints like the folder repositories produce, when they are numeric. """
+    text = str(value).strip()
+    if text.endswith('.0'):
+        # Spreadsheets store numbers as floats
+        text = text[:-2]
+    return int(text) if text.isdigit() else text
+
+
+def group_by_student(rows, report: IngestionReport = None) -> Iterator[Tuple[str, list]]:
+    """
+    Group a stream of (student, question_id, answer) rows into (student, answers) pairs, holding one
+    student's answers at a time. The rows of a student must be contiguous, e.g. sorted by student.
+    """
+    report = report if report is not None else IngestionReport()
+    seen = set()
+    student, answers = None, []
+    for row_student, question_id, answer in rows:
+        row_student = str(row_student)
+        if row_student != student:
+            if answers:
+                report.parsed += 1
+                yield student, answers
+            if row_student in seen:
+                raise ValueError(f"Rows of student '{row_student}' are not contiguous; sort the source by student.")
+            seen.add(row_student)
+            student, answers = row_student, []
+        answers.append({"question_id": _question_id(question_id), "student_answer": "" if answer is None else str(answer)})
+    if answers:
+        report.parsed += 1
+        yield student, answers
+
+
+class DataLoader(ABC):
+    """
+    Source of one assignment: its answer key and a stream of (student, answers) pairs in the
+    format of `iter_student_answers`. `name` identifies the assignment and `path` its location.
+    Loaders stream answers with bounded memory, so they can feed the evaluation engines directly.
+    """
+    name = None
+    path = None
+
+    @abstractmethod
+    def answer_key(self) -> AnswerKey:
+        """ The assignment's questions and model answers. """
+
+    @abstractmethod
+    def iter_student_answers(self, report: IngestionReport = None) -> Iterator[Tuple[str, list]]:
+        """ Stream (student, answers) pairs, counting them in `report`. """
+
+    def close(self) -> None:
+        """ Release the resources of the source, e.g. a database connection. """
+
+
+class DirectoryLoader(DataLoader):
+    """ The `<assignment>/submissions/<student>/submission.txt` layout, parsed in `workers` processes. """
+    def __init__(self, folder_path, workers: int = 1):
+        self.path = folder_path
+        self.name = os.path.basename(os.path.normpath(folder_path))
+        self.workers = workers
+
+    def answer_key(self) -> AnswerKey:
+        return model_qna_repository(self.path)
+
+    def iter_student_answers(self, report: IngestionReport = None):
+        return iter_student_answers(self.path, workers=self.workers, report=report)
+
+
+class SQLLoader(DataLoader):
+    """
+    Tables of an LMS export, read through any DB-API connection:
+        <questions_table>(assignment, question_id, question_text, answer_text)
+        <answers_table>(assignment, student, question_id, answer)
+    Question ids are ordered numerically, also in TEXT columns. Answers are read ordered by student
+    through one cursor in batches of `batch_size` rows, so only one batch is in memory. Pass a
+    server-side (named) cursor factory as `cursor` for databases whose default cursors buffer the
+    whole result, e.g. `lambda conn: conn.cursor(name='answers')` with psycopg.
+    `placeholder` is the driver's parameter marker.
+    """
+    def __init__(self, connection, assignment: str, questions_table: str = 'questions',
+                 answers_table: str = 'answers', batch_size: int = DEFAULT_BATCH_SIZE, placeholder: str = '?',
+                 cursor=None, path=None):
+        self.connection = connection
+        self.name = assignment
+        self.path = path
+        self.questions_table = questions_table
+        self.answers_table = answers_table
+        self.batch_size = batch_size
+        self.placeholder = placeholder
+        self._cursor = cursor or (lambda conn: conn.cursor())
+
+    @classmethod
+    def sqlite(cls, path, assignment: str, **kwargs) -> 'SQLLoader':
+        """ Loader over a local SQLite database file. """
+        return cls(sqlite3.connect(path), assignment, path=path, **kwargs)
+
+    def _rows(self, query: str):
+        """ Yield the rows of a query for this assignment, fetched in batches. """
+        cursor = self._cursor(self.connection)
+        cursor.arraysize = self.batch_size
+        try:
+            cursor.execute(query, (self.name,))
+            while True:
+                batch = cursor.fetchmany(self.batch_size)
+                if not batch:
+                    return
+                yield from batch
+        finally:
+            cursor.close()
+
+    def answer_key(self) -> AnswerKey:
+        return AnswerKey.from_records(
+            {"question_id": _question_id(question_id), "question_text": question_text or "",
+             "answer_text": answer_text or ""}
+            for question_id, question_text, answer_text in self._rows(
+                f"SELECT question_id, question_text, answer_text FROM {self.questions_table}"
+                f" WHERE assignment = {self.placeholder} ORDER BY CAST(question_id AS INTEGER), question_id"))
+
+    def iter_student_answers(self, report: IngestionReport = None):
+        return group_by_student(self._rows(
+            f"SELECT student, question_id, answer FROM {self.answers_table}"
+            f" WHERE assignment = {self.placeholder} ORDER BY student, CAST(question_id AS INTEGER), question_id"),
+            report)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def _read_rows(path, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Yield the rows of a CSV or Excel sheet as dicts keyed by the header row, reading the file incrementally.
+    Excel files need the optional `openpyxl` package and are opened in read-only (streaming) mode.
+    """
+    path = Path(path)
+    if path.suffix.lower() in ('.xlsx', '.xlsm'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportError("Reading Excel files requires the openpyxl package.")
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+            for row in rows:
+                if any(cell is not None for cell in row):
+                    yield dict(zip(header, row))
+        finally:
+            workbook.close()
+        return
+    with open(path, newline='', encoding='utf-8-sig', buffering=batch_size * 256) as f:
+        yield from csv.DictReader(f)
+
+
+class SpreadsheetLoader(DataLoader):
+    """
+    CSV or Excel exports: an answers sheet with one row per (student, question) and an answer key,
+    either a sheet with one row per question or an assignment folder with a solution file.
+    Column names are configurable; rows of a student must be contiguous (sorted by student).
+    """
+    def __init__(self, answers_path, answer_key_path, name: str = None, student_column: str = 'student',
+                 question_column: str = 'question_id', answer_column: str = 'answer',
+                 question_text_column: str = 'question_text', answer_text_column: str = 'answer_text',
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        self.path = answers_path
+        self.name = name or Path(answers_path).stem
+        self.answer_key_path = answer_key_path
+        self.student_column = student_column
+        self.question_column = question_column
+        self.answer_column = answer_column
+        self.question_text_column = question_text_column
+        self.answer_text_column = answer_text_column
+        self.batch_size = batch_size
+
+    def answer_key(self) -> AnswerKey:
+        if Path(self.answer_key_path).is_dir():
+            return model_qna_repository(self.answer_key_path)
+        return AnswerKey.from_records(
+            {"question_id": _question_id(row[self.question_column]),
+             "question_text": str(row.get(self.question_text_column) or ""),
+             "answer_text": str(row.get(self.answer_text_column) or "")}
+            for row in _read_rows(self.answer_key_path, self.batch_size))
+
+    def iter_student_answers(self, report: IngestionReport = None):
+        return group_by_student(
+            ((row[self.student_column], row[self.question_column], row.get(self.answer_column))
+             for row in _read_rows(self.path, self.batch_size)
+             if row.get(self.student_column) not in (None, "")), report)
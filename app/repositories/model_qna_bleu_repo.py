@@ -1,5 +1,6 @@
 import json, re, logging, string, nltk
-from collections import defaultdict
+import numpy as np
+from collections import Counter, defaultdict
 from typing import Any, Dict, List, Optional, Sequence, Union
 from nltk.translate.bleu_score import SmoothingFunction, sentence_bleu
 
@@ -7,6 +8,7 @@ from nltk.translate.bleu_score import SmoothingFunction, sentence_bleu
 __all__ = [
     "extract_by_bleu_and_sections",
     "best_bleu_match",
+    "BleuMatcher",
     "normalize",
     "tokenize",
 ]
@@ -19,6 +21,14 @@ BLEU_THRESHOLD_DEFAULT = 0.25
 # Precompile regex for numbered lines like "1.", "2)", etc.
 _NUMBERED_RE = re.compile(r"^\d+[.)]\s*")
 
+# Sentence BLEU settings matching nltk's defaults: uniform weights up to 4-grams,
+# and the epsilon of SmoothingFunction().method1
+_BLEU_MAX_N = 4
+_BLEU_EPSILON = 0.1
+
+# Upper bound on the elements of the intermediate arrays built per scoring chunk
+_CHUNK_ELEMENTS = 4_000_000
+
 
 def normalize(text: str) -> str:
     """
@@ -81,6 +91,117 @@ def best_bleu_match(
     return best_q if best_score >= threshold else None
 
 
+def _ngram_counts(tokens: Sequence[str], n: int) -> Counter:
+    """
+    Count the n-grams of a token sequence.
+    """
+    if len(tokens) < n:
+        return Counter()
+    return Counter(zip(*(tokens[i:] for i in range(n))))
+
+
+class BleuMatcher:
+    """
+    Scores many lines against many candidate questions in one batched NumPy pass.
+
+    Each candidate is tokenized once when the matcher is created, and the n-grams of all candidates
+    form a fixed vocabulary with a dense (candidates x vocabulary) count table per n.
+    `score_tokens` maps the n-grams of every line onto that vocabulary as sparse (line, column, count)
+    entries, dropping the n-grams no candidate contains, computes the clipped n-gram matches for every
+    (line, candidate) pair with array operations, and applies NLTK's sentence BLEU formula with
+    SmoothingFunction().method1. Scores equal `sentence_bleu` up to floating point rounding.
+    Memory grows with the candidate vocabulary and the matched n-grams, not with the submission's vocabulary.
+    """
+
+    def __init__(self, candidates: Sequence[str]):
+        self.candidates = list(candidates)
+        candidate_tokens = [tokenize(q) if q else [] for q in self.candidates]
+        self._candidate_lengths = np.array([len(t) for t in candidate_tokens], dtype=np.float64)
+        self._vocabularies: List[Dict[tuple, int]] = []
+        self._reference_counts: List[np.ndarray] = []
+        for n in range(1, _BLEU_MAX_N + 1):
+            counts = [_ngram_counts(t, n) for t in candidate_tokens]
+            vocab: Dict[tuple, int] = {}
+            for candidate_counts in counts:
+                for ngram in candidate_counts:
+                    vocab.setdefault(ngram, len(vocab))
+            ref = np.zeros((len(counts), len(vocab)), dtype=np.int32)
+            for row, candidate_counts in enumerate(counts):
+                for ngram, count in candidate_counts.items():
+                    ref[row, vocab[ngram]] = count
+            self._vocabularies.append(vocab)
+            self._reference_counts.append(ref)
+
+    def _clipped_matches(self, line_counts: List[Counter], n: int) -> np.ndarray:
+        """
+        Sum over n-grams of min(line count, candidate count) for every (line, candidate) pair.
+        """
+        vocab, ref = self._vocabularies[n - 1], self._reference_counts[n - 1]
+        n_lines, n_candidates = len(line_counts), ref.shape[0]
+        matches = np.zeros((n_lines, n_candidates), dtype=np.int64)
+
+        # Line n-grams that no candidate contains cannot be matched, so only the candidate vocabulary is kept
+        rows: List[int] = []
+        columns: List[int] = []
+        counts: List[int] = []
+        for row, line in enumerate(line_counts):
+            for ngram, count in line.items():
+                column = vocab.get(ngram)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    counts.append(count)
+        if not rows:
+            return matches
+
+        rows_array = np.array(rows, dtype=np.intp)
+        columns_array = np.array(columns, dtype=np.intp)
+        counts_array = np.array(counts, dtype=np.int32)
+        step = max(1, _CHUNK_ELEMENTS // max(1, n_candidates))
+        for start in range(0, len(rows), step):
+            end = start + step
+            clipped = np.minimum(counts_array[start:end, None], ref[:, columns_array[start:end]].T)
+            np.add.at(matches, rows_array[start:end], clipped)
+        return matches
+
+    def score_tokens(self, line_tokens: Sequence[Sequence[str]]) -> np.ndarray:
+        """
+        Return a (lines x candidates) array of sentence BLEU scores for pre-tokenized lines.
+        """
+        n_lines, n_candidates = len(line_tokens), len(self.candidates)
+        if not n_lines or not n_candidates:
+            return np.zeros((n_lines, n_candidates), dtype=np.float64)
+
+        hyp_lengths = np.array([len(t) for t in line_tokens], dtype=np.float64)[:, None]
+        log_precision = np.zeros((n_lines, n_candidates), dtype=np.float64)
+        no_unigram_match = None
+        for n in range(1, _BLEU_MAX_N + 1):
+            line_counts = [_ngram_counts(t, n) for t in line_tokens]
+            numerators = self._clipped_matches(line_counts, n)
+            denominators = np.maximum(1.0, hyp_lengths - n + 1)
+            if n == 1:
+                no_unigram_match = numerators == 0
+            precision = np.where(numerators == 0, _BLEU_EPSILON / denominators, numerators / denominators)
+            log_precision += np.log(precision) / _BLEU_MAX_N
+
+        ref_lengths = self._candidate_lengths[None, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            brevity = np.where(
+                hyp_lengths > ref_lengths,
+                1.0,
+                np.where(hyp_lengths == 0, 0.0, np.exp(1 - ref_lengths / hyp_lengths)),
+            )
+        scores = brevity * np.exp(log_precision)
+        scores[no_unigram_match] = 0.0
+        return scores
+
+    def score(self, lines: Sequence[str]) -> np.ndarray:
+        """
+        Tokenize each line once and return its BLEU scores against every candidate.
+        """
+        return self.score_tokens([tokenize(ln) for ln in lines])
+
+
 def extract_by_bleu_and_sections(
     text: str,
     questions_json_input: Union[str, Sequence[Dict[str, Any]]],
@@ -120,9 +241,8 @@ def extract_by_bleu_and_sections(
     if not numbered_indices or numbered_indices[-1] != len(lines):
         numbered_indices.append(len(lines))
 
-    results: List[Dict[str, str]] = []
-
-    # Iterate over each question section (expected structure described above)
+    # Keep the well-formed question sections (expected structure described above)
+    sections: List[tuple] = []
     for section in questions_json:
         if not isinstance(section, dict):
             continue
@@ -131,15 +251,30 @@ def extract_by_bleu_and_sections(
         if not qid or not candidates:
             # skip incomplete entries
             continue
+        sections.append((qid, list(candidates)))
 
-        matched_positions: List[tuple[int, str]] = []
+    # Score every candidate line against every candidate question of every section in one pass
+    line_indices = [idx for idx, ln in enumerate(lines) if ln and "http://" not in ln and "https://" not in ln]
+    matcher = BleuMatcher([q for _, candidates in sections for q in candidates])
+    scores = matcher.score([lines[idx] for idx in line_indices])
+
+    results: List[Dict[str, str]] = []
+
+    offset = 0
+    for qid, candidates in sections:
+        section_scores = scores[:, offset:offset + len(candidates)]
+        offset += len(candidates)
+        if not len(line_indices):
+            continue
 
-        for idx, ln in enumerate(lines):
-            if not ln or "http://" in ln or "https://" in ln:
-                continue
-            best = best_bleu_match(ln, candidates, threshold=bleu_threshold)
-            if best:
-                matched_positions.append((idx, best))
+        # First best-scoring candidate per line, as in best_bleu_match
+        best_columns = section_scores.argmax(axis=1)
+        best_scores = section_scores.max(axis=1)
+        matched_positions: List[tuple[int, str]] = [
+            (line_indices[row], candidates[best_columns[row]])
+            for row in range(len(line_indices))
+            if best_scores[row] > 0.0 and best_scores[row] >= bleu_threshold
+        ]
 
         if not matched_positions:
             continue
@@ -1,11 +1,12 @@
 from pathlib import Path
 import json, re
+from app.models.answer_key import AnswerKey
 
 """ Repository to parse and retrieve model Q&A from answer files. """
 
 
-def model_qna_repository(folder_path) -> list:
-    """ Parses model answer file and retrieves question and answer pairs. """
+def model_qna_repository(folder_path) -> AnswerKey:
+    """ Parses model answer file and retrieves question and answer pairs, indexed by question_id. """
     path = Path(folder_path)
     model_answer_file_path = next(path.rglob('*.txt'))  # Get the txt file path
     with open(model_answer_file_path, 'r') as f:
@@ -51,5 +52,5 @@ def model_qna_repository(folder_path) -> list:
                 "answer_text": answer_text
             })
 
-    # Returns a list of dictionaries with question_id, question_text, and answer_text
-    return parsed_data
\ No newline at end of file
+    # Returns the question_id, question_text, and answer_text entries indexed by question_id
+    return AnswerKey.from_records(parsed_data)
\ No newline at end of file
@@ -1,44 +1,131 @@
 import re, os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 """ Repository to parse and retrieve student answers from submission files. """
 
 
-def student_answers_repository(folder_path) -> dict:
-    """ Parses student submission files and retrieves their answers."""
-    path = Path(folder_path + '/submissions')
-    student_answers = {}
-    for student_dir in os.listdir(path):
-        student_path = path / student_dir
-        submission_file_path = student_path / 'submission.txt'
+# The single regex pattern, compiled once
+# Breakdown:
+# 1. (\d+)\. : Match and capture the question ID (Group 1).
+# 2. \s* : Match any whitespace after the ID.
+# 3. ([\s\S]*?) : Match and capture the unified Question and Answer (Group 2).
+# 4. (?=\n\n\d+\.|\Z) : Positive lookahead to ensure the match ends before the next question or at the end of the string.
+SUBMISSION_PATTERN = re.compile(r'(\d+)\.\s*([\s\S]*?)(?=\n\n\d+\.|\Z)\s*', re.MULTILINE)
+
+# Matches an answer that repeats its question first (a line ending in '?') and captures the rest
+QUESTION_PREFIX_PATTERN = re.compile(r'^.*?\?[ \t]*\n(.*)', re.DOTALL)
+
+# Number of parsed submissions allowed to wait ahead of the consumer, per worker process
+PREFETCH_PER_WORKER = 4
+
+
+class IngestionReport:
+    """ Side report of submissions that could not be parsed, so one bad file does not stop a run. """
+    def __init__(self):
+        self.parsed = 0
+        self.flagged = []
+
+    def flag(self, student, path, reason) -> None:
+        """ Record a submission that was skipped. """
+        self.flagged.append({"student": student, "path": str(path), "reason": reason})
+
+    def to_dict(self) -> dict:
+        return {"parsed": self.parsed, "flagged": self.flagged}
+
+
+def parse_submission(text_content: str) -> list:
+    """ Parses the text of one submission into its question_id/student_answer entries. """
+    parsed_data = []
+    for question_id, answer in SUBMISSION_PATTERN.findall(text_content):
+        student_answer_full = answer.strip()
+        # Strips out the question if it's included (before ?\n)
+        ans_qn = QUESTION_PREFIX_PATTERN.search(student_answer_full)
+        if ans_qn:
+            student_answer_full = ans_qn.group(1).strip()
+
+        parsed_data.append({
+            "question_id": int(question_id),
+            "student_answer": student_answer_full
+        })
+    return parsed_data
+
+
+def _parse_student_dir(student_path: str) -> tuple:
+    """
+    Parses the submission of one student directory.
+    Runs in worker processes, so it only takes and returns plain picklable values.
+    Returns (student, answers, None) on success or (student, None, reason) if the file can't be parsed.
+    """
+    student = os.path.basename(student_path)
+    submission_file_path = os.path.join(student_path, 'submission.txt')
+    try:
         with open(submission_file_path, encoding='utf-8') as file:
             text_content = file.read()
-        parsed_data = []
-
-        # The single regex pattern
-        # Breakdown:
-        # 1. (\d+)\. : Match and capture the question ID (Group 1).
-        # 2. \s* : Match any whitespace after the ID.
-        # 3. ([\s\S]*?) : Match and capture the unified Question and Answer (Group 2).
-        # 4. (?=\n\n\d+\.|\Z) : Positive lookahead to ensure the match ends before the next question or at the end of the string.
-        pattern = re.compile(r'(\d+)\.\s*([\s\S]*?)(?=\n\n\d+\.|\Z)\s*', re.MULTILINE)
-
-        matches = pattern.findall(text_content)
-        for match in matches:
-            question_id = match[0]
-            student_answer_full = match[1].strip()
-            # Strips out the question if it's included (before ?/n)
-            ans_qn = re.search(r'^.*?\?\s+/n(.*)', student_answer, re.DOTALL)
-            if ans_qn:
-                 student_answer_full = match.group(1)
-                
-            entry = {
-                "question_id": int(question_id),
-                "student_answer": student_answer_full
-            }
-            parsed_data.append(entry)
-
-        student_answers[student_dir] = parsed_data
+    except FileNotFoundError:
+        return student, None, "missing submission.txt"
+    except (OSError, UnicodeDecodeError) as e:
+        return student, None, f"unreadable submission.txt: {e}"
+
+    parsed_data = parse_submission(text_content)
+    if not parsed_data:
+        return student, None, "no numbered answers found"
+    return student, parsed_data, None
+
+
+def _student_dirs(folder_path):
+    """ Lazily lists the student directories under `<folder_path>/submissions`. """
+    with os.scandir(Path(folder_path) / 'submissions') as entries:
+        for entry in entries:
+            if entry.is_dir():
+                yield entry.path
+
+
+def iter_student_answers(folder_path, workers=None, report: IngestionReport = None):
+    """
+    Parses student submissions in a process pool and yields (student, answers) as soon as each is parsed.
+    Students are yielded in directory listing order, with a bounded number of parsed submissions
+    held ahead of the consumer. Unparseable submissions are recorded in `report` and skipped.
+    Args:
+        folder_path (str): Assignment folder containing a `submissions` directory.
+        workers (int): Worker processes; None uses all CPUs, 1 parses in the calling process.
+        report (IngestionReport): Collects parsed counts and flagged files.
+    """
+    report = report if report is not None else IngestionReport()
 
+    def handle(result):
+        student, answers, reason = result
+        if reason:
+            report.flag(student, Path(folder_path) / 'submissions' / student / 'submission.txt', reason)
+            return None
+        report.parsed += 1
+        return student, answers
+
+    if workers == 1:
+        for student_path in _student_dirs(folder_path):
+            parsed = handle(_parse_student_dir(student_path))
+            if parsed:
+                yield parsed
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        window = PREFETCH_PER_WORKER * workers
+        in_flight = deque()
+        for student_path in _student_dirs(folder_path):
+            in_flight.append(executor.submit(_parse_student_dir, student_path))
+            if len(in_flight) >= window:
+                parsed = handle(in_flight.popleft().result())
+                if parsed:
+                    yield parsed
+        while in_flight:
+            parsed = handle(in_flight.popleft().result())
+            if parsed:
+                yield parsed
+
+
+def student_answers_repository(folder_path, workers=1, report: IngestionReport = None) -> dict:
+    """ Parses student submission files and retrieves their answers."""
     # Returns a dictionary with student names as keys and list of their answers as values
-    return student_answers
+    return dict(iter_student_answers(folder_path, workers=workers, report=report))
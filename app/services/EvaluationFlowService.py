@@ -1,7 +1,15 @@
-from app.repositories.model_qna_repository import model_qna_repository
-from app.repositories.student_answers_repository import student_answers_repository
-from app.services.evaluation_service import evaluate_all_students, evaluate_all_evaluations
+import asyncio
+import os
+import time
+from app.clients.CascadeClient import CascadeClient
+from app.clients.ProviderRouter import ProviderRouter
+from app.repositories.data_loaders import DirectoryLoader
+from app.repositories.student_answers_repository import IngestionReport
+from app.services.evaluation_service import evaluate_all_students, evaluate_all_students_async, \
+    evaluate_all_students_batch, evaluate_all_evaluations, enqueue_all_students
 from app.services.folder_write_service import write_json
+from app.services.GradingCache import client_fingerprint
+from app.utils.metrics import metrics
 
 """ Implements the evaluation flow service to manage the end-to-end process of"""
 
@@ -9,37 +17,255 @@ from app.services.folder_write_service import write_json
 class EvaluationFlowService:
     """ Service to manage the flow of evaluation from data retrieval to export."""
     def __init__(self):
+        self.path = None
+        self.assignment = None
         self.modelqna = None
         self.studentanswers = None
+        self.ingestion_report = None
+        self.manifest = None
+        self.sink = None
         self.evaluation = []
 
-    def retrieve_data(self, path) -> None:
-        """ Retrieve model Q&A and student answers from the specified path."""
-        self.modelqna = model_qna_repository(path)
-        self.studentanswers = student_answers_repository(path)
-
-    def evaluate_data(self, client) -> list:
-        """ Evaluate student answers against model answers using the provided client."""
-        self.evaluation = evaluate_all_students(
-            client,
-            self.modelqna,
-            self.studentanswers
-        )
+    def retrieve_data(self, path=None, stream=False, workers=1, loader=None) -> None:
+        """
+        Retrieve model Q&A and student answers from the specified path, or from a DataLoader
+        (e.g. an SQL table or CSV export, see data_loaders).
+        With `stream=True`, submissions are parsed in `workers` processes (or read from the loader in
+        batches) while they are being graded; the student answers can then only be evaluated once.
+        Unparseable submissions are listed in `ingestion_report` instead of stopping the run.
+        Parse times are recorded as the `answer_key` and `submissions` stages of the run metrics
+        (streamed submissions are parsed during, and timed as part of, grading).
+        """
+        if loader is None:
+            if path is None:
+                raise ValueError("Either a path or a loader is required.")
+            loader = DirectoryLoader(path, workers=workers)
+        self.path = loader.path if loader.path is not None else loader.name
+        self.assignment = loader.name
+        with metrics.stage('answer_key'):
+            self.modelqna = loader.answer_key()
+        self.ingestion_report = IngestionReport()
+        if stream:
+            self.studentanswers = loader.iter_student_answers(report=self.ingestion_report)
+        else:
+            with metrics.stage('submissions'):
+                self.studentanswers = dict(loader.iter_student_answers(report=self.ingestion_report))
+
+    def _prepare_manifest(self, client, manifest=None, pre_grader=None, semantic=None, clusterer=None) -> None:
+        """ Hash the current inputs and grading config into the manifest, to compare with its previous run. """
+        self.manifest = manifest
+        if manifest is not None:
+            config = {
+                "client": client_fingerprint(client),
+                "pre_grader": pre_grader.get_config() if pre_grader is not None else None,
+                "semantic": semantic.get_config() if semantic is not None else None,
+                "clusterer": clusterer.get_config() if clusterer is not None else None
+            }
+            manifest.prepare(self.path, self.modelqna, config)
+
+    def _print_reports(self, cache=None, pre_grader=None, semantic=None, clusterer=None, client=None) -> None:
+        """ Print the ingestion, manifest, cache, pre-grading and prompt cache reports of a run, if used. """
+        if self.ingestion_report is not None and self.ingestion_report.flagged:
+            print(f"Unparseable submissions: {self.ingestion_report.flagged}")
+        if self.manifest is not None:
+            print(f"Incremental re-grading report: {self.manifest.report()}")
+        if self.sink is not None:
+            print(f"Result sink report: {self.sink.report()}")
+        if cache is not None:
+            print(f"Grading cache report: {cache.report()}")
+        if pre_grader is not None:
+            print(f"Pre-grading report: {pre_grader.report()}")
+        if semantic is not None:
+            print(f"Semantic grading report: {semantic.report()}")
+        if clusterer is not None:
+            print(f"Answer clustering report: {clusterer.report()}")
+        if isinstance(client, CascadeClient):
+            print(f"Model cascade report: {client.report()}")
+        if isinstance(client, ProviderRouter):
+            print(f"Provider routing report: {client.report()}")
+        token_usage = metrics.token_usage()
+        if token_usage["prompt"]:
+            print(f"Prompt cache report: {token_usage}")
+
+    def evaluate_data(self, client, max_concurrency=None, cache=None, pack_size=None, pre_grader=None,
+                      manifest=None, sink=None, semantic=None, clusterer=None) -> list:
+        """
+        Evaluate student answers against model answers using the provided client.
+        If `max_concurrency` is set, answers are graded concurrently with at most that many requests in flight.
+        If a GradingCache is given, unchanged answers are served from it and its hit/miss report is printed.
+        If `pack_size` is set, up to that many answers are graded in one request (see OpenAPIClient.evaluate_packed).
+        If a PreGrader is given, exact and numeric matches are graded locally and its stage report is printed.
+        If a RunManifest is given, only answers whose submission, answer key entry or grading config changed
+        since the run it describes are graded; the rest are merged in from that run's evaluation JSON.
+        The manifest is updated by `export_data`.
+        If a ResultSink is given, every graded answer is appended to it straight away and answers already in a
+        resumed sink are skipped; the results are then only kept on disk until `export_data` compacts them.
+        If a SemanticGrader is given, answers are also graded by embedding similarity to the model answer
+        and near-duplicate answers are graded once per cluster.
+        If an AnswerClusterer is given, equivalent answers are graded once per cluster and the cluster sizes
+        are reported.
+        If `client` is a CascadeClient, answers are graded by its cheapest model and only uncertain ones are
+        escalated; each evaluation records the deciding `tier` and the answers decided per tier are reported.
+        """
+        if pack_size and isinstance(client, CascadeClient):
+            raise ValueError("Packed grading is not supported with a model cascade.")
+        if semantic is not None:
+            semantic.use_assignment(self._assignment())
+        with metrics.stage('manifest'):
+            self._prepare_manifest(client, manifest, pre_grader, semantic, clusterer)
+        self.sink = sink
+        with metrics.stage('grading'):
+            if max_concurrency:
+                self.evaluation = asyncio.run(evaluate_all_students_async(
+                    client,
+                    self.modelqna,
+                    self.studentanswers,
+                    max_concurrency=max_concurrency,
+                    cache=cache,
+                    pack_size=pack_size,
+                    pre_grader=pre_grader,
+                    manifest=manifest,
+                    sink=sink,
+                    semantic=semantic,
+                    clusterer=clusterer
+                ))
+            else:
+                self.evaluation = evaluate_all_students(
+                    client,
+                    self.modelqna,
+                    self.studentanswers,
+                    cache=cache,
+                    pack_size=pack_size,
+                    pre_grader=pre_grader,
+                    manifest=manifest,
+                    sink=sink,
+                    semantic=semantic,
+                    clusterer=clusterer
+                )
+        self._print_reports(cache, pre_grader, semantic, clusterer, client)
         return self.evaluation
 
-    def evaluate_evaluations(self, client) -> list:
-        """ Re-evaluate the previous evaluations for consistency or further analysis."""
-        self.evaluation = evaluate_all_evaluations(client, self.evaluation)
+    def evaluate_data_batch(self, client, batch_dir='target/batch', poll_interval=30.0, timeout=None,
+                            cache=None, pre_grader=None, manifest=None, sink=None, semantic=None,
+                            clusterer=None) -> list:
+        """
+        Evaluate student answers through the client's batch API (see OpenAPIClient.submit_batch).
+        Slower to complete, but cheaper and not bound by per-request rate limits.
+        """
+        if semantic is not None:
+            semantic.use_assignment(self._assignment())
+        with metrics.stage('manifest'):
+            self._prepare_manifest(client, manifest, pre_grader, semantic, clusterer)
+        self.sink = sink
+        with metrics.stage('grading'):
+            self.evaluation = evaluate_all_students_batch(
+                client,
+                self.modelqna,
+                self.studentanswers,
+                batch_dir=batch_dir,
+                poll_interval=poll_interval,
+                timeout=timeout,
+                cache=cache,
+                pre_grader=pre_grader,
+                manifest=manifest,
+                sink=sink,
+                semantic=semantic,
+                clusterer=clusterer
+            )
+        self._print_reports(cache, pre_grader, semantic, clusterer, client)
+        return self.evaluation
+
+    def _assignment(self) -> str:
+        """ Name of the retrieved assignment, i.e. its folder name or the loader's name. """
+        return self.assignment or os.path.basename(os.path.normpath(self.path))
+
+    def enqueue_data(self, queue, run=None, pre_grader=None) -> str:
+        """
+        Add one WorkQueue task per student answer for worker processes to grade (see worker.py).
+        Answers the PreGrader is certain about are enqueued as already graded.
+        `run` names the grading run within the queue and defaults to the assignment name. Returns the run.
+        """
+        run = run or self._assignment()
+        with metrics.stage('enqueue'):
+            added = enqueue_all_students(queue, run, self._assignment(), self.modelqna, self.studentanswers,
+                                         pre_grader=pre_grader)
+        print(f"Enqueued {added} tasks for run '{run}': {queue.counts(run)}")
+        return run
+
+    def collect_queue_results(self, queue, run=None, poll_interval=1.0, timeout=None) -> list:
+        """
+        Wait until the workers have finished every task of the run, then assemble the graded tasks into the
+        evaluation results, in the format `export_data` writes. Tasks that failed keep an evaluation of None.
+        """
+        run = run or self._assignment()
+        started = time.monotonic()
+        with metrics.stage('grading'):
+            while queue.remaining(run):
+                if timeout is not None and time.monotonic() - started > timeout:
+                    raise TimeoutError(f"Run '{run}' did not finish within {timeout} seconds.")
+                time.sleep(poll_interval)
+        self.sink = None
+        self.evaluation = queue.results(run, self._assignment())
+        print(f"Work queue report for run '{run}': {queue.counts(run)}")
+        return self.evaluation
+
+    def evaluate_evaluations(self, client, sample_rate=1.0, stages=None, max_concurrency=None, cache=None,
+                             confidence_below=None) -> list:
+        """
+        Review the previous evaluations for consistency or further analysis (see evaluate_all_evaluations).
+        Only `sample_rate` of the items, plus those graded with a confidence below `confidence_below`,
+        optionally only those graded by `stages`, are reviewed; with `max_concurrency` reviews run
+        concurrently and with a GradingCache unchanged reviews are reused.
+        """
+        with metrics.stage('review'):
+            self.evaluation = evaluate_all_evaluations(client, self.evaluation, sample_rate=sample_rate,
+                                                       stages=stages, max_concurrency=max_concurrency, cache=cache,
+                                                       confidence_below=confidence_below)
+        reviews = [item["evaluation"]["review"] for student in self.evaluation
+                   for item in student.get("evaluations", []) if (item.get("evaluation") or {}).get("review")]
+        print(f"Review report: {{'reviewed': {len(reviews)}, "
+              f"'disagreed': {sum(1 for review in reviews if not review['agree'])}}}")
+        if cache is not None:
+            print(f"Grading cache report: {cache.report()}")
         return self.evaluation
 
     def export_data(self, name=None, path=None) -> None:
-        """ Export the evaluation results to a JSON file."""
+        """
+        Export the evaluation results to a JSON file, with the run manifest next to it if one was used.
+        Results streamed to a ResultSink are compacted from it into the same nested JSON format.
+        """
         args = {}
         if name:
             args['name'] = name
         if path:
             args['save_path'] = path
-        write_json(self.evaluation, **args)
+        results_path = f"{path or 'target'}/{name or 'evaluation_results'}.json"
+        with metrics.stage('export'):
+            if self.sink is not None:
+                self.evaluation = self.sink.compact(results_path)
+            else:
+                write_json(self.evaluation, **args)
+            if self.manifest is not None:
+                self.manifest.save(results_path)
+
+    def export_to_store(self, store, run=None) -> str:
+        """
+        Add the evaluation results to a ResultStore under `run` (by default a new, time-stamped run).
+        Call after `export_data` when results were streamed to a ResultSink. Returns the run.
+        """
+        with metrics.stage('export'):
+            run = store.start_run(run)
+            written = store.write(run, self._assignment(), self.evaluation)
+        print(f"Stored {written} results of run '{run}' in {store.path}")
+        return run
+
+    @staticmethod
+    def export_metrics(path='logs', name='run_report') -> None:
+        """
+        Export the run metrics (request latency histograms, token usage, retries, cache lookups
+        and stage wall times) as `<name>.json` and OpenMetrics `<name>.prom` files.
+        """
+        metrics.write(path, name)
 
 
 
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from app.models.schemas import EvaluationResponse
+from app.utils.metrics import metrics
+
+""" Persistent, content-addressed cache of evaluation responses, keyed on everything that affects a grade. """
+
+
+# Default location and size budget of the on-disk cache
+DEFAULT_CACHE_PATH = 'target/grading_cache.sqlite'
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _json_default(value):
+    """ Serialize config values that are not plain JSON, such as pydantic response formats. """
+    if hasattr(value, 'model_json_schema'):
+        return value.model_json_schema()
+    return repr(value)
+
+
+def normalize_student_answer(student: str) -> str:
+    """ Normalize a student answer for keying: trim and collapse runs of whitespace. """
+    return " ".join((student or "").split())
+
+
+def client_fingerprint(client) -> str:
+    """ Stable description of the provider and model configuration a client grades with. """
+    # Middleware such as RateLimitedClient exposes the client it wraps as `__wrapped__`
+    while hasattr(client, '__wrapped__'):
+        client = client.__wrapped__
+    config = client.get_config() if hasattr(client, 'get_config') else {}
+    return json.dumps(
+        {"provider": type(client).__name__, "config": config},
+        sort_keys=True,
+        default=_json_default
+    )
+
+
+class GradingCache:
+    """
+    On-disk cache of EvaluationResponse objects stored in SQLite.
+    Entries are evicted least-recently-used first once the stored size exceeds `max_bytes`.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        """ Open (or create) the cache database at the given path. """
+        os.makedirs(Path(path).parent, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(fingerprint, question, model, student, namespace='evaluate', context=None) -> str:
+        """
+        Hash the client fingerprint (provider, model config, prompts) and the normalized inputs into a cache key.
+        The fingerprint comes from `client_fingerprint` and is computed once per run by the caller.
+        `context` is any further JSON serializable input of the request, e.g. the evaluation under review.
+        """
+        parts = [namespace, fingerprint, question, model, normalize_student_answer(student)]
+        if context is not None:
+            parts.append(context)
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key, schema=EvaluationResponse) -> Optional[EvaluationResponse]:
+        """ Return the cached response for a key, parsed as the pydantic `schema`, or None on a miss. """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.inc('cache_lookups', result='miss')
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            metrics.inc('cache_lookups', result='hit')
+        return schema.model_validate_json(row[0])
+
+    def put(self, key, evaluation_response) -> None:
+        """ Store a response and evict the least recently used entries if over budget. """
+        value = evaluation_response.model_dump_json()
+        size = len(key) + len(value)
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """ Delete least recently used entries until the total size is within `max_bytes`. """
+        if self._total_bytes <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall()
+        for key, size in rows:
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def report(self) -> dict:
+        """ Summarize cache effectiveness for the current process. """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "collapsed": self.collapsed,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self._total_bytes,
+        }
+
+    def close(self) -> None:
+        """ Close the underlying database connection. """
+        self._conn.close()
@@ -0,0 +1,127 @@
+import asyncio
+import os
+from pathlib import Path
+
+from app.repositories.data_loaders import DirectoryLoader
+from app.repositories.student_answers_repository import IngestionReport
+from app.services.evaluation_service import DEFAULT_MAX_CONCURRENCY, evaluate_assignments_async
+from app.services.folder_write_service import write_json
+from app.services.GradingCache import client_fingerprint
+from app.services.manifest_service import RunManifest
+from app.utils.metrics import metrics
+
+""" Implements the flow service to grade every assignment under a root directory as one workload. """
+
+
+def discover_assignments(root) -> list:
+    """ Assignment folders directly under `root`, i.e. folders with a `submissions` directory, sorted by name. """
+    with os.scandir(root) as entries:
+        return sorted(entry.path for entry in entries
+                      if entry.is_dir() and (Path(entry.path) / 'submissions').is_dir())
+
+
+class MultiAssignmentFlowService:
+    """ Service to grade all assignments of a term together and export one result file per assignment. """
+    def __init__(self, save_path='target'):
+        self.save_path = save_path
+        self.paths = {}
+        self.assignments = {}
+        self.ingestion_reports = {}
+        self.manifests = {}
+        self.evaluation = {}
+
+    def _results_path(self, name) -> str:
+        return f"{self.save_path}/{name}/evaluation_results.json"
+
+    def retrieve_data(self, root=None, workers=1, loaders=None, stream=False) -> None:
+        """
+        Discover the assignments under `root` and retrieve the model Q&A and student answers of each,
+        or retrieve them from `loaders`, a list of DataLoaders (e.g. one SQLLoader per assignment).
+        With `stream=True`, student answers are read from each source while its answers are queued for
+        grading instead of up front, and can then only be evaluated once.
+        """
+        if loaders is None:
+            loaders = [DirectoryLoader(path, workers=workers) for path in discover_assignments(root)]
+        for loader in loaders:
+            name = loader.name
+            report = IngestionReport()
+            self.paths[name] = loader.path if loader.path is not None else name
+            self.ingestion_reports[name] = report
+            with metrics.stage('answer_key'):
+                model_qna = loader.answer_key()
+            if stream:
+                student_answers = loader.iter_student_answers(report=report)
+            else:
+                with metrics.stage('submissions'):
+                    student_answers = dict(loader.iter_student_answers(report=report))
+            self.assignments[name] = (model_qna, student_answers)
+        print(f"Found {len(self.assignments)} assignments{f' under {root}' if root else ''}: {list(self.assignments)}")
+
+    def evaluate_data(self, client, max_concurrency=DEFAULT_MAX_CONCURRENCY, cache=None, pack_size=None,
+                      pre_grader=None, incremental=False, clusterer=None) -> dict:
+        """
+        Grade every assignment through one shared, fairly scheduled work queue (see evaluate_assignments_async).
+        With `incremental=True`, each assignment keeps a RunManifest next to its results and only
+        answers whose inputs changed since the last export are graded.
+        """
+        self.manifests = {}
+        if incremental:
+            config = {
+                "client": client_fingerprint(client),
+                "pre_grader": pre_grader.get_config() if pre_grader is not None else None,
+                "clusterer": clusterer.get_config() if clusterer is not None else None
+            }
+            with metrics.stage('manifest'):
+                for name, (model_qna, _) in self.assignments.items():
+                    manifest = RunManifest(self._results_path(name))
+                    manifest.prepare(self.paths[name], model_qna, config)
+                    self.manifests[name] = manifest
+
+        with metrics.stage('grading'):
+            self.evaluation = asyncio.run(evaluate_assignments_async(
+                client,
+                self.assignments,
+                max_concurrency=max_concurrency,
+                cache=cache,
+                pack_size=pack_size,
+                pre_grader=pre_grader,
+                manifests=self.manifests,
+                clusterer=clusterer
+            ))
+
+        for name, report in self.ingestion_reports.items():
+            if report.flagged:
+                print(f"Unparseable submissions in {name}: {report.flagged}")
+        for name, manifest in self.manifests.items():
+            print(f"Incremental re-grading report for {name}: {manifest.report()}")
+        if cache is not None:
+            print(f"Grading cache report: {cache.report()}")
+        if pre_grader is not None:
+            print(f"Pre-grading report: {pre_grader.report()}")
+        if clusterer is not None:
+            print(f"Answer clustering report: {clusterer.report()}")
+        token_usage = metrics.token_usage()
+        if token_usage["prompt"]:
+            print(f"Prompt cache report: {token_usage}")
+        return self.evaluation
+
+    def export_data(self) -> None:
+        """ Export the results of each assignment to `<save_path>/<assignment>/evaluation_results.json`. """
+        with metrics.stage('export'):
+            for name, results in self.evaluation.items():
+                write_json(results, save_path=f"{self.save_path}/{name}")
+                if name in self.manifests:
+                    self.manifests[name].save(self._results_path(name))
+
+    def export_to_store(self, store, run=None) -> str:
+        """ Add the results of every assignment to a ResultStore under one `run`. Returns the run. """
+        with metrics.stage('export'):
+            run = store.start_run(run)
+            written = sum(store.write(run, name, results) for name, results in self.evaluation.items())
+        print(f"Stored {written} results of run '{run}' in {store.path}")
+        return run
+
+    @staticmethod
+    def export_metrics(path='logs', name='run_report') -> None:
+        """ Export the run metrics as `<name>.json` and OpenMetrics `<name>.prom` files. """
+        metrics.write(path, name)
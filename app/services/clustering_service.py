@@ -0,0 +1,50 @@
+from collections import defaultdict
+
+from app.utils.normalization import canonical_form
+
+""" Clustering of equivalent student answers, so one LLM grade covers every answer in a cluster. """
+
+
+class AnswerClusterer:
+    """
+    Groups the answers to each question by canonical form (see `canonical_form`), e.g. 'RFC 0792',
+    'rfc792' and 'RFC 792.' form one cluster, as do '87, 134, 135' and '135, 134 and 87'.
+    Only one representative per cluster is graded and its response is fanned out to all members.
+    """
+    def __init__(self):
+        self._sizes = defaultdict(list)
+
+    def get_config(self) -> dict:
+        """ How answers are clustered, for run manifests; graded clusters depend on it. """
+        return {"key": "canonical_form"}
+
+    def cluster(self, groups: list) -> list:
+        """
+        Merge (key, items) groups whose answers share a question and canonical form.
+        Each merged group keeps the key of its first group, so only that representative is graded and cached.
+        """
+        clusters = {}
+        for key, items in groups:
+            first = items[0]
+            cluster_key = (first['question_id'], first['model_answer'], canonical_form(first['student_answer']))
+            if cluster_key in clusters:
+                clusters[cluster_key][1].extend(items)
+            else:
+                clusters[cluster_key] = (key, list(items))
+        for (question_id, _, _), (_, items) in clusters.items():
+            self._sizes[question_id].append(len(items))
+        return list(clusters.values())
+
+    def report(self) -> dict:
+        """ Per question: answers sent on, distinct clusters (= LLM requests) and the largest cluster sizes. """
+        questions = {
+            question_id: {
+                "answers": sum(sizes),
+                "clusters": len(sizes),
+                "largest": sorted(sizes, reverse=True)[:5],
+            }
+            for question_id, sizes in sorted(self._sizes.items())
+        }
+        answers = sum(question["answers"] for question in questions.values())
+        clusters = sum(question["clusters"] for question in questions.values())
+        return {"answers": answers, "clusters": clusters, "questions": questions}
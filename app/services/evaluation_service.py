@@ -1,47 +1,282 @@
+import asyncio
+import hashlib
 import json
+import time
+from collections import deque
+from collections.abc import Mapping
 from dotenv import load_dotenv
-from app.models.schemas import EvaluationResponse
+from app.models.answer_key import AnswerKey
+from app.models.schemas import CascadeEvaluationResponse, EvaluationResponse, ReviewResponse
+from app.services.clustering_service import AnswerClusterer
+from app.services.GradingCache import GradingCache, client_fingerprint
+from app.services.manifest_service import RunManifest
+from app.services.pre_grading_service import PreGrader, STAGE_LLM
+from app.services.result_sink_service import ResultSink
+from app.services.semantic_service import SemanticGrader, STAGE_SEMANTIC
+from app.services.work_queue_service import WorkQueue
+from app.utils.metrics import metrics
 
 """ Service module to evaluate student answers against model answers"""
 
 
 load_dotenv()
 
+# Default number of evaluation requests allowed in flight at once
+DEFAULT_MAX_CONCURRENCY = 8
 
-def evaluate_all_students(client, model_qna: list, student_answers: dict) -> list:
-    """ Evaluate all student answers against the question and model answer. """
+# Number of students graded together when student answers arrive as a stream
+STREAM_CHUNK_SIZE = 32
+
+
+def _student_chunks(student_answers, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Yield lists of (student, answers) pairs to grade together.
+    A dict is graded as a single chunk; an iterator of pairs (see iter_student_answers) is graded
+    in chunks of `chunk_size` students as they arrive, so grading overlaps with ingestion.
+    """
+    if isinstance(student_answers, Mapping):
+        yield list(student_answers.items())
+        return
+    chunk = []
+    for pair in student_answers:
+        chunk.append(pair)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _build_evaluations(answer_key: AnswerKey, student_answers, manifest: RunManifest = None,
+                       sink: ResultSink = None) -> tuple:
+    """
+    Build the result skeleton in per-student/per-question order from (student, answers) pairs.
+    Returns the results list and the flat list of evaluation items still to be graded;
+    every pending item is also referenced from its student's "evaluations" list.
+    If a RunManifest is given, answers whose inputs are unchanged keep their previous evaluation.
+    If a ResultSink is given, answers it already holds are skipped and the others are registered with it.
+    """
     results = []
-    for student, answers in student_answers.items():
+    pending = []
+    for student, answers in student_answers:
         student_result = {
             "student": student,
             "evaluations": []
         }
-        for answer in answers:
+        for index, answer in enumerate(answers):
             question_id = answer['question_id']
             student_answer = answer['student_answer']
             # Find the corresponding model answer
-            model_answer_entry = next(
-                (item for item in model_qna if item['question_id'] == question_id),
-                None ) # Default if not found
+            model_answer_entry = answer_key.get(question_id)
             if model_answer_entry:
-                question_text = model_answer_entry['question_text']
-                model_answer = model_answer_entry['answer_text']
-                evaluation_response: EvaluationResponse = client.evaluate(
-                    question_text,
-                    model_answer,
-                    student_answer
-                )
-                student_result["evaluations"].append({
+                if sink is not None and sink.is_done(student, question_id):
+                    continue
+                item = {
                     "question_id": question_id,
-                    "question_text": question_text,
-                    "model_answer": model_answer,
+                    "question_text": model_answer_entry.question_text,
+                    "model_answer": model_answer_entry.answer_text,
                     "student_answer": student_answer,
-                    "evaluation": {
-                        "grade": evaluation_response.grade,
-                        "explanation": evaluation_response.explanation
-                    }
-                })
+                    "evaluation": None
+                }
+                student_result["evaluations"].append(item)
+                if sink is not None:
+                    sink.register(student, index, item)
+                if manifest is not None:
+                    item["evaluation"] = manifest.carried_over(student, question_id, student_answer)
+                if item["evaluation"] is None:
+                    pending.append(item)
+                elif sink is not None:
+                    sink.write(item)
         results.append(student_result)
+    return results, pending
+
+
+def _to_evaluation(evaluation_response: EvaluationResponse, stage: str = STAGE_LLM) -> dict:
+    """
+    Convert an EvaluationResponse into the JSON serializable evaluation entry.
+    The model's confidence and the deciding cascade tier (see CascadeClient) are added when known.
+    """
+    evaluation = {
+        "grade": evaluation_response.grade,
+        "explanation": evaluation_response.explanation,
+        "stage": stage
+    }
+    if evaluation_response.confidence is not None:
+        evaluation["confidence"] = evaluation_response.confidence
+    tier = getattr(evaluation_response, 'tier', None)
+    if tier is not None:
+        evaluation["tier"] = tier
+    return evaluation
+
+
+def _pre_grade(pending: list, answer_key: AnswerKey, pre_grader: PreGrader = None, sink: ResultSink = None) -> list:
+    """ Grade what the rule-based pre-grader is certain about; returns the items still needing an LLM. """
+    if pre_grader is None:
+        return pending
+    remaining = []
+    with metrics.stage('pre_grading'):
+        for item in pending:
+            result = pre_grader.grade(item['question_id'], item['model_answer'], item['student_answer'],
+                                      entry=answer_key.get(item['question_id']))
+            if result is None:
+                remaining.append(item)
+            else:
+                evaluation_response, stage = result
+                item["evaluation"] = _to_evaluation(evaluation_response, stage)
+                if sink is not None:
+                    sink.write(item)
+    return remaining
+
+
+def _semantic_grade(pending: list, semantic: SemanticGrader = None, sink: ResultSink = None) -> list:
+    """ Grade answers the semantic stage is confident about; returns the items still needing an LLM. """
+    if semantic is None:
+        return pending
+    remaining = []
+    with metrics.stage('semantic'):
+        for item, evaluation_response in zip(pending, semantic.grade(pending)):
+            if evaluation_response is None:
+                remaining.append(item)
+            else:
+                item["evaluation"] = _to_evaluation(evaluation_response, STAGE_SEMANTIC)
+                if sink is not None:
+                    sink.write(item)
+    return remaining
+
+
+def _cluster_groups(groups: list, clusterer: AnswerClusterer = None, semantic: SemanticGrader = None) -> list:
+    """
+    Fold equivalent answers into one request per cluster: first by canonical form (see AnswerClusterer),
+    then by embedding similarity (see SemanticGrader.cluster).
+    """
+    if clusterer is not None:
+        groups = clusterer.cluster(groups)
+    if semantic is not None:
+        with metrics.stage('semantic'):
+            groups = semantic.cluster(groups)
+    return groups
+
+
+def _group_pending(client, pending: list, cache: GradingCache = None, sink: ResultSink = None) -> list:
+    """
+    Group pending items that need one grading request each.
+    Without a cache every item is its own group. With a cache, identical inputs are collapsed
+    into one group and groups already in the cache are filled in immediately.
+    Returns a list of (cache_key, items) tuples still to be graded.
+    """
+    if cache is None:
+        return [(None, [item]) for item in pending]
+
+    fingerprint = client_fingerprint(client)
+    groups = {}
+    for item in pending:
+        key = cache.make_key(fingerprint, item['question_text'], item['model_answer'], item['student_answer'])
+        groups.setdefault(key, []).append(item)
+
+    to_grade = []
+    for key, items in groups.items():
+        cache.collapsed += len(items) - 1
+        # Read as a cascade response so the tier of cached cascade grades is kept
+        cached_response = cache.get(key, schema=CascadeEvaluationResponse)
+        if cached_response is not None:
+            _record(items, cached_response, sink=sink)
+        else:
+            to_grade.append((key, items))
+    return to_grade
+
+
+def _record(items: list, evaluation_response: EvaluationResponse, cache: GradingCache = None, key=None,
+            sink: ResultSink = None) -> None:
+    """ Fan a response out to every item of a group and persist it to the cache and sink as soon as it arrives. """
+    if cache is not None and key is not None:
+        cache.put(key, evaluation_response)
+    for item in items:
+        item["evaluation"] = _to_evaluation(evaluation_response)
+        if sink is not None:
+            sink.write(item)
+
+
+def _pack_groups(groups: list, pack_size: int) -> list:
+    """
+    Split groups into consecutive packs of at most `pack_size`, each with unique question_ids
+    so that packed responses can be keyed by question_id.
+    """
+    packs = []
+    pack, question_ids = [], set()
+    for group in groups:
+        question_id = group[1][0]['question_id']
+        if len(pack) >= pack_size or question_id in question_ids:
+            packs.append(pack)
+            pack, question_ids = [], set()
+        pack.append(group)
+        question_ids.add(question_id)
+    if pack:
+        packs.append(pack)
+    return packs
+
+
+def _packed_items(pack: list) -> list:
+    """ Convert a pack of groups into the (question_id, question, model, student) tuples sent to the client. """
+    return [(items[0]['question_id'], items[0]['question_text'], items[0]['model_answer'], items[0]['student_answer'])
+            for _, items in pack]
+
+
+def _evaluate_pack(client, pack: list) -> list:
+    """
+    Grade a pack of groups, returning one EvaluationResponse per group.
+    Packs that come back truncated or unparseable are split in half until single answers remain,
+    which are graded with the regular `evaluate` call.
+    """
+    if len(pack) == 1:
+        _, items = pack[0]
+        return [client.evaluate(items[0]['question_text'], items[0]['model_answer'], items[0]['student_answer'])]
+    try:
+        return client.evaluate_packed(_packed_items(pack))
+    except ValueError:
+        middle = len(pack) // 2
+        return _evaluate_pack(client, pack[:middle]) + _evaluate_pack(client, pack[middle:])
+
+
+def _effective_pack_size(client, pack_size, packed_method: str) -> int:
+    """ Use packing only when requested and supported by the client. """
+    if pack_size and pack_size > 1 and hasattr(client, packed_method):
+        return pack_size
+    return 1
+
+
+def evaluate_all_students(client, model_qna, student_answers, cache: GradingCache = None,
+                          pack_size: int = None, pre_grader: PreGrader = None, manifest: RunManifest = None,
+                          sink: ResultSink = None, semantic: SemanticGrader = None,
+                          clusterer: AnswerClusterer = None) -> list:
+    """
+    Evaluate all student answers against the question and model answer.
+    `model_qna` is an AnswerKey (see model_qna_repository) or a list of question/answer dicts.
+    `student_answers` is a dict of student -> answers, or an iterator of (student, answers) pairs
+    (see iter_student_answers) that is graded in chunks while it is still being parsed.
+    If a pre-grader is given, answers it is certain about are graded without the LLM.
+    If a cache is given, identical answers are graded once and cached grades are reused across runs.
+    If `pack_size` is set and the client supports it, up to that many answers are graded per request.
+    If a prepared RunManifest is given, only answers whose inputs changed since its previous run are graded.
+    If a ResultSink is given, each answer is appended to it as soon as it is graded, answers already in it
+    are skipped, and results are not kept in memory: the returned list is empty (see ResultSink.compact).
+    If a SemanticGrader is given, answers close enough to (or far enough from) the model answer are graded by
+    embedding similarity, and near-duplicate answers are sent to the LLM once per cluster.
+    If an AnswerClusterer is given, answers to a question with the same canonical form (case, punctuation,
+    number formatting and list order ignored) are graded once and the grade is fanned out to all of them.
+    A streamed `student_answers` is clustered per chunk of students.
+    """
+    answer_key = AnswerKey.of(model_qna)
+    results = []
+    for chunk in _student_chunks(student_answers):
+        chunk_results, pending = _build_evaluations(answer_key, chunk, manifest, sink)
+        if sink is None:
+            results.extend(chunk_results)
+        pending = _pre_grade(pending, answer_key, pre_grader, sink)
+        pending = _semantic_grade(pending, semantic, sink)
+        groups = _cluster_groups(_group_pending(client, pending, cache, sink), clusterer, semantic)
+        for pack in _pack_groups(groups, _effective_pack_size(client, pack_size, 'evaluate_packed')):
+            for (key, items), evaluation_response in zip(pack, _evaluate_pack(client, pack)):
+                _record(items, evaluation_response, cache, key, sink)
 
     """
     Return the evaluation results as a JSON serializable list.
@@ -53,7 +288,7 @@ def evaluate_all_students(client, model_qna: list, student_answers: dict) -> lis
             "model_answer": "...",
             "student_answer": "...",
             "evaluation":
-                { "grade": "...", "explanation": "..." }
+                { "grade": "...", "explanation": "...", "stage": "exact|numeric|set|regex|llm" }
             }, ...
         ]
     }, ... ]
@@ -62,19 +297,351 @@ def evaluate_all_students(client, model_qna: list, student_answers: dict) -> lis
     return results
 
 
-def evaluate_all_evaluations(client, json_serializable) -> list:
-    """ Re-evaluate all previous evaluations for further analysis or consistency checks. """
-    for student in json_serializable:
-        for question in student.get("evaluations", []):
-            question_text = question.get("question_text", "")
-            model_answer = question.get("model_answer", "")
-            student_answer = question.get("student_answer", "")
-            evaluation = question.get("evaluation", {})
-            response = client.evaluation_review(
-                question_text,
-                model_answer,
-                student_answer,
-                question
+async def _evaluate_async(client, question, model, student) -> EvaluationResponse:
+    """ Call the client's async evaluate, falling back to a worker thread for sync-only clients. """
+    if hasattr(client, 'evaluate_async'):
+        return await client.evaluate_async(question, model, student)
+    return await asyncio.to_thread(client.evaluate, question, model, student)
+
+
+async def _evaluate_pack_async(client, pack: list) -> list:
+    """ Asynchronous variant of `_evaluate_pack`. """
+    if len(pack) == 1:
+        _, items = pack[0]
+        return [await _evaluate_async(client, items[0]['question_text'], items[0]['model_answer'],
+                                      items[0]['student_answer'])]
+    try:
+        return await client.evaluate_packed_async(_packed_items(pack))
+    except ValueError:
+        middle = len(pack) // 2
+        return (await _evaluate_pack_async(client, pack[:middle])
+                + await _evaluate_pack_async(client, pack[middle:]))
+
+
+async def evaluate_all_students_async(client, model_qna, student_answers,
+                                      max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                                      cache: GradingCache = None, pack_size: int = None,
+                                      pre_grader: PreGrader = None, manifest: RunManifest = None,
+                                      sink: ResultSink = None, semantic: SemanticGrader = None,
+                                      clusterer: AnswerClusterer = None) -> list:
+    """
+    Evaluate all student answers concurrently, with at most `max_concurrency` requests in flight.
+    Results keep the same per-student/per-question order and format as `evaluate_all_students`.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1.")
+    answer_key = AnswerKey.of(model_qna)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def grade(pack):
+        async with semaphore:
+            evaluation_responses = await _evaluate_pack_async(client, pack)
+        for (key, items), evaluation_response in zip(pack, evaluation_responses):
+            _record(items, evaluation_response, cache, key, sink)
+
+    results = []
+    for chunk in _student_chunks(student_answers):
+        chunk_results, pending = _build_evaluations(answer_key, chunk, manifest, sink)
+        if sink is None:
+            results.extend(chunk_results)
+        pending = _pre_grade(pending, answer_key, pre_grader, sink)
+        pending = _semantic_grade(pending, semantic, sink)
+        groups = _cluster_groups(_group_pending(client, pending, cache, sink), clusterer, semantic)
+        packs = _pack_groups(groups, _effective_pack_size(client, pack_size, 'evaluate_packed_async'))
+        await asyncio.gather(*(grade(pack) for pack in packs))
+    return results
+
+
+def _round_robin(queues):
+    """ Yield from each queue in turn, so no queue has to drain before another is served. """
+    active = deque(queue for queue in queues if queue)
+    while active:
+        queue = active.popleft()
+        yield queue.popleft()
+        if queue:
+            active.append(queue)
+
+
+async def evaluate_assignments_async(client, assignments: Mapping,
+                                     max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                                     cache: GradingCache = None, pack_size: int = None,
+                                     pre_grader: PreGrader = None, manifests: Mapping = None,
+                                     clusterer: AnswerClusterer = None) -> dict:
+    """
+    Evaluate several assignments through one shared pool of `max_concurrency` in-flight requests.
+    `assignments` maps an assignment name to its (model_qna, student_answers). The grading requests of all
+    assignments go into one work queue served round-robin across assignments, so every assignment makes
+    progress and the provider quota stays saturated instead of draining at the end of each assignment.
+    `manifests` optionally maps assignment names to prepared RunManifests.
+    An AnswerClusterer grades equivalent answers once per cluster, within each assignment.
+    Returns a dict of assignment name -> results in the `evaluate_all_students` format.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1.")
+    manifests = manifests or {}
+    effective_pack_size = _effective_pack_size(client, pack_size, 'evaluate_packed_async')
+    results = {}
+    queues = []
+    for name, (model_qna, student_answers) in assignments.items():
+        answer_key = AnswerKey.of(model_qna)
+        pairs = student_answers.items() if isinstance(student_answers, Mapping) else student_answers
+        results[name], pending = _build_evaluations(answer_key, pairs, manifests.get(name))
+        pending = _pre_grade(pending, answer_key, pre_grader)
+        groups = _cluster_groups(_group_pending(client, pending, cache), clusterer)
+        queues.append(deque(_pack_groups(groups, effective_pack_size)))
+
+    work = _round_robin(queues)
+    total = sum(len(queue) for queue in queues)
+
+    async def worker():
+        # Workers share one generator, so each pulls the next pack in round-robin order when it is free
+        for pack in work:
+            evaluation_responses = await _evaluate_pack_async(client, pack)
+            for (key, items), evaluation_response in zip(pack, evaluation_responses):
+                _record(items, evaluation_response, cache, key)
+
+    await asyncio.gather(*(worker() for _ in range(min(max_concurrency, total))))
+    return results
+
+
+def enqueue_all_students(queue: WorkQueue, run: str, assignment: str, model_qna, student_answers,
+                         pre_grader: PreGrader = None) -> int:
+    """
+    Add one WorkQueue task per student answer, for worker processes to grade (see work_queue_async).
+    Answers the pre-grader is certain about are enqueued as done. Re-enqueueing a run adds nothing.
+    Returns the number of tasks added.
+    """
+    answer_key = AnswerKey.of(model_qna)
+    added = 0
+    for chunk in _student_chunks(student_answers):
+        chunk_results, pending = _build_evaluations(answer_key, chunk)
+        _pre_grade(pending, answer_key, pre_grader)
+        added += queue.enqueue(run, assignment, (
+            (student_result["student"], position, item)
+            for student_result in chunk_results
+            for position, item in enumerate(student_result["evaluations"])
+        ))
+    return added
+
+
+async def _heartbeat(queue: WorkQueue, worker_id: str, task_ids: list) -> None:
+    """ Keep extending the leases on `task_ids` until cancelled. """
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        queue.heartbeat(worker_id, task_ids)
+
+
+async def work_queue_async(client, queue: WorkQueue, worker_id: str, run: str = None,
+                           max_concurrency: int = DEFAULT_MAX_CONCURRENCY, batch_size: int = None,
+                           cache: GradingCache = None, clusterer: AnswerClusterer = None,
+                           poll_interval: float = 1.0, wait: bool = False) -> int:
+    """
+    Worker loop: lease batches of tasks from the queue, grade them with at most `max_concurrency` requests
+    in flight and commit each grade as soon as it arrives. Leases are renewed while a batch is graded, and
+    the tasks of a failed request are released for another attempt after the queue's retry backoff.
+    Returns once no task is pending or leased, or never with `wait=True`. Several workers, in one or
+    many processes and hosts, can serve the same queue. Returns the number of results committed.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1.")
+    batch_size = batch_size or 4 * max_concurrency
+    semaphore = asyncio.Semaphore(max_concurrency)
+    committed = 0
+
+    async def grade(task_ids, key, items):
+        nonlocal committed
+        async with semaphore:
+            try:
+                evaluation_response = await _evaluate_async(client, items[0]['question_text'],
+                                                            items[0]['model_answer'], items[0]['student_answer'])
+            except Exception as e:
+                queue.release(worker_id, [task_ids[id(item)] for item in items], repr(e))
+                return
+        _record(items, evaluation_response, cache, key)
+        committed += queue.complete([(task_ids[id(item)], item["evaluation"]) for item in items])
+
+    while True:
+        leased = queue.lease(worker_id, batch_size, run)
+        if not leased:
+            if not wait and queue.remaining(run) == 0:
+                return committed
+            # Other workers hold the remaining tasks; their leases complete or expire
+            await asyncio.sleep(poll_interval)
+            continue
+
+        items = []
+        task_ids = {}
+        for task_id, item in leased:
+            item["evaluation"] = None
+            items.append(item)
+            task_ids[id(item)] = task_id
+        heartbeat = asyncio.create_task(_heartbeat(queue, worker_id, list(task_ids.values())))
+        try:
+            groups = _cluster_groups(_group_pending(client, items, cache), clusterer)
+            cached = [(task_ids[id(item)], item["evaluation"]) for item in items if item["evaluation"] is not None]
+            if cached:
+                committed += queue.complete(cached)
+            await asyncio.gather(*(grade(task_ids, key, group) for key, group in groups))
+        finally:
+            heartbeat.cancel()
+
+
+def evaluate_all_students_batch(client, model_qna, student_answers, batch_dir='target/batch',
+                                poll_interval: float = 30.0, timeout: float = None,
+                                cache: GradingCache = None, pre_grader: PreGrader = None,
+                                manifest: RunManifest = None, sink: ResultSink = None,
+                                semantic: SemanticGrader = None, clusterer: AnswerClusterer = None) -> list:
+    """
+    Evaluate all student answers through the client's batch API.
+    Every request is written to one JSONL batch file, submitted, polled until finished and merged
+    back into the usual result format. Requests missing from the batch output are graded one by one.
+    """
+    answer_key = AnswerKey.of(model_qna)
+    pairs = student_answers.items() if isinstance(student_answers, Mapping) else student_answers
+    results, pending = _build_evaluations(answer_key, pairs, manifest, sink)
+    if sink is not None:
+        results = []
+    pending = _pre_grade(pending, answer_key, pre_grader, sink)
+    pending = _semantic_grade(pending, semantic, sink)
+    groups = _cluster_groups(_group_pending(client, pending, cache, sink), clusterer, semantic)
+    if not groups:
+        return results
+
+    batch_path = client.write_batch_file(
+        ((index, items[0]['question_text'], items[0]['model_answer'], items[0]['student_answer'])
+         for index, (_, items) in enumerate(groups)),
+        f"{batch_dir}/batch_{int(time.time())}.jsonl"
+    )
+    batch_id = client.submit_batch(batch_path)
+    print(f"Submitted batch {batch_id} with {len(groups)} requests from {batch_path}")
+    batch = client.wait_for_batch(batch_id, poll_interval=poll_interval, timeout=timeout)
+    responses = client.fetch_batch_results(batch)
+    print(f"Batch {batch_id} finished with status '{batch.status}': {len(responses)}/{len(groups)} graded")
+
+    for index, (key, items) in enumerate(groups):
+        evaluation_response = responses.get(str(index))
+        if evaluation_response is None:
+            evaluation_response = client.evaluate(
+                items[0]['question_text'],
+                items[0]['model_answer'],
+                items[0]['student_answer']
             )
-            evaluation["review"] = response
-    return json_serializable
\ No newline at end of file
+        _record(items, evaluation_response, cache, key, sink)
+    return results
+
+
+def _selected_for_review(student, item: dict, sample_rate: float, stages, seed: int,
+                         confidence_below: float = None) -> bool:
+    """
+    Whether a graded item is reviewed: its stage must be in `stages` (if given), and its confidence must be
+    below `confidence_below` (if given) or it must fall in the `sample_rate` share of items. Sampling hashes
+    the student and question, so the same items are picked on every run with the same seed and their
+    cached reviews are reused.
+    """
+    evaluation = item.get("evaluation")
+    if not evaluation:
+        return False
+    if stages is not None and evaluation.get("stage", STAGE_LLM) not in stages:
+        return False
+    confidence = evaluation.get("confidence")
+    if confidence_below is not None and confidence is not None and confidence < confidence_below:
+        return True
+    if sample_rate >= 1:
+        return True
+    if sample_rate <= 0:
+        return False
+    digest = hashlib.sha256(f"{seed}\0{student}\0{item.get('question_id')}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64 < sample_rate
+
+
+def _review_request(item: dict) -> tuple:
+    """ The (question, model, student, evaluation) arguments of `evaluation_review` for a graded item. """
+    evaluation = item["evaluation"]
+    return (
+        item.get("question_text", ""),
+        item.get("model_answer", ""),
+        item.get("student_answer", ""),
+        {"grade": evaluation.get("grade", ""), "explanation": evaluation.get("explanation", "")}
+    )
+
+
+def _group_reviews(client, targets: list, cache: GradingCache = None) -> list:
+    """
+    Group items whose review requests are identical, filling in cached reviews immediately.
+    Cache keys include the evaluation under review, so a changed grade is reviewed again.
+    Returns a list of (cache_key, items) tuples still to be reviewed.
+    """
+    if cache is None:
+        return [(None, [item]) for item in targets]
+    fingerprint = client_fingerprint(client)
+    groups = {}
+    for item in targets:
+        question, model, student, evaluation = _review_request(item)
+        key = cache.make_key(fingerprint, question, model, student, namespace='review', context=evaluation)
+        groups.setdefault(key, []).append(item)
+
+    to_review = []
+    for key, items in groups.items():
+        cache.collapsed += len(items) - 1
+        cached_review = cache.get(key, schema=ReviewResponse)
+        if cached_review is not None:
+            _record_review(items, cached_review)
+        else:
+            to_review.append((key, items))
+    return to_review
+
+
+def _record_review(items: list, review: ReviewResponse, cache: GradingCache = None, key=None) -> None:
+    """ Attach a review to every item of a group and cache it. """
+    if cache is not None and key is not None:
+        cache.put(key, review)
+    for item in items:
+        item["evaluation"]["review"] = {"agree": review.agree, "reason": review.reason}
+
+
+async def _review_async(client, *args) -> ReviewResponse:
+    """ Call the client's async review, falling back to a worker thread for sync-only clients. """
+    if hasattr(client, 'evaluation_review_async'):
+        return await client.evaluation_review_async(*args)
+    return await asyncio.to_thread(client.evaluation_review, *args)
+
+
+async def _review_all_async(client, groups: list, max_concurrency: int, cache: GradingCache = None) -> None:
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def review(key, items):
+        async with semaphore:
+            response = await _review_async(client, *_review_request(items[0]))
+        _record_review(items, response, cache, key)
+
+    await asyncio.gather(*(review(key, items) for key, items in groups))
+
+
+def evaluate_all_evaluations(client, json_serializable, sample_rate: float = 1.0, stages=None,
+                             max_concurrency: int = None, cache: GradingCache = None, seed: int = 0,
+                             confidence_below: float = None) -> list:
+    """
+    Review previous evaluations for consistency, adding
+    "review": {"agree": true|false, "reason": "..."} to each reviewed evaluation.
+    Args:
+        sample_rate (float): Share of the graded items to review, picked deterministically (see `seed`).
+        stages (tuple): Only review items graded by these stages, e.g. ('llm', 'semantic') to skip
+                        the deterministic rule-based grades.
+        max_concurrency (int): Review concurrently with at most this many requests in flight.
+        cache (GradingCache): Reuse reviews of identical answers and evaluations across runs.
+        confidence_below (float): Also review every item whose grade confidence is below this value,
+                                  e.g. 0.7 with `sample_rate=0` to review only the uncertain grades.
+    """
+    targets = [
+        item
+        for student_result in json_serializable
+        for item in student_result.get("evaluations", [])
+        if _selected_for_review(student_result.get("student"), item, sample_rate, stages, seed, confidence_below)
+    ]
+    groups = _group_reviews(client, targets, cache)
+    if max_concurrency:
+        asyncio.run(_review_all_async(client, groups, max_concurrency, cache))
+    else:
+        for key, items in groups:
+            _record_review(items, client.evaluation_review(*_review_request(items[0])), cache, key)
+    return json_serializable
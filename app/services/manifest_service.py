@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from app.models.answer_key import AnswerKey
+from app.services.GradingCache import normalize_student_answer
+
+""" Run manifest for incremental re-grading: content hashes of the inputs behind a previous evaluation JSON. """
+
+
+MANIFEST_VERSION = 1
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path) -> str:
+    """ Content hash of a file. """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_config(config) -> str:
+    """ Hash of a JSON serializable grading configuration (client fingerprint, pre-grader rules, ...). """
+    return _sha256(json.dumps(config, sort_keys=True, ensure_ascii=False, default=repr).encode('utf-8'))
+
+
+def hash_answer_key(answer_key: AnswerKey) -> dict:
+    """ Hash of each answer key entry, keyed by question_id as a string (JSON object keys). """
+    return {
+        str(question_id): _sha256(json.dumps([entry.question_text, entry.answer_text]).encode('utf-8'))
+        for question_id, entry in answer_key.items()
+    }
+
+
+def hash_submissions(folder_path) -> dict:
+    """ Hash of every `submissions/<student>/submission.txt` under an assignment folder. """
+    hashes = {}
+    submissions = Path(folder_path) / 'submissions'
+    if not submissions.is_dir():
+        return hashes
+    with os.scandir(submissions) as entries:
+        for entry in entries:
+            submission_file = Path(entry.path) / 'submission.txt'
+            if entry.is_dir() and submission_file.is_file():
+                hashes[entry.name] = hash_file(submission_file)
+    return hashes
+
+
+class RunManifest:
+    """
+    Records what an evaluation JSON was graded from, so a later run only re-grades what changed.
+    The manifest is stored next to the results as `<results>.manifest.json` and holds hashes of
+    every submission.txt, every answer key entry and the grading configuration. A previous evaluation
+    is carried over for a (student, question) pair when the configuration and the answer key entry are
+    unchanged and either the student's submission file or that particular answer is unchanged.
+    Usage:
+        manifest = RunManifest('target/evaluation_results.json')
+        manifest.prepare(folder_path, answer_key, config)
+        ... grade, passing `manifest` to the evaluation engine ...
+        manifest.save(results)   # after the results JSON has been written
+    """
+    def __init__(self, results_path='target/evaluation_results.json'):
+        self.results_path = Path(results_path)
+        self.path = self.results_path.with_suffix('.manifest.json')
+        self.current = None
+        self._previous = {}
+        self._previous_items = {}
+        self.carried = 0
+        self.regraded = 0
+
+    def _load_previous(self) -> None:
+        """ Load the previous manifest and results; ignore both if either is missing or they do not match. """
+        self._previous, self._previous_items = {}, {}
+        if not (self.path.is_file() and self.results_path.is_file()):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                previous = json.load(f)
+            if previous.get("version") != MANIFEST_VERSION or previous.get("results") != hash_file(self.results_path):
+                print(f"Manifest {self.path} does not match {self.results_path}; re-grading everything.")
+                return
+            with open(self.results_path, encoding='utf-8') as f:
+                results = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read manifest {self.path}: {e}; re-grading everything.")
+            return
+        self._previous = previous
+        for student_result in results:
+            for item in student_result.get("evaluations", []):
+                if item.get("evaluation"):
+                    self._previous_items[(student_result["student"], item["question_id"])] = item
+
+    def prepare(self, folder_path, answer_key, config) -> None:
+        """ Hash the current inputs of an assignment and load the previous run to compare against. """
+        self.current = {
+            "version": MANIFEST_VERSION,
+            "config": hash_config(config),
+            "answer_key": hash_answer_key(AnswerKey.of(answer_key)),
+            "submissions": hash_submissions(folder_path),
+        }
+        self._load_previous()
+        self.carried = 0
+        self.regraded = 0
+
+    def carried_over(self, student, question_id, student_answer):
+        """ The previous evaluation of this answer if none of its inputs changed, else None. """
+        evaluation = self._carried_over(student, question_id, student_answer)
+        if evaluation is None:
+            self.regraded += 1
+        else:
+            self.carried += 1
+        return evaluation
+
+    def _carried_over(self, student, question_id, student_answer):
+        previous, current = self._previous, self.current
+        if not previous or current is None or previous["config"] != current["config"]:
+            return None
+        entry_hash = current["answer_key"].get(str(question_id))
+        if entry_hash is None or previous["answer_key"].get(str(question_id)) != entry_hash:
+            return None
+        item = self._previous_items.get((student, question_id))
+        if item is None:
+            return None
+        submission_hash = current["submissions"].get(student)
+        if submission_hash is None or previous["submissions"].get(student) != submission_hash:
+            # The file changed: keep the grade only if this particular answer did not
+            if normalize_student_answer(item.get("student_answer")) != normalize_student_answer(student_answer):
+                return None
+        return dict(item["evaluation"])
+
+    def report(self) -> dict:
+        """ Number of answers carried over from the previous run and re-graded in this one. """
+        return {"carried_over": self.carried, "regraded": self.regraded}
+
+    def save(self, results_path=None) -> None:
+        """
+        Write the manifest for a results JSON that has just been written.
+        The manifest records the results file hash, so it is only trusted next to those exact results.
+        """
+        if self.current is None:
+            raise ValueError("RunManifest.prepare must be called before save.")
+        results_path = Path(results_path) if results_path else self.results_path
+        manifest = dict(self.current, results=hash_file(results_path))
+        manifest_path = results_path.with_suffix('.manifest.json')
+        os.makedirs(manifest_path.parent, exist_ok=True)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=4)
+        print(f"Saved run manifest to {manifest_path}")
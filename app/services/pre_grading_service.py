@@ -0,0 +1,144 @@
+import re
+from collections import Counter
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from app.models.schemas import EvaluationResponse
+from app.utils.normalization import NUMBER_RE, canonical_tokens, normalize_answer, split_list_items
+
+""" Rule-based pre-grading of short factual answers, so only uncertain answers are sent to an LLM. """
+
+
+# Grading stages recorded on each evaluation
+STAGE_EXACT = 'exact'
+STAGE_NUMERIC = 'numeric'
+STAGE_SET = 'set'
+STAGE_REGEX = 'regex'
+STAGE_LLM = 'llm'
+
+
+def _as_number(tokens: List[str]) -> Optional[str]:
+    """ The canonical number if the whole answer is a single number, else None. """
+    if len(tokens) == 1 and NUMBER_RE.fullmatch(tokens[0]):
+        return tokens[0]
+    return None
+
+
+def _values(numbers: Counter) -> Counter:
+    """ Multiset of the numeric values of canonical number tokens, so '3' and '3.0' count as the same value. """
+    values = Counter()
+    for number, count in numbers.items():
+        values[Decimal(number)] += count
+    return values
+
+
+def _numbered_items(text: str) -> Optional[Tuple[Counter, frozenset]]:
+    """
+    For list answers where every item holds exactly one number, return the multiset of numbers
+    and the set of words used around them, e.g. 'RFC 950, RFC4884' -> ({950, 4884}, {'rfc'}).
+    """
+    items = split_list_items(text)
+    if len(items) < 2:
+        return None
+    numbers, words = Counter(), set()
+    for item in items:
+        tokens = canonical_tokens(item)
+        item_numbers = [token for token in tokens if NUMBER_RE.fullmatch(token)]
+        if len(item_numbers) != 1:
+            return None
+        numbers[item_numbers[0]] += 1
+        words.update(token for token in tokens if not NUMBER_RE.fullmatch(token))
+    return numbers, frozenset(words)
+
+
+class PreGrader:
+    """
+    Deterministic grader for short answers, applied before any LLM call.
+    Stages, in order:
+      - regex: instructor rules, e.g. {"question_id": 4, "pattern": r"^16\\s*bits?$", "grade": "Pass"};
+        rules without a question_id apply to every question
+      - exact: equal after lowercasing and dropping punctuation and extra whitespace ('C++' and 'C' differ)
+      - numeric: equal after canonicalizing numbers ('RFC 0792' == 'RFC 792', '.5' == '0.5'); two plain numbers
+        of different value fail, while equal values written differently ('3', '3.0') are left to the LLM
+      - set: same items in any order for comma separated lists of numbers ('87, 134, 135')
+    Anything else is left to the LLM (`grade` returns None).
+    """
+    def __init__(self, rules: list = None, max_model_answer_lines: int = 1):
+        self.rules = [
+            {
+                "question_id": rule.get("question_id"),
+                "pattern": re.compile(rule["pattern"], re.IGNORECASE | re.DOTALL),
+                "grade": rule["grade"],
+                "explanation": rule.get("explanation", "Matched a configured answer rule."),
+            }
+            for rule in (rules or [])
+        ]
+        self.max_model_answer_lines = max_model_answer_lines
+        self.stage_counts = Counter()
+
+    def get_config(self) -> dict:
+        """ The rules and limits this pre-grader grades with, for run manifests. """
+        return {
+            "rules": [[rule["question_id"], rule["pattern"].pattern, rule["grade"], rule["explanation"]]
+                      for rule in self.rules],
+            "max_model_answer_lines": self.max_model_answer_lines,
+        }
+
+    def _check_rules(self, question_id, student: str) -> Optional[Tuple[EvaluationResponse, str]]:
+        for rule in self.rules:
+            if rule["question_id"] not in (None, question_id):
+                continue
+            if rule["pattern"].search(student.strip()):
+                return EvaluationResponse(grade=rule["grade"], explanation=rule["explanation"]), STAGE_REGEX
+        return None
+
+    def _check_model_answer(self, model: str, student: str, model_normalized: str,
+                            model_tokens: List[str]) -> Optional[Tuple[EvaluationResponse, str]]:
+        student_tokens = canonical_tokens(student)
+        if not model_tokens or not student_tokens:
+            return None
+
+        if model_normalized == normalize_answer(student):
+            return EvaluationResponse(grade="Pass", explanation="Matches the model answer."), STAGE_EXACT
+        if model_tokens == student_tokens:
+            return EvaluationResponse(grade="Pass", explanation="Matches the model answer numerically."), STAGE_NUMERIC
+
+        model_number, student_number = _as_number(model_tokens), _as_number(student_tokens)
+        if model_number is not None and student_number is not None:
+            # Equal values written differently ('3' and '3.0', or versions '2.1' and '2.10') are left to the LLM
+            if Decimal(model_number) == Decimal(student_number):
+                return None
+            return (EvaluationResponse(grade="Fail", explanation=f"Expected {model_number}, got {student_number}."),
+                    STAGE_NUMERIC)
+
+        model_items, student_items = _numbered_items(model), _numbered_items(student)
+        if model_items and student_items:
+            (model_numbers, model_words), (student_numbers, student_words) = model_items, student_items
+            if model_numbers == student_numbers and model_words == student_words:
+                return EvaluationResponse(grade="Pass", explanation="Lists the same items as the model answer."), STAGE_SET
+            if _values(model_numbers) != _values(student_numbers) and not model_words and not student_words:
+                return (EvaluationResponse(grade="Fail", explanation="Listed items differ from the model answer."),
+                        STAGE_SET)
+        return None
+
+    def grade(self, question_id, model: str, student: str, entry=None) -> Optional[Tuple[EvaluationResponse, str]]:
+        """
+        Grade an answer without an LLM if the outcome is certain.
+        Args:
+            entry (AnswerKeyEntry): Optional answer key entry whose precomputed normalized forms are reused.
+        Returns:
+            (EvaluationResponse, stage) if a rule decided the grade, else None.
+        """
+        result = self._check_rules(question_id, student or "")
+        if result is None and len((model or "").strip().splitlines()) <= self.max_model_answer_lines:
+            if entry is not None:
+                model_normalized, model_tokens = entry.normalized_answer, list(entry.answer_tokens)
+            else:
+                model_normalized, model_tokens = normalize_answer(model), canonical_tokens(model)
+            result = self._check_model_answer(model or "", student or "", model_normalized, model_tokens)
+        self.stage_counts[result[1] if result else STAGE_LLM] += 1
+        return result
+
+    def report(self) -> dict:
+        """ Number of answers decided by each stage; 'llm' counts the answers passed on. """
+        return dict(self.stage_counts)
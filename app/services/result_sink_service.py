@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+""" Crash-safe streaming sink that appends each graded answer to a JSONL file as soon as it is graded. """
+
+
+DEFAULT_SINK_PATH = 'target/evaluation_results.jsonl'
+
+
+class ResultSink:
+    """
+    Append-only JSONL log of graded answers, one line per (student, question).
+    Lines are flushed as they are written and fsynced at most every `fsync_interval` seconds
+    (0 fsyncs every line), so a crash loses at most that window. With `resume=True` the existing
+    log is kept and its answers are skipped by the evaluation engines; otherwise it is started afresh.
+    `compact` turns the log into the nested evaluation JSON written by `write_json`.
+    """
+    def __init__(self, path=DEFAULT_SINK_PATH, fsync_interval: float = 1.0, resume: bool = False):
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        os.makedirs(self.path.parent, exist_ok=True)
+        self._lock = threading.Lock()
+        self._owners = {}
+        self._positions = {}
+        self._seen = set()
+        self._done = set()
+        self.written = 0
+        self.skipped = 0
+        if resume and self.path.exists():
+            self._load_done()
+            self._file = open(self.path, 'a', encoding='utf-8')
+        else:
+            self._file = open(self.path, 'w', encoding='utf-8')
+        self._last_sync = time.monotonic()
+
+    def _load_done(self) -> None:
+        """ Index the answers already in the log and cut off a line torn by a crash mid-write. """
+        good_bytes = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                self._done.add((record["student"], record["question_id"]))
+                self._positions.setdefault(record["student"], record.get("order", len(self._positions)))
+                good_bytes += len(line)
+        if good_bytes != self.path.stat().st_size:
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_bytes)
+
+    def _position(self, student) -> int:
+        """ Input position of a student, numbered in the order the engines first ask about them. """
+        if student not in self._seen:
+            self._seen.add(student)
+            self._positions[student] = len(self._seen) - 1
+        return self._positions[student]
+
+    def is_done(self, student, question_id) -> bool:
+        """ Whether this answer was already graded in a previous, resumed run. """
+        self._position(student)
+        if (student, question_id) in self._done:
+            self.skipped += 1
+            return True
+        return False
+
+    def register(self, student, index: int, item: dict) -> None:
+        """ Remember which student (and answer position) a pending evaluation item belongs to. """
+        self._owners[id(item)] = (student, self._position(student), index)
+
+    def write(self, item: dict) -> None:
+        """ Append a graded item registered with `register`. """
+        student, order, index = self._owners.pop(id(item))
+        line = json.dumps({"student": student, "order": order, "index": index, **item}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            self.written += 1
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._last_sync = time.monotonic()
+
+    def sync(self) -> None:
+        """ Flush and fsync everything written so far. """
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        self.sync()
+        self._file.close()
+
+    def report(self) -> dict:
+        return {"written": self.written, "skipped": self.skipped, "path": str(self.path)}
+
+    def compact(self, save_path) -> list:
+        """
+        Rewrite the log as the nested per-student JSON format, students in input order (not the order
+        their answers finished grading) and answers in submission order. The file is replaced atomically.
+        Returns the nested results.
+        """
+        self.sync()
+        students = {}
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                student, index = record.pop("student"), record.pop("index")
+                record.pop("order", None)
+                # A re-graded answer (e.g. after resuming with a changed submission) replaces the older line
+                students.setdefault(student, {})[index] = record
+        # Students of this run by input position, then any others from a resumed log by their logged position
+        ordered = sorted(students, key=lambda student: (student not in self._seen,
+                                                        self._positions.get(student, 0)))
+        results = [
+            {"student": student, "evaluations": [students[student][index] for index in sorted(students[student])]}
+            for student in ordered
+        ]
+        save_path = Path(save_path)
+        os.makedirs(save_path.parent, exist_ok=True)
+        tmp_path = save_path.with_suffix(save_path.suffix + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(results, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, save_path)
+        print(f"Compacted {self.path} into {save_path}")
+        return results
@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.services.folder_write_service import write_json
+
+""" Queryable SQLite store of graded answers, one row per (run, assignment, student, question). """
+
+
+DEFAULT_STORE_PATH = 'target/results.sqlite'
+
+# Rows per executemany call when writing results
+WRITE_BATCH_SIZE = 5000
+
+
+class ResultStore:
+    """
+    Results of every run in one SQLite database, so questions like "pass rate per question this term"
+    or "how did this student do over time" are indexed queries instead of parsing every evaluation JSON.
+    Question texts and model answers are stored once per run and assignment in `questions`; `results`
+    holds one row per graded answer with indexes on student, question and grade.
+    `export_json` rebuilds the nested evaluation JSON of a run.
+    """
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        os.makedirs(Path(path).parent, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run TEXT PRIMARY KEY,"
+            " created REAL NOT NULL,"
+            " config TEXT);"
+            "CREATE TABLE IF NOT EXISTS questions ("
+            " run TEXT NOT NULL,"
+            " assignment TEXT NOT NULL,"
+            " question_id TEXT NOT NULL,"
+            " question_text TEXT,"
+            " model_answer TEXT,"
+            " PRIMARY KEY (run, assignment, question_id));"
+            "CREATE TABLE IF NOT EXISTS results ("
+            " run TEXT NOT NULL,"
+            " assignment TEXT NOT NULL,"
+            " student TEXT NOT NULL,"
+            " question_id TEXT NOT NULL,"
+            " student_order INTEGER NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " raw_question_id TEXT NOT NULL,"
+            " student_answer TEXT,"
+            " grade TEXT,"
+            " explanation TEXT,"
+            " stage TEXT,"
+            " confidence REAL,"
+            " tier TEXT,"
+            " PRIMARY KEY (run, assignment, student, question_id));"
+            "CREATE INDEX IF NOT EXISTS results_student ON results (student, assignment);"
+            "CREATE INDEX IF NOT EXISTS results_question ON results (assignment, question_id, grade);"
+            "CREATE INDEX IF NOT EXISTS results_grade ON results (grade);"
+        )
+        self._conn.commit()
+
+    def start_run(self, run: str = None, config: dict = None) -> str:
+        """ Register a run, by default named after the current UTC time. Returns its name. """
+        run = run or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO runs (run, created, config) VALUES (?, ?, ?)",
+                               (run, time.time(), json.dumps(config, default=str) if config is not None else None))
+            self._conn.commit()
+        return run
+
+    def write(self, run: str, assignment: str, results: list) -> int:
+        """
+        Store the results of one assignment (the `evaluate_all_students` format) in one transaction,
+        replacing rows of the same run, assignment, student and question. Returns the number of rows written.
+        """
+        self.start_run(run)
+        questions = {}
+        rows = []
+        for student_order, student_result in enumerate(results):
+            for position, item in enumerate(student_result["evaluations"]):
+                question_id = str(item["question_id"])
+                questions[question_id] = (run, assignment, question_id, item.get("question_text"),
+                                          item.get("model_answer"))
+                evaluation = item.get("evaluation") or {}
+                rows.append((run, assignment, student_result["student"], question_id, student_order, position,
+                             json.dumps(item["question_id"]), item.get("student_answer"), evaluation.get("grade"),
+                             evaluation.get("explanation"), evaluation.get("stage"), evaluation.get("confidence"),
+                             evaluation.get("tier")))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO questions VALUES (?, ?, ?, ?, ?)",
+                                       list(questions.values()))
+                for start in range(0, len(rows), WRITE_BATCH_SIZE):
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows[start:start + WRITE_BATCH_SIZE])
+        return len(rows)
+
+    def _query(self, sql: str, params=()) -> list:
+        """ Rows of a query as dicts. """
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def runs(self) -> list:
+        """ Every stored run, oldest first. """
+        return self._query("SELECT run, created, config FROM runs ORDER BY created")
+
+    def pass_rates(self, assignment: str = None, run: str = None) -> list:
+        """ Answers, passes and pass rate per question, over all runs unless `run` is given. """
+        conditions, params = [], []
+        if assignment is not None:
+            conditions.append("assignment = ?")
+            params.append(assignment)
+        if run is not None:
+            conditions.append("run = ?")
+            params.append(run)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._query(
+            "SELECT assignment, question_id, COUNT(*) AS answers,"
+            " SUM(grade = 'Pass') AS passed, AVG(grade = 'Pass') AS pass_rate"
+            f" FROM results{where} GROUP BY assignment, question_id ORDER BY assignment, CAST(question_id AS INTEGER),"
+            " question_id", params)
+
+    def student_history(self, student: str, assignment: str = None) -> list:
+        """ Every graded answer of a student across runs, oldest run first. """
+        params = [student] + ([assignment] if assignment is not None else [])
+        return self._query(
+            "SELECT r.run, r.assignment, r.question_id, r.student_answer, r.grade, r.explanation, r.stage"
+            " FROM results r JOIN runs USING (run) WHERE r.student = ?"
+            + (" AND r.assignment = ?" if assignment is not None else "")
+            + " ORDER BY runs.created, r.assignment, r.position", params)
+
+    def diff_runs(self, run_a: str, run_b: str, assignment: str = None) -> list:
+        """ Answers graded differently, or only present, in one of two runs. """
+        condition = " AND a.assignment = ?" if assignment is not None else ""
+        params = [run_a, run_b] + ([assignment] if assignment is not None else [])
+        # SQLite has no FULL OUTER JOIN before 3.39, so take the union of both LEFT JOINs
+        changed = self._query(
+            "SELECT a.assignment, a.student, a.question_id, a.grade AS grade_a, b.grade AS grade_b"
+            " FROM results a LEFT JOIN results b ON b.run = ? AND b.assignment = a.assignment"
+            " AND b.student = a.student AND b.question_id = a.question_id"
+            f" WHERE a.run = ?{condition} AND b.grade IS NOT a.grade",
+            [run_b, run_a] + params[2:])
+        added = self._query(
+            "SELECT b.assignment, b.student, b.question_id, NULL AS grade_a, b.grade AS grade_b"
+            " FROM results b LEFT JOIN results a ON a.run = ? AND a.assignment = b.assignment"
+            " AND a.student = b.student AND a.question_id = b.question_id"
+            f" WHERE b.run = ?{condition.replace('a.', 'b.')} AND a.run IS NULL",
+            params)
+        return changed + added
+
+    def results(self, run: str, assignment: str) -> list:
+        """ The stored results of one assignment in a run, in the `evaluate_all_students` format. """
+        rows = self._query(
+            "SELECT r.student, r.raw_question_id, q.question_text, q.model_answer, r.student_answer, r.grade,"
+            " r.explanation, r.stage, r.confidence, r.tier FROM results r JOIN questions q"
+            " ON q.run = r.run AND q.assignment = r.assignment AND q.question_id = r.question_id"
+            " WHERE r.run = ? AND r.assignment = ? ORDER BY r.student_order, r.position", (run, assignment))
+        results = []
+        for row in rows:
+            if not results or results[-1]["student"] != row["student"]:
+                results.append({"student": row["student"], "evaluations": []})
+            evaluation = None
+            if row["grade"] is not None:
+                evaluation = {"grade": row["grade"], "explanation": row["explanation"], "stage": row["stage"]}
+                if row["confidence"] is not None:
+                    evaluation["confidence"] = row["confidence"]
+                if row["tier"] is not None:
+                    evaluation["tier"] = row["tier"]
+            results[-1]["evaluations"].append({
+                "question_id": json.loads(row["raw_question_id"]),
+                "question_text": row["question_text"],
+                "model_answer": row["model_answer"],
+                "student_answer": row["student_answer"],
+                "evaluation": evaluation,
+            })
+        return results
+
+    def export_json(self, run: str, assignment: str, name='evaluation_results', save_path='target') -> list:
+        """ Write the results of one assignment in a run as the nested evaluation JSON. """
+        results = self.results(run, assignment)
+        write_json(results, name=name, save_path=save_path)
+        return results
+
+    def close(self) -> None:
+        """ Close the underlying database connection. """
+        self._conn.close()
@@ -0,0 +1,236 @@
+import hashlib
+import logging
+import os
+import zlib
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from app.models.schemas import EvaluationResponse
+from app.utils.normalization import normalize_answer
+
+""" Embedding-based semantic pre-grading and near-duplicate clustering of student answers. """
+
+
+logger = logging.getLogger(__name__)
+
+STAGE_SEMANTIC = 'semantic'
+
+DEFAULT_INDEX_DIR = 'target/embeddings'
+DEFAULT_EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+
+
+class HashingEmbedder:
+    """
+    Dependency-free embedder: word and character trigram features hashed into a fixed number of dimensions.
+    It captures lexical overlap rather than meaning ('was completed' and 'was not completed' score
+    about 0.96), so it is never trusted to pass answers (`semantic` is False).
+    """
+    semantic = False
+
+    def __init__(self, dim: int = 384, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+        self.name = f"hashing-{ngram}gram-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = text.split()
+        padded = f" {text} "
+        grams = [padded[i:i + self.ngram] for i in range(max(0, len(padded) - self.ngram + 1))]
+        return [f"w:{word}" for word in words] + [f"c:{gram}" for gram in grams]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                # crc32 is stable across processes, unlike hash()
+                bucket = zlib.crc32(feature.encode('utf-8'))
+                vectors[row, bucket % self.dim] += 1.0 if bucket & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class SentenceTransformerEmbedder:
+    """ Small local sentence-transformers model on CPU. Requires the optional `sentence-transformers` package. """
+    semantic = True
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+        self._model = SentenceTransformer(model_name, device='cpu')
+        self.dim = self._model.get_sentence_embedding_dimension()
+        self.name = model_name.replace('/', '__')
+        self.batch_size = batch_size
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self._model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                  convert_to_numpy=True).astype(np.float32)
+
+
+def default_embedder():
+    """ The sentence-transformers embedder if it is installed and loads, else the hashing embedder. """
+    try:
+        return SentenceTransformerEmbedder()
+    except Exception:  # sentence-transformers is optional
+        return HashingEmbedder()
+
+
+class EmbeddingIndex:
+    """
+    Append-only on-disk vector store: `vectors.f32` holds float32 rows read through a memory map and
+    `keys.txt` the content hash of each row, in the same order. Rows are written before their keys,
+    so an interrupted write leaves at most unreferenced vectors behind.
+    """
+    def __init__(self, path, dim: int):
+        self.path = Path(path)
+        self.dim = dim
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_path = self.path / 'vectors.f32'
+        self._keys_path = self.path / 'keys.txt'
+        self._rows = {}
+        if self._keys_path.exists():
+            with open(self._keys_path, encoding='utf-8') as f:
+                keys = f.read().split()
+            stored = self._vectors_path.stat().st_size // (4 * dim) if self._vectors_path.exists() else 0
+            self._rows = {key: row for row, key in enumerate(keys[:stored])}
+        # Drop vectors beyond the last stored key so new rows line up with their keys
+        if self._vectors_path.exists() and self._vectors_path.stat().st_size != len(self._rows) * 4 * dim:
+            with open(self._vectors_path, 'r+b') as f:
+                f.truncate(len(self._rows) * 4 * dim)
+        self._map()
+
+    def _map(self) -> None:
+        if self._rows:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(len(self._rows), self.dim))
+        else:
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key) -> bool:
+        return key in self._rows
+
+    def add(self, keys: List[str], vectors: np.ndarray) -> None:
+        """ Append new rows and remap the file. """
+        new = [(key, vector) for key, vector in zip(keys, vectors) if key not in self._rows]
+        if not new:
+            return
+        with open(self._vectors_path, 'ab') as f:
+            f.write(np.asarray([vector for _, vector in new], dtype=np.float32).tobytes())
+        with open(self._keys_path, 'a', encoding='utf-8') as f:
+            f.write("".join(f"{key}\n" for key, _ in new))
+        for key, _ in new:
+            self._rows[key] = len(self._rows)
+        self._map()
+
+    def get(self, keys: List[str]) -> np.ndarray:
+        """ Stored vectors of `keys`, which must all be present. """
+        return np.asarray(self._vectors[[self._rows[key] for key in keys]])
+
+
+class SemanticGrader:
+    """
+    Semantic stage between the rule-based pre-grader and the LLM.
+    Model and student answers are embedded and cached in an EmbeddingIndex per assignment and embedder,
+    under `<index_dir>/<assignment>/<embedder>` (the flow services select the assignment with
+    `use_assignment`). Answers whose cosine similarity to the model answer is at least
+    `pass_threshold` pass, and answers at most `fail_threshold` fail, without an LLM call; either
+    threshold can be None to disable it. Passing needs an embedder of meaning (`semantic` True): with
+    the lexical HashingEmbedder, e.g. when sentence-transformers is not installed, answers are never
+    passed by similarity. Remaining answers to the same question whose similarity to an earlier answer
+    is at least `cluster_threshold` are graded once through that earlier answer.
+    """
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR, embedder=None, pass_threshold: Optional[float] = 0.95,
+                 fail_threshold: Optional[float] = None, cluster_threshold: Optional[float] = 0.97,
+                 assignment: str = 'default'):
+        self.embedder = embedder if embedder is not None else default_embedder()
+        if pass_threshold is not None and not getattr(self.embedder, 'semantic', True):
+            logger.warning("%s compares words, not meaning; answers will not be passed by similarity.",
+                           self.embedder.name)
+            pass_threshold = None
+        self.index_dir = Path(index_dir)
+        self.pass_threshold = pass_threshold
+        self.fail_threshold = fail_threshold
+        self.cluster_threshold = cluster_threshold
+        self.passed = 0
+        self.failed = 0
+        self.clustered = 0
+        self.use_assignment(assignment)
+
+    def use_assignment(self, assignment: str) -> None:
+        """ Cache embeddings in the index of `assignment` from now on. """
+        self.assignment = assignment
+        self.index = EmbeddingIndex(self.index_dir / assignment / self.embedder.name, self.embedder.dim)
+
+    def get_config(self) -> dict:
+        """ Embedder and thresholds this stage grades with, for run manifests. """
+        return {
+            "embedder": self.embedder.name,
+            "pass_threshold": self.pass_threshold,
+            "fail_threshold": self.fail_threshold,
+            "cluster_threshold": self.cluster_threshold,
+        }
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """ Unit vectors of the normalized texts, embedding only those not yet in the index. """
+        normalized = [normalize_answer(text or "") for text in texts]
+        keys = [hashlib.sha1(text.encode('utf-8')).hexdigest() for text in normalized]
+        missing = {}
+        for key, text in zip(keys, normalized):
+            if key not in self.index and key not in missing:
+                missing[key] = text
+        if missing:
+            self.index.add(list(missing), self.embedder.embed(list(missing.values())))
+        return self.index.get(keys)
+
+    def grade(self, items: list) -> list:
+        """ One EvaluationResponse per item decided by its similarity to the model answer, else None. """
+        if not items or (self.pass_threshold is None and self.fail_threshold is None):
+            return [None] * len(items)
+        students = self.embed([item['student_answer'] for item in items])
+        models = self.embed([item['model_answer'] for item in items])
+        similarities = np.einsum('ij,ij->i', students, models)
+        decisions = []
+        for similarity in similarities:
+            if self.pass_threshold is not None and similarity >= self.pass_threshold:
+                self.passed += 1
+                decisions.append(EvaluationResponse(
+                    grade="Pass", explanation=f"Semantically equivalent to the model answer ({similarity:.2f})."))
+            elif self.fail_threshold is not None and similarity <= self.fail_threshold:
+                self.failed += 1
+                decisions.append(EvaluationResponse(
+                    grade="Fail", explanation=f"Unrelated to the model answer ({similarity:.2f})."))
+            else:
+                decisions.append(None)
+        return decisions
+
+    def cluster(self, groups: list) -> list:
+        """
+        Merge (key, items) groups of the same question whose first answers are near-duplicates.
+        Each merged group keeps the key of its first group, so only that representative is graded and cached.
+        """
+        if self.cluster_threshold is None or len(groups) < 2:
+            return groups
+        vectors = self.embed([items[0]['student_answer'] for _, items in groups])
+        clusters = []
+        leaders = {}
+        for (key, items), vector in zip(groups, vectors):
+            question_id = items[0]['question_id']
+            rows, leader_vectors = leaders.setdefault(question_id, ([], []))
+            if leader_vectors:
+                similarities = np.asarray(leader_vectors) @ vector
+                best = int(similarities.argmax())
+                if similarities[best] >= self.cluster_threshold:
+                    clusters[rows[best]][1].extend(items)
+                    self.clustered += 1
+                    continue
+            rows.append(len(clusters))
+            leader_vectors.append(vector)
+            clusters.append((key, list(items)))
+        return clusters
+
+    def report(self) -> dict:
+        """ Answers passed or failed by similarity, and groups folded into a cluster representative. """
+        return {"passed": self.passed, "failed": self.failed, "clustered": self.clustered,
+                "indexed": len(self.index)}
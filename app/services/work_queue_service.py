@@ -0,0 +1,220 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+""" Durable, lease-based queue of grading tasks shared by worker processes on one or more hosts. """
+
+
+DEFAULT_QUEUE_PATH = 'target/work_queue.sqlite'
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 5.0
+
+# Task states
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def default_worker_id() -> str:
+    """ Unique name of a worker process, e.g. 'gradebox-1:4242:1a2b3c'. """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class WorkQueue:
+    """
+    Grading tasks, one per (run, assignment, student, answer), stored in SQLite.
+    Every process opens its own WorkQueue on the same file (WAL mode), e.g. on a shared volume or
+    on the one host all workers reach. A worker `lease`s a batch of tasks for `lease_seconds`,
+    extends the lease with `heartbeat` while it grades, and `complete`s each task with its evaluation.
+    Tasks whose lease expires (a crashed or stalled worker) are handed out again, and released tasks
+    after a backoff of `retry_delay` seconds, doubled on every attempt. A task that has used
+    `max_attempts` leases is marked failed when it is released or its lease expires.
+    Enqueueing and completing are idempotent: a task is only added once, and only the first result
+    committed for it is kept.
+    """
+    def __init__(self, path=DEFAULT_QUEUE_PATH, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, retry_delay: float = DEFAULT_RETRY_DELAY):
+        os.makedirs(Path(path).parent, exist_ok=True)
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        # Transactions are managed explicitly, so writers take the database lock up front
+        self._conn = sqlite3.connect(path, timeout=60.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " id INTEGER PRIMARY KEY,"
+            " run TEXT NOT NULL,"
+            " assignment TEXT NOT NULL,"
+            " student TEXT NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " item TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " lease_owner TEXT,"
+            " lease_expires REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " not_before REAL,"
+            " result TEXT,"
+            " error TEXT,"
+            " UNIQUE (run, assignment, student, position))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        if 'not_before' not in columns:
+            # Queue files created before retry backoff
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN not_before REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (run, state, lease_expires)")
+
+    def _transaction(self, statements):
+        """ Run `statements(conn)` in one write transaction and return its result. """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, run: str, assignment: str, tasks) -> int:
+        """
+        Add tasks in one transaction. `tasks` yields (student, position, item) triples, where item is the
+        evaluation item dict; items with an "evaluation" already (e.g. pre-graded) are stored as done.
+        Tasks already in the queue are left untouched. Returns the number of tasks added.
+        """
+        rows = []
+        for student, position, item in tasks:
+            evaluation = item.get("evaluation")
+            task_item = {key: value for key, value in item.items() if key != "evaluation"}
+            rows.append((run, assignment, student, position, json.dumps(task_item, ensure_ascii=False),
+                         PENDING if evaluation is None else DONE,
+                         None if evaluation is None else json.dumps(evaluation, ensure_ascii=False)))
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (run, assignment, student, position, item, state, result)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            return conn.total_changes - before
+        return self._transaction(insert)
+
+    def lease(self, worker_id: str, limit: int = 32, run: str = None) -> list:
+        """
+        Lease up to `limit` pending tasks past their retry backoff, or expired tasks, to `worker_id`.
+        Expired tasks that have used `max_attempts` leases are marked failed instead.
+        Returns (task_id, item) pairs; the item dicts are those given to `enqueue`.
+        """
+        run_filter = " AND run = ?" if run is not None else ""
+        run_params = (run,) if run is not None else ()
+
+        def take(conn):
+            now = time.time()
+            conn.execute(
+                "UPDATE tasks SET state = ?, lease_owner = NULL, lease_expires = NULL,"
+                " error = COALESCE(error, 'lease expired') WHERE state = ? AND lease_expires < ? AND attempts >= ?"
+                + run_filter, (FAILED, LEASED, now, self.max_attempts) + run_params)
+            query = ("SELECT id, item FROM tasks WHERE ((state = ? AND (not_before IS NULL OR not_before <= ?))"
+                     " OR (state = ? AND lease_expires < ?))" + run_filter + " ORDER BY id LIMIT ?")
+            rows = conn.execute(query, (PENDING, now, LEASED, now) + run_params + (limit,)).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1"
+                " WHERE id = ?", [(LEASED, worker_id, now + self.lease_seconds, task_id) for task_id, _ in rows])
+            return [(task_id, json.loads(item)) for task_id, item in rows]
+        return self._transaction(take)
+
+    def heartbeat(self, worker_id: str, task_ids) -> int:
+        """ Extend the leases `worker_id` still holds on `task_ids`. Returns the number extended. """
+        def extend(conn):
+            before = conn.total_changes
+            expires = time.time() + self.lease_seconds
+            conn.executemany(
+                "UPDATE tasks SET lease_expires = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                [(expires, task_id, LEASED, worker_id) for task_id in task_ids])
+            return conn.total_changes - before
+        return self._transaction(extend)
+
+    def complete(self, results) -> int:
+        """
+        Commit (task_id, evaluation) pairs in one transaction. A task that is already done keeps its
+        first result, so a worker whose lease expired cannot overwrite the grade of the worker that took over.
+        Returns the number of results accepted.
+        """
+        def commit(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE tasks SET state = ?, result = ?, lease_owner = NULL, lease_expires = NULL, error = NULL"
+                " WHERE id = ? AND state != ?",
+                [(DONE, json.dumps(evaluation, ensure_ascii=False), task_id, DONE) for task_id, evaluation in results])
+            return conn.total_changes - before
+        return self._transaction(commit)
+
+    def release(self, worker_id: str, task_ids, error: str = None) -> None:
+        """
+        Hand leased tasks back after a failure. They can be leased again after `retry_delay` seconds,
+        doubled for every earlier attempt; tasks out of attempts are marked failed.
+        """
+        def give_back(conn):
+            now = time.time()
+            conn.executemany(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END,"
+                " lease_owner = NULL, lease_expires = NULL, error = ?,"
+                " not_before = ? + ? * (1 << MIN(MAX(attempts - 1, 0), 16))"
+                " WHERE id = ? AND state = ? AND lease_owner = ?",
+                [(self.max_attempts, FAILED, PENDING, error, now, self.retry_delay, task_id, LEASED, worker_id)
+                 for task_id in task_ids])
+        self._transaction(give_back)
+
+    def counts(self, run: str = None) -> dict:
+        """ Number of tasks in each state, e.g. {'pending': 10, 'leased': 4, 'done': 986}. """
+        query = "SELECT state, COUNT(*) FROM tasks" + (" WHERE run = ?" if run is not None else "") + " GROUP BY state"
+        with self._lock:
+            rows = self._conn.execute(query, (run,) if run is not None else ()).fetchall()
+        return dict(rows)
+
+    def remaining(self, run: str = None) -> int:
+        """ Number of tasks not yet done or failed. """
+        counts = self.counts(run)
+        return counts.get(PENDING, 0) + counts.get(LEASED, 0)
+
+    def assignments(self, run: str) -> list:
+        """ Names of the assignments enqueued for a run, in enqueue order. """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT assignment FROM tasks WHERE run = ? GROUP BY assignment ORDER BY MIN(id)", (run,)).fetchall()
+        return [assignment for assignment, in rows]
+
+    def results(self, run: str, assignment: str) -> list:
+        """
+        Assemble the tasks of one assignment into the `evaluate_all_students` result format, in enqueue order.
+        Tasks that are not done have an evaluation of None.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT student, item, result FROM tasks WHERE run = ? AND assignment = ? ORDER BY id",
+                (run, assignment)).fetchall()
+        results = []
+        for student, item, result in rows:
+            if not results or results[-1]["student"] != student:
+                results.append({"student": student, "evaluations": []})
+            item = json.loads(item)
+            item["evaluation"] = json.loads(result) if result is not None else None
+            results[-1]["evaluations"].append(item)
+        return results
+
+    def report(self) -> dict:
+        """ Task counts of the whole queue by state. """
+        return self.counts()
+
+    def close(self) -> None:
+        """ Close the underlying database connection. """
+        self._conn.close()
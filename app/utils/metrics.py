@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+""" In-process run metrics: request latency histograms, token usage, retries, cache lookups and stage wall times. """
+
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf'))
+
+# Prefix of every exported OpenMetrics family
+METRIC_PREFIX = 'grading'
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ''
+    escaped = (k + '="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+class Histogram:
+    """ Cumulative-bucket histogram in the Prometheus/OpenMetrics style. """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def quantile(self, q: float):
+        """ Upper bound of the bucket holding the q-th quantile, or None without observations. """
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {_format_bound(bound): count for bound, count in zip(self.buckets, self.counts)},
+        }
+
+
+class _CallRecorder:
+    """ Handle returned by `Metrics.track_call` for reporting the token usage of a response. """
+    def __init__(self):
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.cached_tokens = None
+
+    def usage(self, prompt_tokens=None, completion_tokens=None, cached_tokens=None) -> None:
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cached_tokens = cached_tokens
+
+
+class Metrics:
+    """
+    Thread-safe registry of labelled counters and latency histograms for one run.
+    Counters: requests, request_errors, tokens (kind=prompt|completion|cached), retries,
+    cache_lookups (result=hit|miss) and stage_seconds (wall time per pipeline stage).
+    Exported as a JSON run report (`report`) or as OpenMetrics text (`to_openmetrics`).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """ Clear all recorded values, e.g. between runs in one process. """
+        with self._lock:
+            self.started = time.time()
+            self._counters = {}
+            self._histograms = {}
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        """ Add `amount` to the counter `name` with the given labels. """
+        key = _label_key(labels)
+        with self._lock:
+            family = self._counters.setdefault(name, {})
+            family[key] = family.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """ Record one observation in the histogram `name` with the given labels. """
+        key = _label_key(labels)
+        with self._lock:
+            family = self._histograms.setdefault(name, {})
+            family.setdefault(key, Histogram()).observe(value)
+
+    def counter_value(self, name: str, **labels) -> float:
+        """ Current value of one counter, 0 if it was never incremented. """
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def token_usage(self) -> dict:
+        """
+        Prompt, completion and cached prompt tokens summed over providers and models, with the share of
+        prompt tokens served from the provider's prompt cache.
+        """
+        totals = {"prompt": 0, "completion": 0, "cached": 0}
+        with self._lock:
+            for key, value in self._counters.get('tokens', {}).items():
+                kind = dict(key).get('kind')
+                if kind in totals:
+                    totals[kind] += value
+        totals["cached_ratio"] = totals["cached"] / totals["prompt"] if totals["prompt"] else 0.0
+        return totals
+
+    @contextmanager
+    def track_call(self, provider: str, model: str = None):
+        """
+        Time one provider request and count it, its failure or its token usage, e.g.
+            with metrics.track_call('OpenAPIClient', 'gpt-4o') as call:
+                response = ...
+                call.usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+        """
+        call = _CallRecorder()
+        started = time.perf_counter()
+        try:
+            yield call
+        except Exception:
+            self.inc('request_errors', provider=provider, model=model)
+            raise
+        finally:
+            self.observe('request_latency_seconds', time.perf_counter() - started, provider=provider, model=model)
+            self.inc('requests', provider=provider, model=model)
+        for kind in ('prompt', 'completion', 'cached'):
+            tokens = getattr(call, f'{kind}_tokens')
+            if tokens:
+                self.inc('tokens', tokens, provider=provider, model=model, kind=kind)
+
+    @contextmanager
+    def stage(self, name: str):
+        """ Add the wall time of the enclosed block to the `stage_seconds` counter of stage `name`. """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc('stage_seconds', time.perf_counter() - started, stage=name)
+
+    def report(self) -> dict:
+        """ JSON serializable snapshot of every counter and histogram. """
+        with self._lock:
+            return {
+                "started": self.started,
+                "elapsed_seconds": time.time() - self.started,
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in family.items()]
+                    for name, family in self._counters.items()
+                },
+                "histograms": {
+                    name: [{"labels": dict(key), **histogram.to_dict()} for key, histogram in family.items()]
+                    for name, family in self._histograms.items()
+                },
+            }
+
+    def to_openmetrics(self) -> str:
+        """ All metrics in the OpenMetrics text exposition format. """
+        lines = []
+        with self._lock:
+            for name, family in sorted(self._counters.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in family.items():
+                    lines.append(f"{metric}_total{_format_labels(key)} {value}")
+            for name, family in sorted(self._histograms.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for key, histogram in family.items():
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"{metric}_bucket{_format_labels(key, (('le', _format_bound(bound)),))} {count}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {histogram.count}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {histogram.sum}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, save_path='logs', name='run_report') -> tuple:
+        """ Write `<name>.json` and `<name>.prom` (OpenMetrics) to `save_path`. Returns both paths. """
+        os.makedirs(save_path, exist_ok=True)
+        json_path = Path(save_path) / f"{name}.json"
+        prom_path = Path(save_path) / f"{name}.prom"
+        with open(json_path, 'w') as f:
+            json.dump(self.report(), f, indent=4)
+        with open(prom_path, 'w') as f:
+            f.write(self.to_openmetrics())
+        print(f"Saved run report to {json_path} and {prom_path}")
+        return json_path, prom_path
+
+
+# Registry shared by the clients, the grading cache and the flow services
+metrics = Metrics()
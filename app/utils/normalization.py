@@ -0,0 +1,58 @@
+import re
+from typing import List
+
+""" Text normalization shared by the answer key, pre-grading and answer matching. """
+
+
+# Numbers keep a leading sign unless it joins them to a word ('RFC-792') and may start with a dot ('.5');
+# dot-joined digit groups such as IP addresses and version numbers ('192.168.1.3', '2.10.1') stay one token.
+# Words keep a leading dot, inner dots and trailing '+'/'#' ('.net', 'node.js', 'C++', 'C#'), so these
+# symbols are never dropped as punctuation
+_TOKEN_RE = re.compile(r"(?:(?<![\w.])[-+])?(?:\d+(?:\.\d+)*|(?<![\w.])\.\d+)"
+                       r"|(?:(?<![\w.])\.)?[^\W\d_]+(?:\.[^\W\d_]+)*[+#]*")
+_LIST_SEPARATOR_RE = re.compile(r"\s*(?:,|;|\n|\band\b|&)\s*", re.IGNORECASE)
+NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def normalize_answer(text: str) -> str:
+    """ Lowercase, drop insignificant punctuation and collapse whitespace; 'C++' and 'C#' stay distinct from 'C'. """
+    return " ".join(token.lower() for token in _TOKEN_RE.findall(text or ""))
+
+
+def canonical_number(token: str) -> str:
+    """
+    Canonical form of a numeric token: leading zeros and a '+' sign are dropped, e.g. '0792' -> '792',
+    '.5' -> '0.5' and '+5' -> '5'. Everything else is significant, so '2.10' != '2.1' and '-5' != '5'; tokens of
+    several dot-joined groups ('192.168.001.3') are kept literally.
+    """
+    sign, digits = (token[0], token[1:]) if token[0] in '+-' else ('', token)
+    if digits.count('.') > 1:
+        return token
+    integer, dot, fraction = digits.partition('.')
+    integer = integer.lstrip('0') or '0'
+    if sign == '-' and integer == '0' and not fraction.strip('0'):
+        sign = ''
+    return ('-' if sign == '-' else '') + integer + dot + fraction
+
+
+def canonical_tokens(text: str) -> List[str]:
+    """ Lowercase word and number tokens with numbers in canonical form; splits 'RFC0792' into 'rfc', '792'. """
+    return [canonical_number(token) if token[-1].isdigit() else token.lower()
+            for token in _TOKEN_RE.findall(text or "")]
+
+
+def split_list_items(text: str) -> List[str]:
+    """ Split a comma/semicolon/'and' separated answer into its non-empty items. """
+    return [item for item in _LIST_SEPARATOR_RE.split((text or "").strip()) if item.strip()]
+
+
+def canonical_form(text: str) -> str:
+    """
+    Form under which equivalent short answers compare equal: canonical tokens (case, punctuation,
+    whitespace and number formatting removed), with the items of list answers in sorted order.
+    """
+    items = [" ".join(canonical_tokens(item)) for item in split_list_items(text)]
+    items = [item for item in items if item]
+    if len(items) > 1:
+        return " | ".join(sorted(items))
+    return " ".join(canonical_tokens(text))
@@ -0,0 +1,65 @@
+import time
+
+from app.models.answer_key import AnswerKey
+
+"""
+Micro-benchmark of model answer lookups: linear scan of the answer list vs the indexed AnswerKey.
+Run from the repository root with `python -m benchmarks.bench_answer_key`.
+"""
+
+
+STUDENTS = 10_000
+QUESTIONS = 50
+
+
+def build_model_qna(questions: int) -> list:
+    """ Synthetic answer key in the list-of-dicts format. """
+    return [{"question_id": i, "question_text": f"Question {i}?", "answer_text": f"Answer {i}"}
+            for i in range(1, questions + 1)]
+
+
+def linear_scan(model_qna: list, students: int, questions: int) -> float:
+    """ Time the per-answer `next(...)` scan previously used by evaluate_all_students. """
+    started = time.perf_counter()
+    for _ in range(students):
+        for question_id in range(1, questions + 1):
+            entry = next((item for item in model_qna if item['question_id'] == question_id), None)
+            _ = entry['question_text'], entry['answer_text']
+    return time.perf_counter() - started
+
+
+def indexed(answer_key: AnswerKey, students: int, questions: int) -> float:
+    """ Time the same lookups through the AnswerKey index. """
+    started = time.perf_counter()
+    for _ in range(students):
+        for question_id in range(1, questions + 1):
+            entry = answer_key.get(question_id)
+            _ = entry.question_text, entry.answer_text
+    return time.perf_counter() - started
+
+
+def run(students: int = STUDENTS, questions: int = QUESTIONS) -> dict:
+    """ Run both lookups and return the timings in seconds. """
+    model_qna = build_model_qna(questions)
+    started = time.perf_counter()
+    answer_key = AnswerKey.from_records(model_qna)
+    build_time = time.perf_counter() - started
+    scan_time = linear_scan(model_qna, students, questions)
+    index_time = indexed(answer_key, students, questions)
+    lookups = students * questions
+    return {
+        "students": students,
+        "questions": questions,
+        "lookups": lookups,
+        "index_build_s": build_time,
+        "linear_scan_s": scan_time,
+        "indexed_s": index_time,
+        "linear_scan_ns_per_lookup": scan_time / lookups * 1e9,
+        "indexed_ns_per_lookup": index_time / lookups * 1e9,
+        "speedup": scan_time / index_time if index_time else float('inf'),
+    }
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name}: {value:.4f}" if isinstance(value, float) else f"{name}: {value}")
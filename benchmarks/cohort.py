@@ -0,0 +1,91 @@
+import argparse
+import os
+import random
+from pathlib import Path
+
+""" Synthetic cohort generator writing the data/<assignment>/submissions/<student>/submission.txt layout. """
+
+
+# Share of answers of each kind in a generated submission
+ANSWER_MIX = (
+    ('correct', 0.45),      # the model answer verbatim
+    ('variant', 0.15),      # the model answer with different case/punctuation/padding
+    ('with_question', 0.1), # the question repeated before the answer
+    ('wrong', 0.25),        # an unrelated short answer
+    ('long', 0.05),         # a free-text paragraph
+)
+
+WORDS = ("packet", "frame", "protocol", "header", "port", "address", "checksum", "segment", "flag",
+         "request", "response", "stream", "handshake", "payload", "router", "capture", "filter")
+
+
+def _question(question_id: int, rng: random.Random) -> str:
+    return f"What is the {rng.choice(WORDS)} {rng.choice(WORDS)} number {question_id} in the capture?"
+
+
+def _model_answer(rng: random.Random) -> str:
+    kind = rng.random()
+    if kind < 0.4:
+        return str(rng.randint(1, 5000))
+    if kind < 0.7:
+        return ", ".join(str(rng.randint(1, 500)) for _ in range(rng.randint(2, 4)))
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+
+
+def _student_answer(kind: str, question: str, model: str, rng: random.Random) -> str:
+    if kind == 'correct':
+        return model
+    if kind == 'variant':
+        return f"  {model.upper()}. "
+    if kind == 'with_question':
+        return f"{question}\n{model}"
+    if kind == 'wrong':
+        return str(rng.randint(1, 5000))
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))) + "."
+
+
+def generate_cohort(root, assignment='Synthetic', students=100, questions=10, seed=0) -> Path:
+    """
+    Write an assignment with a `<assignment>_solution.txt` answer key and `students` submissions.
+    Generation is deterministic for a given seed and streams to disk, so 100k students fit in memory easily.
+    Returns the assignment folder.
+    """
+    rng = random.Random(seed)
+    folder = Path(root) / assignment
+    os.makedirs(folder / 'submissions', exist_ok=True)
+
+    key = [(question_id, _question(question_id, rng), _model_answer(rng)) for question_id in range(1, questions + 1)]
+    slug = assignment.lower().replace(' ', '_')
+    with open(folder / f"{slug}_solution.txt", 'w', encoding='utf-8') as f:
+        f.write(f"{assignment} solution\n\n")
+        f.write("\n\n".join(f"{question_id}) {question}\n{model}" for question_id, question, model in key))
+        f.write("\n")
+
+    kinds, weights = zip(*ANSWER_MIX)
+    width = len(str(students))
+    for student in range(1, students + 1):
+        student_dir = folder / 'submissions' / f"student {student:0{width}d}"
+        os.makedirs(student_dir, exist_ok=True)
+        answers = [
+            f"{question_id}. {_student_answer(rng.choices(kinds, weights)[0], question, model, rng)}"
+            for question_id, question, model in key
+        ]
+        with open(student_dir / 'submission.txt', 'w', encoding='utf-8') as f:
+            f.write("\n\n".join(answers) + "\n")
+    return folder
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic cohort of student submissions.')
+    parser.add_argument('--root', default='target/bench_data', help='directory to write the assignment to')
+    parser.add_argument('--assignment', default='Synthetic')
+    parser.add_argument('--students', type=int, default=100)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    folder = generate_cohort(args.root, args.assignment, args.students, args.questions, args.seed)
+    print(f"Generated {args.students} submissions in {folder}")
+
+
+if __name__ == "__main__":
+    main()
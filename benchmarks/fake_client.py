@@ -0,0 +1,123 @@
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from app.models.schemas import EvaluationResponse, ReviewResponse
+from app.utils.normalization import normalize_answer
+
+""" Simulated LLM provider for offline benchmarks: configurable latency, error rate and rate limit. """
+
+
+class SimulatedAPIError(Exception):
+    """ Error shaped like an SDK API error, so RateLimitedClient retries it and honors its Retry-After. """
+    def __init__(self, status_code: int, retry_after: float = None):
+        super().__init__(f"Simulated API error {status_code}")
+        self.status_code = status_code
+        headers = {'retry-after': f"{retry_after:.3f}"} if retry_after is not None else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+class FakeGradingClient:
+    """
+    Client with the evaluate/evaluation_review interface that answers locally after a simulated delay.
+    Latency distributions (seconds):
+      - 'constant': always `mean_latency`
+      - 'uniform': uniform on [0, 2 * mean_latency]
+      - 'lognormal': lognormal with the given mean and shape `sigma`, i.e. a long tail like real APIs
+    `error_rate` is the share of requests failing with a 500. With `requests_per_minute`, requests
+    beyond that rate in a sliding minute fail with a 429 carrying a Retry-After header.
+    Answers are graded 'Pass' when they normalize to the model answer, else 'Fail'.
+    """
+    def __init__(self, latency='lognormal', mean_latency=0.5, sigma=0.5, error_rate=0.0,
+                 requests_per_minute=None, seed=None):
+        if latency not in ('constant', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution '{latency}'.")
+        self.latency = latency
+        self.mean_latency = mean_latency
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.requests_per_minute = requests_per_minute
+        self._random = random.Random(seed)
+        self._admitted = deque()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+
+    def get_model(self):
+        return 'fake'
+
+    def get_config(self):
+        return {
+            "model": self.get_model(),
+            "latency": self.latency,
+            "mean_latency": self.mean_latency,
+            "sigma": self.sigma,
+            "error_rate": self.error_rate,
+            "requests_per_minute": self.requests_per_minute,
+        }
+
+    def format_prompt(self, question, model, student) -> str:
+        """ Prompt-sized text, so token based rate limiting sees realistic request sizes. """
+        return f"Question: {question}\nModel answer: {model}\nStudent answer: {student}"
+
+    def _sample_latency(self) -> float:
+        if self.latency == 'constant':
+            return self.mean_latency
+        if self.latency == 'uniform':
+            return self._random.uniform(0, 2 * self.mean_latency)
+        # Choose mu so that the distribution mean equals mean_latency
+        mu = math.log(self.mean_latency) - self.sigma ** 2 / 2
+        return self._random.lognormvariate(mu, self.sigma)
+
+    def _admit(self) -> float:
+        """ Apply the simulated rate limit and error rate; returns the latency of an admitted request. """
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            if self.requests_per_minute:
+                while self._admitted and now - self._admitted[0] >= 60.0:
+                    self._admitted.popleft()
+                if len(self._admitted) >= self.requests_per_minute:
+                    self.throttled += 1
+                    raise SimulatedAPIError(429, retry_after=60.0 - (now - self._admitted[0]))
+                self._admitted.append(now)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                raise SimulatedAPIError(500)
+            return self._sample_latency() if self.mean_latency > 0 else 0.0
+
+    @staticmethod
+    def _grade(model, student) -> EvaluationResponse:
+        if normalize_answer(model) == normalize_answer(student):
+            return EvaluationResponse(grade="Pass", explanation="Matches the model answer.")
+        return EvaluationResponse(grade="Fail", explanation="Does not match the model answer.")
+
+    def evaluate(self, question, model, student) -> EvaluationResponse:
+        time.sleep(self._admit())
+        return self._grade(model, student)
+
+    async def evaluate_async(self, question, model, student) -> EvaluationResponse:
+        await asyncio.sleep(self._admit())
+        return self._grade(model, student)
+
+    @staticmethod
+    def _review(model, student, evaluation) -> ReviewResponse:
+        expected = FakeGradingClient._grade(model, student).grade
+        agree = evaluation.get('grade') == expected
+        return ReviewResponse(agree=agree, reason="Grade matches." if agree else f"Expected {expected}.")
+
+    def evaluation_review(self, question, model, student, evaluation) -> ReviewResponse:
+        time.sleep(self._admit())
+        return self._review(model, student, evaluation)
+
+    async def evaluation_review_async(self, question, model, student, evaluation) -> ReviewResponse:
+        await asyncio.sleep(self._admit())
+        return self._review(model, student, evaluation)
+
+    def report(self) -> dict:
+        return {"calls": self.calls, "errors": self.errors, "throttled": self.throttled}
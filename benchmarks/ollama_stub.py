@@ -0,0 +1,119 @@
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fake_client import FakeGradingClient
+
+""" Tiny stand-in for an Ollama server (/api/chat, /api/generate, /api/tags), to run OllamaClient offline. """
+
+
+MODEL_ANSWER = re.compile(r"Model answer: (.*?)\n\s*\n\s*Student answer: (.*?)\s*(?:\n\s*\n|$)", re.DOTALL)
+GRADE = re.compile(r"graded as '([^']*)'")
+
+
+def _answer(body: dict) -> str:
+    """ Grade the last user message like FakeGradingClient, as JSON matching the requested format. """
+    prompt = next((m['content'] for m in reversed(body.get('messages', [])) if m.get('role') == 'user'), "")
+    match = MODEL_ANSWER.search(prompt)
+    model, student = match.groups() if match else ("", "")
+    if 'agree' in (body.get('format') or {}).get('properties', {}):
+        grade = GRADE.search(prompt)
+        evaluation = {"grade": grade.group(1) if grade else ""}
+        return FakeGradingClient._review(model, student, evaluation).model_dump_json()
+    return FakeGradingClient._grade(model, student).model_dump_json()
+
+
+class OllamaStubServer(ThreadingHTTPServer):
+    """
+    Answers /api/chat after `latency` seconds with a schema-valid grade, and records loaded models
+    from /api/generate keep_alive requests. Runs in a background thread with `start`.
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.loaded = set()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'OllamaStubServer':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._reply(200, {"models": [{"name": name} for name in sorted(self.server.loaded)]})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._reply(400, {"error": "invalid JSON"})
+            return
+        server = self.server
+        with server._lock:
+            server.requests += 1
+            if body.get('keep_alive') == 0:
+                server.loaded.discard(body.get('model'))
+            else:
+                server.loaded.add(body.get('model'))
+        if self.path == '/api/generate':
+            self._reply(200, {"model": body.get('model'), "response": "", "done": True})
+        elif self.path == '/api/chat':
+            time.sleep(server.latency)
+            prompt_tokens = sum(len(m.get('content', '')) for m in body.get('messages', [])) // 4
+            self._reply(200, {
+                "model": body.get('model'),
+                "message": {"role": "assistant", "content": _answer(body)},
+                "done": True,
+                "prompt_eval_count": prompt_tokens,
+                "eval_count": 20,
+            })
+        else:
+            self._reply(404, {"error": "not found"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a stub Ollama API for offline grading runs.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before each chat reply')
+    args = parser.parse_args()
+    server = OllamaStubServer(args.host, args.port, args.latency)
+    print(f"Stub Ollama server listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
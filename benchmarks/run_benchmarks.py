@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.clients.RateLimitedClient import RateLimitedClient
+from app.repositories.model_qna_bleu_repo import extract_by_bleu_and_sections
+from app.repositories.model_qna_repository import model_qna_repository
+from app.repositories.student_answers_repository import student_answers_repository
+from app.services.evaluation_service import evaluate_all_students, evaluate_all_students_async
+from app.services.folder_write_service import write_json
+from app.services.GradingCache import GradingCache
+from app.services.pre_grading_service import PreGrader
+from app.services.result_sink_service import ResultSink
+from benchmarks import bench_answer_key
+from benchmarks.cohort import generate_cohort
+from benchmarks.fake_client import FakeGradingClient
+
+""" Offline benchmark suite: ingestion, BLEU extraction, grading throughput and export, with JSON results. """
+
+
+RESULTS_DIR = 'benchmarks/results'
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def _timed(function, *args, **kwargs) -> tuple:
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def _answers(student_answers: dict) -> int:
+    return sum(len(answers) for answers in student_answers.values())
+
+
+def bench_ingestion(folder, workers: int) -> dict:
+    """ Parse every submission sequentially and in a process pool. """
+    results = {}
+    for label, pool_size in (('sequential', 1), ('pool', workers)):
+        student_answers, seconds = _timed(student_answers_repository, folder, workers=pool_size)
+        results[label] = {
+            "workers": pool_size,
+            "seconds": seconds,
+            "students_per_s": len(student_answers) / seconds,
+        }
+    model_qna, seconds = _timed(model_qna_repository, folder)
+    results["answer_key"] = {"questions": len(model_qna), "seconds": seconds}
+    return results
+
+
+def bench_bleu(folder, repeats: int) -> dict:
+    """ Extract answers from a solution text by BLEU section matching. """
+    model_qna = model_qna_repository(folder)
+    text = "\n\n".join(f"{entry.question_id}. {entry.question_text}\n{entry.answer_text}"
+                       for entry in model_qna.values())
+    questions_json = [{"question_id": entry.question_id,
+                       "questions": [entry.question_text, entry.question_text.lower().rstrip('?')]}
+                      for entry in model_qna.values()]
+    extracted, seconds = _timed(lambda: [extract_by_bleu_and_sections(text, questions_json)
+                                         for _ in range(repeats)])
+    return {
+        "questions": len(questions_json),
+        "repeats": repeats,
+        "seconds": seconds,
+        "ms_per_extraction": seconds / repeats * 1000,
+        "matched": len(extracted[-1]),
+    }
+
+
+def bench_grading(folder, args) -> dict:
+    """ Grade the cohort with the simulated provider under several engine configurations. """
+    model_qna = model_qna_repository(folder)
+    student_answers = student_answers_repository(folder, workers=args.workers)
+    answers = _answers(student_answers)
+    sync_subset = dict(list(student_answers.items())[:args.sync_students])
+
+    def client():
+        return FakeGradingClient(latency=args.latency, mean_latency=args.mean_latency, error_rate=args.error_rate,
+                                 requests_per_minute=args.requests_per_minute, seed=args.seed)
+
+    def limited(fake):
+        return RateLimitedClient(fake, max_concurrency=args.concurrency, base_delay=0.05, max_delay=2.0)
+
+    def run(label, engine, pairs, **kwargs):
+        fake = client()
+        _, seconds = _timed(engine, limited(fake), model_qna, pairs, **kwargs)
+        count = _answers(pairs)
+        results[label] = {"answers": count, "seconds": seconds, "answers_per_s": count / seconds, **fake.report()}
+
+    def run_async(*run_args, **kwargs):
+        return asyncio.run(evaluate_all_students_async(*run_args, max_concurrency=args.concurrency, **kwargs))
+
+    results = {}
+    run('sync', evaluate_all_students, sync_subset)
+    run('async', run_async, student_answers)
+    run('async_pre_graded', run_async, student_answers, pre_grader=PreGrader())
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GradingCache(os.path.join(tmp, 'cache.sqlite'))
+        run('async_cache_cold', run_async, student_answers, cache=cache)
+        run('async_cache_warm', run_async, student_answers, cache=cache)
+        cache.close()
+    results["answers_total"] = answers
+    return results
+
+
+def bench_export(folder, args) -> dict:
+    """ Write graded results as nested JSON in one go, and through the JSONL sink plus compaction. """
+    model_qna = model_qna_repository(folder)
+    student_answers = student_answers_repository(folder, workers=args.workers)
+    fake = FakeGradingClient(latency='constant', mean_latency=0)
+    evaluation = evaluate_all_students(fake, model_qna, student_answers)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        _, results["write_json_s"] = _timed(write_json, evaluation, save_path=tmp)
+        sink = ResultSink(os.path.join(tmp, 'results.jsonl'), fsync_interval=1.0)
+        _, results["sink_grade_s"] = _timed(evaluate_all_students, fake, model_qna, student_answers, sink=sink)
+        _, results["sink_compact_s"] = _timed(sink.compact, os.path.join(tmp, 'compacted.json'))
+        sink.close()
+    results["answers"] = _answers(student_answers)
+    return results
+
+
+def compare(baseline_path, current_path) -> None:
+    """ Print the ratio current/baseline of every timing shared by two result files. """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    def walk(a, b, prefix=''):
+        for key, value in b.items():
+            if isinstance(value, dict) and isinstance(a.get(key), dict):
+                walk(a[key], value, f"{prefix}{key}.")
+            elif isinstance(value, (int, float)) and isinstance(a.get(key), (int, float)) and a[key] \
+                    and (key.endswith('seconds') or key.endswith('_s') or key.endswith('per_s')):
+                print(f"{prefix}{key}: {a[key]:.4g} -> {value:.4g} ({value / a[key]:.2f}x)")
+
+    print(f"{baseline.get('commit', '?')[:10]} -> {current.get('commit', '?')[:10]}")
+    walk(baseline["results"], current["results"])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run the offline grading pipeline benchmarks.')
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-root', default='target/bench_data', help='where synthetic cohorts are generated')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='ingestion worker processes')
+    parser.add_argument('--latency', default='lognormal', choices=('constant', 'uniform', 'lognormal'))
+    parser.add_argument('--mean-latency', type=float, default=0.01, help='mean simulated request latency (s)')
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    parser.add_argument('--requests-per-minute', type=int, default=None)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--sync-students', type=int, default=50, help='students graded by the sequential engine')
+    parser.add_argument('--bleu-repeats', type=int, default=20)
+    parser.add_argument('--only', nargs='*', choices=('ingestion', 'bleu', 'grading', 'export', 'answer_key'),
+                        help='run only these benchmarks')
+    parser.add_argument('--output', default=RESULTS_DIR, help='directory for the JSON results')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='compare two result files instead of running')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    folder = Path(args.data_root) / f"cohort_{args.students}x{args.questions}_seed{args.seed}"
+    if not (folder / 'Synthetic' / 'submissions').is_dir():
+        shutil.rmtree(folder, ignore_errors=True)
+        generate_cohort(folder, 'Synthetic', args.students, args.questions, args.seed)
+    folder = folder / 'Synthetic'
+
+    benchmarks = {
+        'ingestion': lambda: bench_ingestion(folder, args.workers),
+        'bleu': lambda: bench_bleu(folder, args.bleu_repeats),
+        'grading': lambda: bench_grading(folder, args),
+        'export': lambda: bench_export(folder, args),
+        'answer_key': lambda: bench_answer_key.run(students=args.students, questions=args.questions),
+    }
+    results = {}
+    for name, benchmark in benchmarks.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"Running {name} benchmark...")
+        results[name] = benchmark()
+
+    commit = _git('rev-parse', 'HEAD')
+    report = {
+        "commit": commit,
+        "dirty": bool(_git('status', '--porcelain', '--untracked-files=no')),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k not in ('compare', 'output')},
+        "results": results,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = Path(args.output) / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}_{commit[:10] or 'nogit'}.json"
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(json.dumps(results, indent=4))
+    print(f"Saved benchmark results to {path}")
+
+
+if __name__ == "__main__":
+    main()
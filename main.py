@@ -1,19 +1,217 @@
+import argparse
 import os
+import subprocess
+import sys
 from dotenv import load_dotenv
+from app.clients.CascadeClient import DEFAULT_CONFIDENCE_THRESHOLD, OPENAI_TIERS, CascadeClient
+from app.clients.GeminiClient import GeminiClient
+from app.clients.OllamaClient import OLLAMA_MODEL_CONFIG, OllamaClient
 from app.clients.OpenAPIClient import OpenAPIClient
+from app.clients.ProviderRouter import ProviderRouter
+from app.clients.RateLimitedClient import RateLimitedClient
+from app.clients.transport import shared_transport
+from app.repositories.data_loaders import SpreadsheetLoader, SQLLoader
+from app.services.clustering_service import AnswerClusterer
 from app.services.EvaluationFlowService import EvaluationFlowService
+from app.services.GradingCache import GradingCache
+from app.services.manifest_service import RunManifest
+from app.services.MultiAssignmentFlowService import MultiAssignmentFlowService
+from app.services.pre_grading_service import PreGrader
+from app.services.result_sink_service import ResultSink
+from app.services.result_store_service import ResultStore
+from app.services.work_queue_service import WorkQueue
 
 load_dotenv()
 
+PROVIDERS = ('openai', 'gemini', 'ollama')
 
-def main():
+
+def add_client_arguments(parser) -> None:
+    """ Options choosing the grading client, shared with worker.py. """
+    parser.add_argument('--provider', default='openai', choices=PROVIDERS,
+                        help='grade with the OpenAI API, the Gemini API or a local Ollama server (OLLAMA_HOST)')
+    parser.add_argument('--fallback-provider', action='append', default=[], choices=PROVIDERS,
+                        help='route requests across --provider and this provider by health, failing over on errors '
+                             '(repeatable)')
+    parser.add_argument('--hedge', action='store_true',
+                        help='with --fallback-provider, duplicate requests that take longer than the p95 latency')
+    parser.add_argument('--ollama-model', default='llama3.1:8b', choices=sorted(OLLAMA_MODEL_CONFIG))
+    parser.add_argument('--cascade', action='store_true',
+                        help='grade with gpt-4o-mini first and escalate uncertain answers to gpt-4o')
+    parser.add_argument('--confidence-threshold', type=float, default=DEFAULT_CONFIDENCE_THRESHOLD,
+                        help='cascade grades below this confidence are escalated')
+    parser.add_argument('--max-concurrency', type=int, default=8,
+                        help='grading requests in flight at once when grading several assignments or from a queue')
+    parser.add_argument('--requests-per-minute', type=float, default=None,
+                        help='request rate limit per model (default: unlimited)')
+    parser.add_argument('--tokens-per-minute', type=float, default=None,
+                        help='estimated token rate limit per model (default: unlimited)')
+    parser.add_argument('--request-concurrency', type=int, default=16,
+                        help='requests in flight per model, halved automatically on rate limit and server errors')
+    parser.add_argument('--max-retries', type=int, default=6,
+                        help='retries of rate limited and transient errors, with exponential backoff')
+
+
+def client_arguments(args) -> list:
+    """ Command line options reproducing the client chosen in `args`. """
+    options = ['--provider', args.provider, '--ollama-model', args.ollama_model,
+               '--confidence-threshold', str(args.confidence_threshold),
+               '--max-concurrency', str(args.max_concurrency),
+               '--request-concurrency', str(args.request_concurrency), '--max-retries', str(args.max_retries)]
+    for option, value in (('--requests-per-minute', args.requests_per_minute),
+                          ('--tokens-per-minute', args.tokens_per_minute)):
+        if value is not None:
+            options += [option, str(value)]
+    for provider in args.fallback_provider:
+        options += ['--fallback-provider', provider]
+    return options + (['--cascade'] if args.cascade else []) + (['--hedge'] if args.hedge else [])
+
+
+def rate_limited(client, args) -> RateLimitedClient:
+    """ Wrap a client in the rate limits, retries and adaptive concurrency chosen on the command line. """
+    return RateLimitedClient(client, requests_per_minute=args.requests_per_minute,
+                             tokens_per_minute=args.tokens_per_minute, max_concurrency=args.request_concurrency,
+                             max_retries=args.max_retries)
+
+
+def build_provider(provider, args):
+    """
+    Create the client of one provider, rate limited and retried per model.
+    A cascade wraps each of its tiers, so a retry only repeats the tier that failed.
+    """
+    if provider == 'ollama':
+        client = OllamaClient(model=args.ollama_model)
+        client.load()
+        return rate_limited(client, args)
+    if provider == 'gemini':
+        print('GEMINI_API_KEY loaded:', bool(os.getenv('GEMINI_API_KEY')))
+        return rate_limited(GeminiClient(os.getenv('GEMINI_API_KEY')), args)
     print('OPENAI_API_KEY loaded:', bool(os.getenv('OPENAI_API_KEY')))
-    client = OpenAPIClient(model='gpt-4o', api_key=os.getenv('OPENAI_API_KEY'))
+    api_key = os.getenv('OPENAI_API_KEY')
+    if args.cascade:
+        tiers = [rate_limited(OpenAPIClient(model, api_key, max_retries=0), args) for model in OPENAI_TIERS]
+        return CascadeClient(tiers, confidence_threshold=args.confidence_threshold)
+    return rate_limited(OpenAPIClient(model='gpt-4o', api_key=api_key, max_retries=0), args)
+
+
+def build_client(args):
+    """ Create the grading client chosen on the command line, routed across providers when fallbacks are given. """
+    client = build_provider(args.provider, args)
+    if not args.fallback_provider:
+        return client
+    fallbacks = [build_provider(provider, args) for provider in args.fallback_provider]
+    return ProviderRouter([client, *fallbacks], hedge=args.hedge)
+
+
+def build_loader(args):
+    """ DataLoader of the --source export, or None to read the --assignment folder. """
+    if not args.source:
+        return None
+    if args.source.lower().endswith(('.csv', '.xlsx', '.xlsm')):
+        if not args.answer_key:
+            raise SystemExit('--answer-key is required with a CSV or Excel --source')
+        return SpreadsheetLoader(args.source, args.answer_key, name=args.source_assignment)
+    if not args.source_assignment:
+        raise SystemExit('--source-assignment is required with an SQLite --source')
+    return SQLLoader.sqlite(args.source, args.source_assignment)
+
+
+def store_results(flow_service, path) -> None:
+    """ Add the exported results of a flow to the ResultStore at `path`, if one was requested. """
+    if path:
+        store = ResultStore(path)
+        try:
+            flow_service.export_to_store(store)
+        finally:
+            store.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Grade student submissions against the model answers.')
+    parser.add_argument('--assignment', default='./data/Rugby Football Club',
+                        help='assignment folder to grade')
+    parser.add_argument('--root',
+                        help='grade every assignment under this directory as one workload instead of --assignment')
+    parser.add_argument('--source',
+                        help='grade an SQLite database or CSV/Excel export (see data_loaders) instead of --assignment')
+    parser.add_argument('--source-assignment',
+                        help='assignment to read from an SQLite --source, or the name of a CSV/Excel one')
+    parser.add_argument('--answer-key',
+                        help='answer key sheet or assignment folder for a CSV/Excel --source')
+    add_client_arguments(parser)
+    parser.add_argument('--queue',
+                        help='enqueue the assignment into this work queue file and let worker.py processes grade it')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='worker processes to start on this host for --queue (0 relies on workers started elsewhere)')
+    parser.add_argument('--parse-workers', type=int, default=1,
+                        help='processes parsing submission files (0 uses every CPU)')
+    parser.add_argument('--stream', action='store_true',
+                        help='grade submissions while they are being parsed instead of parsing them all first')
+    parser.add_argument('--store',
+                        help='also add the results to this SQLite result store for querying across runs')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted run, skipping answers already in the result sink')
+    parser.add_argument('--fsync-interval', type=float, default=1.0,
+                        help='seconds between fsyncs of the result sink (0 syncs every answer)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.queue:
+        queue = WorkQueue(args.queue)
+        eval_flow_service = EvaluationFlowService()
+        loader = build_loader(args)
+        try:
+            eval_flow_service.retrieve_data(path=args.assignment, loader=loader, workers=args.parse_workers or None,
+                                            stream=args.stream or loader is not None)
+            run = eval_flow_service.enqueue_data(queue, pre_grader=PreGrader())
+        finally:
+            if loader is not None:
+                loader.close()
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worker.py'), '--queue', args.queue, '--run', run, *client_arguments(args)]
+        workers = [subprocess.Popen(command) for _ in range(args.workers)]
+        try:
+            eval_flow_service.collect_queue_results(queue, run)
+            eval_flow_service.export_data()
+            store_results(eval_flow_service, args.store)
+        finally:
+            for worker in workers:
+                worker.wait()
+            eval_flow_service.export_metrics()
+            queue.close()
+        return
+
+    client = build_client(args)
+    if args.root:
+        with shared_transport():
+            term_flow_service = MultiAssignmentFlowService()
+            term_flow_service.retrieve_data(args.root, workers=args.parse_workers or None, stream=args.stream)
+            term_flow_service.evaluate_data(client, max_concurrency=args.max_concurrency, cache=GradingCache(),
+                                            pre_grader=PreGrader(), incremental=True, clusterer=AnswerClusterer())
+            term_flow_service.export_data()
+            store_results(term_flow_service, args.store)
+            term_flow_service.export_metrics()
+        return
+
     eval_flow_service = EvaluationFlowService()
-    eval_flow_service.retrieve_data(path='./data/Rugby Football Club')
-    eval_flow_service.evaluate_data(client)
-    eval_flow_service.export_data()
+    loader = build_loader(args)
+    # Loaded sources are streamed into grading, so they stay open until it is done
+    eval_flow_service.retrieve_data(path=args.assignment, loader=loader, workers=args.parse_workers or None,
+                                    stream=args.stream or loader is not None)
+    sink = ResultSink(fsync_interval=args.fsync_interval, resume=args.resume)
+    try:
+        eval_flow_service.evaluate_data(client, cache=GradingCache(), pre_grader=PreGrader(), manifest=RunManifest(),
+                                        sink=sink, clusterer=AnswerClusterer())
+        eval_flow_service.export_data()
+        store_results(eval_flow_service, args.store)
+    finally:
+        eval_flow_service.export_metrics()
+        sink.close()
+        if loader is not None:
+            loader.close()
+        shared_transport().close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
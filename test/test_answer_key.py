@@ -0,0 +1,33 @@
+import pytest
+
+from app.models.answer_key import AnswerKey, AnswerKeyEntry
+
+RECORDS = [
+    {"question_id": 2, "question_text": "Which RFC defines ICMP?", "answer_text": "RFC 792."},
+    {"question_id": 1, "question_text": "What does TCP stand for?", "answer_text": "Transmission Control Protocol"},
+    {"question_id": 2, "question_text": "Duplicate", "answer_text": "Ignored"},
+]
+
+
+def test_entries_are_indexed_by_question_id_in_order():
+    answer_key = AnswerKey.from_records(RECORDS)
+    assert list(answer_key) == [2, 1] and len(answer_key) == 2
+    assert answer_key[2].answer_text == "RFC 792."
+    assert answer_key.get(3) is None
+    with pytest.raises(KeyError):
+        answer_key[3]
+
+
+def test_first_duplicate_wins_and_records_round_trip():
+    answer_key = AnswerKey.from_records(RECORDS)
+    assert answer_key.to_records() == RECORDS[:2]
+    assert AnswerKey.of(answer_key) is answer_key
+    assert AnswerKey.of(RECORDS[:2]).to_records() == RECORDS[:2]
+
+
+def test_normalized_forms_are_precomputed():
+    entry = AnswerKeyEntry.create(2, "Which RFC defines ICMP?", "RFC 792.")
+    assert entry.normalized_answer == "rfc 792"
+    assert entry.answer_tokens == ("rfc", "792")
+    with pytest.raises(AttributeError):
+        entry.answer_text = "changed"
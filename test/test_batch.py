@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from app.clients.LocalBatchProvider import LocalBatchProvider
+from app.clients.OpenAPIClient import OpenAPIClient
+from app.models.answer_key import AnswerKey
+from app.models.schemas import EvaluationResponse
+from app.services.EvaluationFlowService import EvaluationFlowService
+from app.services.evaluation_service import evaluate_all_students_batch
+
+ANSWER_KEY = AnswerKey.from_records(
+    {"question_id": question_id, "question_text": f"Question {question_id}", "answer_text": f"Answer {question_id}"}
+    for question_id in range(1, 4))
+STUDENT_ANSWERS = {student: [{"question_id": question_id, "student_answer": f"{student} guess {question_id}"}
+                             for question_id in range(1, 4)]
+                   for student in ("s0", "s1")}
+
+
+def _responder(failing=()):
+    """ Grade every request 'Pass', answering requests for the `failing` student answers with invalid output. """
+    def respond(body):
+        prompt = body['messages'][-1]['content']
+        if any(answer in prompt for answer in failing):
+            return "not json"
+        return json.dumps({"grade": "Pass", "explanation": "batch", "confidence": 0.9})
+    return respond
+
+
+def _client(tmp_path, responder, completion_delay=0.0):
+    client = OpenAPIClient('gpt-4o', 'test-key',
+                           batch_provider=LocalBatchProvider(tmp_path / 'provider', responder, completion_delay))
+    client.graded_one_by_one = []
+
+    def evaluate(question, model, student):
+        client.graded_one_by_one.append(student)
+        return EvaluationResponse(grade="Fail", explanation="single")
+
+    client.evaluate = evaluate
+    return client
+
+
+def _grades(results):
+    return {(result["student"], item["question_id"]): item["evaluation"]["explanation"]
+            for result in results for item in result["evaluations"]}
+
+
+def test_batch_is_submitted_polled_and_merged(tmp_path):
+    client = _client(tmp_path, _responder())
+    results = evaluate_all_students_batch(client, ANSWER_KEY, STUDENT_ANSWERS, batch_dir=tmp_path / 'batch',
+                                          poll_interval=0.01)
+    assert [result["student"] for result in results] == ["s0", "s1"]
+    assert set(_grades(results).values()) == {"batch"}
+    assert client.graded_one_by_one == []
+    assert len(list((tmp_path / 'batch').glob('*.jsonl'))) == 1
+
+
+def test_requests_missing_from_the_output_are_graded_one_by_one(tmp_path):
+    client = _client(tmp_path, _responder(failing=("s1 guess 2",)))
+    results = evaluate_all_students_batch(client, ANSWER_KEY, STUDENT_ANSWERS, batch_dir=tmp_path / 'batch',
+                                          poll_interval=0.01)
+    grades = _grades(results)
+    assert grades.pop(("s1", 2)) == "single"
+    assert set(grades.values()) == {"batch"}
+    assert client.graded_one_by_one == ["s1 guess 2"]
+
+
+def test_unfinished_batch_times_out(tmp_path):
+    client = _client(tmp_path, _responder(), completion_delay=60)
+    with pytest.raises(TimeoutError):
+        evaluate_all_students_batch(client, ANSWER_KEY, STUDENT_ANSWERS, batch_dir=tmp_path / 'batch',
+                                    poll_interval=0.01, timeout=0.05)
+
+
+def test_flow_grades_through_the_batch_api(tmp_path, monkeypatch):
+    client = _client(tmp_path, _responder())
+    flow = EvaluationFlowService()
+    flow.retrieve_data('./data/Rugby Football Club')
+    reported = []
+    monkeypatch.setattr(flow, '_print_reports', lambda *args: reported.append(args))
+    results = flow.evaluate_data_batch(client, batch_dir=tmp_path / 'batch', poll_interval=0.01)
+    assert len(results) == len(flow.studentanswers)
+    assert reported[0][-1] is client
@@ -0,0 +1,69 @@
+import random
+import tracemalloc
+
+import numpy as np
+from nltk.translate.bleu_score import SmoothingFunction, sentence_bleu
+
+from app.repositories.model_qna_bleu_repo import BleuMatcher, best_bleu_match, tokenize
+
+CANDIDATES = [
+    "What is the RFC number of ICMP?",
+    "Which RFC updates the ICMP specification?",
+    "How many bits is the checksum field?",
+    "What type is the source quench message?",
+    "Is the source quench message deprecated?",
+    "checksum",
+]
+WORDS = "what is the rfc number of icmp which updates specification how many bits checksum field type source quench " \
+        "message deprecated a an it gateway host send".split()
+
+
+def _lines(count, seed=7):
+    rng = random.Random(seed)
+    lines = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 14))) for _ in range(count)]
+    return lines + CANDIDATES + ["1. What is the RFC number of ICMP?", "unrelated words only", "icmp"]
+
+
+def test_scores_equal_nltk_sentence_bleu():
+    lines = _lines(300)
+    scores = BleuMatcher(CANDIDATES).score(lines)
+    smooth = SmoothingFunction().method1
+    expected = np.array([[sentence_bleu([tokenize(candidate)], tokenize(line), smoothing_function=smooth)
+                          for candidate in CANDIDATES] for line in lines])
+    assert scores.shape == expected.shape
+    assert np.abs(scores - expected).max() < 1e-12
+
+
+def test_best_candidate_matches_best_bleu_match():
+    lines = _lines(100, seed=11)
+    scores = BleuMatcher(CANDIDATES).score(lines)
+    for line, row in zip(lines, scores):
+        expected = best_bleu_match(line, CANDIDATES)
+        matched = CANDIDATES[int(row.argmax())] if row.max() >= 0.25 else None
+        assert matched == expected
+
+
+def test_empty_inputs():
+    assert BleuMatcher(CANDIDATES).score([]).shape == (0, len(CANDIDATES))
+    assert BleuMatcher([]).score(["a line"]).shape == (1, 0)
+
+
+def test_long_submission_memory_is_bounded_by_the_candidates():
+    rng = random.Random(3)
+    filler = [f"word{n}" for n in range(20000)]
+    lines = [[rng.choice(filler) for _ in range(rng.randint(5, 20))] for _ in range(5000)]
+    lines += [tokenize(candidate) for candidate in CANDIDATES]
+    matcher = BleuMatcher(CANDIDATES)
+    tracemalloc.start()
+    try:
+        scores = matcher.score_tokens(lines)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # Dense tables over the submission's own n-grams would take gigabytes here
+    assert peak < 20_000_000
+    assert scores.shape == (len(lines), len(CANDIDATES))
+    smooth = SmoothingFunction().method1
+    expected = [sentence_bleu([tokenize(candidate)], tokenize(candidate), smoothing_function=smooth)
+                for candidate in CANDIDATES]
+    assert np.allclose(np.diag(scores[-len(CANDIDATES):]), expected)
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.clients.CascadeClient import CascadeClient
+from app.clients.OllamaClient import OLLAMA_MODEL_CONFIG
+from app.clients.OpenAPIClient import MODEL_CONFIG, OpenAPIClient
+from app.models.schemas import EvaluationResponse
+
+
+class _Tier:
+    """ Fake tier returning a fixed grade and confidence, or raising like an unparseable response. """
+    def __init__(self, model, grade="Pass", confidence=0.95, error=None):
+        self.model = model
+        self.grade = grade
+        self.confidence = confidence
+        self.error = error
+        self.calls = 0
+
+    def get_model(self):
+        return self.model
+
+    def evaluate(self, question, model, student):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return EvaluationResponse(grade=self.grade, explanation=self.model, confidence=self.confidence)
+
+    async def evaluate_async(self, question, model, student):
+        return self.evaluate(question, model, student)
+
+
+def _cascade(first, threshold=0.8):
+    return CascadeClient([first, _Tier("strong", grade="Fail", confidence=None)], confidence_threshold=threshold)
+
+
+def test_confident_grade_is_kept_by_the_first_tier():
+    cascade = _cascade(_Tier("cheap"))
+    evaluation = cascade.evaluate("Q", "RFC 792", "RFC 792")
+    assert (evaluation.grade, evaluation.tier, evaluation.confidence) == ("Pass", "cheap", 0.95)
+    assert cascade.tiers[1].calls == 0
+    assert cascade.report() == {"decided": {"cheap": 1}, "escalations": {}}
+
+
+@pytest.mark.parametrize("first, reason", [
+    (_Tier("cheap", confidence=0.5), "low_confidence"),
+    (_Tier("cheap", confidence=None), "low_confidence"),
+    (_Tier("cheap", error=ValueError("Failed to parse evaluation response")), "unparseable"),
+    (_Tier("cheap", grade="Pass", confidence=0.99), "disagreement"),
+])
+def test_uncertain_grades_are_escalated(first, reason):
+    cascade = _cascade(first)
+    # 'UDP' shares no token with the model answer, so a confident 'Pass' contradicts deterministic_grade
+    evaluation = asyncio.run(cascade.evaluate_async("Q", "RFC 792", "UDP" if reason == "disagreement" else "RFC 792"))
+    assert (evaluation.grade, evaluation.tier) == ("Fail", "strong")
+    assert cascade.report() == {"decided": {"strong": 1}, "escalations": {reason: 1}}
+
+
+def test_errors_of_the_last_tier_are_raised():
+    cascade = CascadeClient([_Tier("cheap", confidence=0.1), _Tier("strong", error=ValueError("bad output"))])
+    with pytest.raises(ValueError, match="bad output"):
+        cascade.evaluate("Q", "A", "a")
+
+
+@pytest.mark.parametrize("config", [*MODEL_CONFIG.values(), *OLLAMA_MODEL_CONFIG.values()])
+def test_every_tier_prompt_asks_for_confidence(config):
+    prompt = "\n".join(config['system_prompt']) + config['prompt_template']
+    assert "confidence" in prompt
+
+
+def test_json_mode_prompt_asks_for_confidence():
+    client = OpenAPIClient('gpt-3.5-turbo', 'test-key')
+    assert client.get_config()['response_format'] == {"type": "json_object"}
+    assert "'confidence'" in client.format_prompt("Q", "A", "a")
@@ -0,0 +1,26 @@
+from app.services.clustering_service import AnswerClusterer
+from app.utils.normalization import canonical_form
+
+
+def _groups(answers, model_answer="192.168.1.3"):
+    return [((1, answer), [{"question_id": 1, "model_answer": model_answer, "student_answer": answer}])
+            for answer in answers]
+
+
+def test_equivalent_answers_share_a_cluster():
+    clusters = AnswerClusterer().cluster(_groups(["RFC 0792", "rfc792", "RFC 792."], "RFC 792"))
+    assert len(clusters) == 1
+    assert clusters[0][0] == (1, "RFC 0792")
+    assert len(clusters[0][1]) == 3
+
+
+def test_list_answers_cluster_in_any_order():
+    assert canonical_form("87, 134, 135") == canonical_form("135, 134 and 87")
+
+
+def test_different_addresses_and_versions_are_not_merged():
+    clusterer = AnswerClusterer()
+    clusters = clusterer.cluster(_groups(["192.168.1.3", "192.168.1.30", "10.0.0.1", "10.0.0.10", "-5", "5"]))
+    assert len(clusters) == 6
+    assert canonical_form("Version 2.1") != canonical_form("Version 2.10")
+    assert clusterer.report()["clusters"] == 6
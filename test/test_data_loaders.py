@@ -0,0 +1,144 @@
+import csv
+import sqlite3
+import sys
+
+import pytest
+
+import main
+from app.models.schemas import EvaluationResponse
+from app.repositories.data_loaders import DataLoader, DirectoryLoader, SpreadsheetLoader, SQLLoader, group_by_student
+from app.services.EvaluationFlowService import EvaluationFlowService
+from app.services.MultiAssignmentFlowService import MultiAssignmentFlowService
+
+ASSIGNMENT = './data/Rugby Football Club'
+
+
+@pytest.fixture(scope='module')
+def expected():
+    loader = DirectoryLoader(ASSIGNMENT)
+    return loader.answer_key().to_records(), dict(loader.iter_student_answers())
+
+
+@pytest.fixture
+def exports(tmp_path, expected):
+    """ The assignment as an SQLite database with TEXT question ids and as CSV sheets, rows shuffled in SQL. """
+    records, answers = expected
+    rows = [(student, str(answer["question_id"]), answer["student_answer"])
+            for student, student_answers in answers.items() for answer in student_answers]
+    database = tmp_path / 'lms.sqlite'
+    connection = sqlite3.connect(database)
+    connection.execute("CREATE TABLE questions (assignment TEXT, question_id TEXT, question_text TEXT, answer_text TEXT)")
+    connection.execute("CREATE TABLE answers (assignment TEXT, student TEXT, question_id TEXT, answer TEXT)")
+    connection.executemany("INSERT INTO questions VALUES ('rfc', ?, ?, ?)",
+                           [(str(record["question_id"]), record["question_text"], record["answer_text"])
+                            for record in reversed(records)])
+    connection.executemany("INSERT INTO answers VALUES ('rfc', ?, ?, ?)", reversed(rows))
+    connection.commit()
+    connection.close()
+
+    answers_csv, key_csv = tmp_path / 'answers.csv', tmp_path / 'key.csv'
+    with open(answers_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['student', 'question_id', 'answer'])
+        writer.writerows(rows)
+    with open(key_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['question_id', 'question_text', 'answer_text'])
+        writer.writerows((record["question_id"], record["question_text"], record["answer_text"]) for record in records)
+    return database, answers_csv, key_csv
+
+
+def _in_question_order(answers):
+    return {student: sorted(student_answers, key=lambda answer: answer["question_id"])
+            for student, student_answers in answers.items()}
+
+
+def test_sql_loader_matches_folder(exports, expected):
+    records, answers = expected
+    loader = SQLLoader.sqlite(exports[0], 'rfc', batch_size=3)
+    try:
+        assert loader.answer_key().to_records() == records
+        assert dict(loader.iter_student_answers()) == _in_question_order(answers)
+    finally:
+        loader.close()
+
+
+def test_csv_loader_matches_folder(exports, expected):
+    records, answers = expected
+    _, answers_csv, key_csv = exports
+    assert SpreadsheetLoader(answers_csv, key_csv).answer_key().to_records() == records
+    assert SpreadsheetLoader(answers_csv, ASSIGNMENT).answer_key().to_records() == records
+    assert dict(SpreadsheetLoader(answers_csv, key_csv).iter_student_answers()) == answers
+
+
+def test_sql_question_ids_are_ordered_numerically(tmp_path):
+    database = tmp_path / 'lms.sqlite'
+    connection = sqlite3.connect(database)
+    connection.execute("CREATE TABLE questions (assignment TEXT, question_id TEXT, question_text TEXT, answer_text TEXT)")
+    connection.execute("CREATE TABLE answers (assignment TEXT, student TEXT, question_id TEXT, answer TEXT)")
+    connection.executemany("INSERT INTO questions VALUES ('hw', ?, 'Q', 'A')", [("1",), ("10",), ("2",)])
+    connection.executemany("INSERT INTO answers VALUES ('hw', 's0', ?, 'a')", [("1",), ("10",), ("2",)])
+    connection.commit()
+    connection.close()
+    loader = SQLLoader.sqlite(database, 'hw')
+    try:
+        assert list(loader.answer_key().keys()) == [1, 2, 10]
+        (_, answers), = loader.iter_student_answers()
+        assert [answer["question_id"] for answer in answers] == [1, 2, 10]
+    finally:
+        loader.close()
+
+
+def test_flow_streams_from_a_loader(exports):
+    flow = EvaluationFlowService()
+    flow.retrieve_data(loader=SQLLoader.sqlite(exports[0], 'rfc'), stream=True)
+    assert flow._assignment() == 'rfc'
+    assert not isinstance(flow.studentanswers, dict)
+    assert len(list(flow.studentanswers)) == flow.ingestion_report.parsed == 8
+
+
+class _Client:
+    def evaluate(self, question, model, student):
+        return EvaluationResponse(grade="Fail", explanation="Graded.")
+
+    async def evaluate_async(self, question, model, student):
+        return self.evaluate(question, model, student)
+
+
+def test_multi_assignment_flow_streams_from_loaders(exports):
+    flow = MultiAssignmentFlowService()
+    loader = SQLLoader.sqlite(exports[0], 'rfc')
+    try:
+        flow.retrieve_data(loaders=[loader], stream=True)
+        assert not isinstance(flow.assignments['rfc'][1], dict)
+        results = flow.evaluate_data(_Client(), max_concurrency=2)
+    finally:
+        loader.close()
+    assert len(results['rfc']) == flow.ingestion_reports['rfc'].parsed == 8
+
+
+def test_cli_streams_a_source_and_closes_it(exports, tmp_path, monkeypatch):
+    loaders = []
+
+    def build_loader(args):
+        loaders.append(SQLLoader.sqlite(args.source, args.source_assignment))
+        return loaders[-1]
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, 'build_client', lambda args: _Client())
+    monkeypatch.setattr(main, 'build_loader', build_loader)
+    monkeypatch.setattr(sys, 'argv', ['main.py', '--source', str(exports[0]), '--source-assignment', 'rfc'])
+    main.main()
+    assert (tmp_path / 'target' / 'evaluation_results.json').exists()
+    with pytest.raises(sqlite3.ProgrammingError):
+        loaders[0].connection.execute("SELECT 1")
+
+
+def test_data_loader_is_abstract():
+    with pytest.raises(TypeError):
+        DataLoader()
+
+
+def test_rows_of_a_student_must_be_contiguous():
+    with pytest.raises(ValueError):
+        list(group_by_student([('a', 1, 'x'), ('b', 1, 'y'), ('a', 2, 'z')]))
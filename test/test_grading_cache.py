@@ -0,0 +1,95 @@
+import itertools
+
+import pytest
+
+import app.services.GradingCache as grading_cache
+from app.clients.OpenAPIClient import OpenAPIClient
+from app.clients.RateLimitedClient import RateLimitedClient
+from app.models.answer_key import AnswerKey
+from app.models.schemas import EvaluationResponse
+from app.services.evaluation_service import evaluate_all_students
+from app.services.GradingCache import GradingCache, client_fingerprint
+
+ANSWER_KEY = AnswerKey.from_records([{"question_id": 1, "question_text": "Which RFC?", "answer_text": "RFC 792"}])
+STUDENT_ANSWERS = {"s0": [{"question_id": 1, "student_answer": "RFC 792"}],
+                   "s1": [{"question_id": 1, "student_answer": " RFC\t792 \n"}]}
+
+
+class _Client:
+    def __init__(self, model):
+        self.model = model
+        self.graded = 0
+
+    def get_config(self):
+        return {"model": self.model}
+
+    def evaluate(self, question, model, student):
+        self.graded += 1
+        return EvaluationResponse(grade="Pass", explanation=self.model)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A strictly increasing clock, so least-recently-used order never depends on timer resolution
+    clock = itertools.count()
+    monkeypatch.setattr(grading_cache.time, 'time', lambda: float(next(clock)))
+    cache = GradingCache(tmp_path / 'cache.sqlite')
+    yield cache
+    cache.close()
+
+
+def test_keys_are_stable_and_ignore_whitespace():
+    fingerprint = client_fingerprint(_Client("m"))
+    key = GradingCache.make_key(fingerprint, "Q", "A", "RFC 792")
+    assert GradingCache.make_key(fingerprint, "Q", "A", "  RFC\n 792 ") == key
+    assert GradingCache.make_key(fingerprint, "Q", "A", "RFC 793") != key
+    assert GradingCache.make_key(fingerprint, "Q", "A", "RFC 792", namespace='review') != key
+    assert GradingCache.make_key(fingerprint, "Q", "A", "RFC 792", context={"grade": "Pass"}) != key
+    assert GradingCache.make_key(client_fingerprint(_Client("m")), "Q", "A", "RFC 792") == key
+
+
+def test_fingerprint_looks_through_wrappers():
+    client = OpenAPIClient('gpt-4o', 'test-key')
+    assert client_fingerprint(RateLimitedClient(RateLimitedClient(client))) == client_fingerprint(client)
+    assert '"provider": "OpenAPIClient"' in client_fingerprint(client)
+
+
+def test_model_change_invalidates_cached_grades(cache):
+    first = _Client("gpt-4o")
+    evaluate_all_students(first, ANSWER_KEY, STUDENT_ANSWERS, cache=cache)
+    # The two answers differ only in whitespace, so they share one request
+    assert first.graded == 1
+    again = _Client("gpt-4o")
+    results = evaluate_all_students(again, ANSWER_KEY, STUDENT_ANSWERS, cache=cache)
+    assert again.graded == 0 and cache.hits >= 1
+    assert {result["evaluations"][0]["evaluation"]["explanation"] for result in results} == {"gpt-4o"}
+    other = _Client("gpt-4o-mini")
+    evaluate_all_students(other, ANSWER_KEY, STUDENT_ANSWERS, cache=cache)
+    assert other.graded == 1
+
+
+def test_least_recently_used_entries_are_evicted_by_size(cache):
+    response = EvaluationResponse(grade="Pass", explanation="x")
+    entry_size = len("a") + len(response.model_dump_json())
+    cache.max_bytes = 2 * entry_size
+    cache.put("a", response)
+    cache.put("b", response)
+    assert cache.get("a") is not None
+    cache.put("c", response)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.report()["evictions"] == 1
+    assert cache.report()["bytes"] == 2 * entry_size
+
+
+def test_entries_persist_across_instances(tmp_path):
+    response = EvaluationResponse(grade="Fail", explanation="kept")
+    first = GradingCache(tmp_path / 'cache.sqlite')
+    first.put("key", response)
+    first.close()
+    reopened = GradingCache(tmp_path / 'cache.sqlite')
+    try:
+        assert reopened.get("key") == response
+        assert reopened.report()["bytes"] == len("key") + len(response.model_dump_json())
+    finally:
+        reopened.close()
@@ -0,0 +1,109 @@
+import sys
+from concurrent.futures import Future
+
+import pytest
+
+import app.repositories.student_answers_repository as repository
+import main
+from app.repositories.student_answers_repository import IngestionReport, iter_student_answers, parse_submission
+from app.services.EvaluationFlowService import EvaluationFlowService
+
+SUBMISSION = "1. Which RFC defines ICMP?\nRFC 792\n\n2. How many bits is the checksum?  \n16 bits\n\n3. 8"
+
+
+def test_questions_repeated_in_answers_are_stripped():
+    assert parse_submission(SUBMISSION) == [
+        {"question_id": 1, "student_answer": "RFC 792"},
+        {"question_id": 2, "student_answer": "16 bits"},
+        {"question_id": 3, "student_answer": "8"},
+    ]
+
+
+def test_only_a_real_newline_ends_a_repeated_question():
+    # The old pattern looked for a literal '/n' after the question mark
+    assert parse_submission("1. Is ICMP routed? /nNo") == [{"question_id": 1, "student_answer": "Is ICMP routed? /nNo"}]
+
+
+def _assignment(tmp_path, students=5):
+    submissions = tmp_path / 'submissions'
+    for n in range(students):
+        (submissions / f"student {n}").mkdir(parents=True)
+        (submissions / f"student {n}" / 'submission.txt').write_text(f"1. Q?\nanswer {n}", encoding='utf-8')
+    return tmp_path
+
+
+def test_unparseable_submissions_are_flagged(tmp_path):
+    submissions = _assignment(tmp_path, students=1) / 'submissions'
+    (submissions / 'missing').mkdir()
+    (submissions / 'empty').mkdir()
+    (submissions / 'empty' / 'submission.txt').write_text("no numbers here", encoding='utf-8')
+    (submissions / 'binary').mkdir()
+    (submissions / 'binary' / 'submission.txt').write_bytes(b"1. \xff\xfe")
+    report = IngestionReport()
+    answers = dict(iter_student_answers(tmp_path, workers=1, report=report))
+    assert answers == {"student 0": [{"question_id": 1, "student_answer": "answer 0"}]}
+    reasons = {flagged["student"]: flagged["reason"] for flagged in report.flagged}
+    assert reasons["missing"] == "missing submission.txt"
+    assert reasons["empty"] == "no numbered answers found"
+    assert reasons["binary"].startswith("unreadable submission.txt")
+    assert report.to_dict()["parsed"] == 1
+
+
+def test_process_pool_matches_serial_parsing(tmp_path):
+    _assignment(tmp_path, students=12)
+    serial = list(iter_student_answers(tmp_path, workers=1))
+    assert list(iter_student_answers(tmp_path, workers=2)) == serial
+
+
+executors = []
+
+
+class _Executor:
+    """ Runs submissions inline and records how many were submitted. """
+    def __init__(self, max_workers):
+        self.submitted = 0
+        executors.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def test_prefetch_window_bounds_parsed_submissions(tmp_path, monkeypatch):
+    _assignment(tmp_path, students=30)
+    monkeypatch.setattr(repository, 'ProcessPoolExecutor', _Executor)
+    executors.clear()
+    answers = iter_student_answers(tmp_path, workers=2)
+    next(answers)
+    window = repository.PREFETCH_PER_WORKER * 2
+    assert executors[0].submitted == window
+    assert len(list(answers)) == 29
+    assert executors[0].submitted == 30
+
+
+@pytest.mark.parametrize("argv, workers, stream", [
+    ([], 1, False),
+    (['--parse-workers', '4', '--stream'], 4, True),
+    (['--parse-workers', '0'], None, False),
+])
+def test_cli_passes_parse_workers_and_stream(argv, workers, stream, monkeypatch, tmp_path):
+    calls = []
+
+    def retrieve_data(self, path=None, stream=False, workers=1, loader=None):
+        calls.append((workers, stream))
+        raise SystemExit
+
+    monkeypatch.setattr(EvaluationFlowService, 'retrieve_data', retrieve_data)
+    monkeypatch.setattr(main, 'build_client', lambda args: None)
+    monkeypatch.setattr(sys, 'argv', ['main.py', *argv])
+    with pytest.raises(SystemExit):
+        main.main()
+    assert calls == [(workers, stream)]
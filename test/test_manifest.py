@@ -0,0 +1,77 @@
+import json
+import shutil
+
+import pytest
+
+from app.models.schemas import EvaluationResponse
+from app.repositories.model_qna_repository import model_qna_repository
+from app.repositories.student_answers_repository import student_answers_repository
+from app.services.evaluation_service import evaluate_all_students
+from app.services.manifest_service import RunManifest
+
+CONFIG = {"client": "counting"}
+
+
+class _CountingClient:
+    def __init__(self):
+        self.graded = []
+
+    def evaluate(self, question, model, student):
+        self.graded.append(student)
+        return EvaluationResponse(grade="Fail", explanation="Graded.")
+
+
+@pytest.fixture
+def assignment(tmp_path):
+    return shutil.copytree('./data/Rugby Football Club', tmp_path / 'Rugby Football Club')
+
+
+def _run(assignment, results_path, config=CONFIG):
+    """ Grade the assignment incrementally and save results and manifest like the flow service does. """
+    manifest = RunManifest(results_path)
+    answer_key = model_qna_repository(assignment)
+    manifest.prepare(assignment, answer_key, config)
+    client = _CountingClient()
+    results = evaluate_all_students(client, answer_key, student_answers_repository(assignment), manifest=manifest)
+    with open(results_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f)
+    manifest.save(results_path)
+    return client, manifest, results
+
+
+def test_unchanged_run_reuses_every_grade(assignment, tmp_path):
+    results_path = tmp_path / 'evaluation_results.json'
+    first, _, results = _run(assignment, results_path)
+    assert first.graded
+    second, manifest, rerun = _run(assignment, results_path)
+    assert second.graded == []
+    assert manifest.report() == {"carried_over": sum(len(r["evaluations"]) for r in results), "regraded": 0}
+    assert rerun == results
+
+
+def test_only_changed_answers_are_regraded(assignment, tmp_path):
+    results_path = tmp_path / 'evaluation_results.json'
+    _run(assignment, results_path)
+    submission = assignment / 'submissions' / 'student 4' / 'submission.txt'
+    text = submission.read_text(encoding='utf-8')
+    submission.write_text(text.replace('\nRFC 792', '\nRFC 793'), encoding='utf-8')
+    client, manifest, _ = _run(assignment, results_path)
+    assert client.graded == ['RFC 793']
+    assert manifest.report()["regraded"] == 1
+
+
+def test_changed_config_regrades_everything(assignment, tmp_path):
+    results_path = tmp_path / 'evaluation_results.json'
+    first, _, _ = _run(assignment, results_path)
+    client, manifest, _ = _run(assignment, results_path, config={"client": "other"})
+    assert len(client.graded) == len(first.graded)
+    assert manifest.report()["carried_over"] == 0
+
+
+def test_manifest_is_ignored_next_to_edited_results(assignment, tmp_path):
+    results_path = tmp_path / 'evaluation_results.json'
+    first, _, _ = _run(assignment, results_path)
+    with open(results_path, 'a', encoding='utf-8') as f:
+        f.write('\n')
+    client, _, _ = _run(assignment, results_path)
+    assert len(client.graded) == len(first.graded)
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from app.utils.metrics import Histogram, Metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0, float('inf')))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 3, 4]
+    assert (histogram.count, histogram.sum) == (4, pytest.approx(3.65))
+    assert (histogram.quantile(0.5), histogram.quantile(0.75), histogram.quantile(1.0)) == (0.1, 1.0, float('inf'))
+    assert histogram.to_dict()["buckets"] == {"0.1": 2, "1.0": 3, "+Inf": 4}
+    assert Histogram().quantile(0.5) is None
+
+
+def test_track_call_records_latency_tokens_and_errors():
+    metrics = Metrics()
+    with metrics.track_call('OpenAPIClient', 'gpt-4o') as call:
+        call.usage(prompt_tokens=100, completion_tokens=20, cached_tokens=75)
+    with pytest.raises(RuntimeError):
+        with metrics.track_call('OpenAPIClient', 'gpt-4o'):
+            raise RuntimeError("timeout")
+    assert metrics.counter_value('requests', provider='OpenAPIClient', model='gpt-4o') == 2
+    assert metrics.counter_value('request_errors', provider='OpenAPIClient', model='gpt-4o') == 1
+    assert metrics.token_usage() == {"prompt": 100, "completion": 20, "cached": 75, "cached_ratio": 0.75}
+    [latency] = metrics.report()["histograms"]["request_latency_seconds"]
+    assert latency["count"] == 2 and latency["labels"] == {"model": "gpt-4o", "provider": "OpenAPIClient"}
+
+
+def test_openmetrics_exposition():
+    metrics = Metrics()
+    metrics.inc('retries', provider='Gemini "pro"\n')
+    metrics.inc('stage_seconds', 1.5, stage='grading')
+    metrics.observe('request_latency_seconds', 0.2, provider='OllamaClient')
+    lines = metrics.to_openmetrics().splitlines()
+    assert lines == [
+        '# TYPE grading_retries counter',
+        'grading_retries_total{provider="Gemini \\"pro\\"\\n"} 1',
+        '# TYPE grading_stage_seconds counter',
+        'grading_stage_seconds_total{stage="grading"} 1.5',
+        '# TYPE grading_request_latency_seconds histogram',
+        *[f'grading_request_latency_seconds_bucket{{provider="OllamaClient",le="{bound}"}} {count}'
+          for bound, count in [("0.05", 0), ("0.1", 0), ("0.25", 1), ("0.5", 1), ("1.0", 1), ("2.5", 1),
+                               ("5.0", 1), ("10.0", 1), ("30.0", 1), ("60.0", 1), ("+Inf", 1)]],
+        'grading_request_latency_seconds_count{provider="OllamaClient"} 1',
+        'grading_request_latency_seconds_sum{provider="OllamaClient"} 0.2',
+        '# EOF',
+    ]
+
+
+def test_run_report_files(tmp_path, capsys):
+    metrics = Metrics()
+    with metrics.stage('export'):
+        pass
+    json_path, prom_path = metrics.write(save_path=str(tmp_path))
+    with open(json_path) as f:
+        assert [counter["labels"] for counter in json.load(f)["counters"]["stage_seconds"]] == [{"stage": "export"}]
+    assert prom_path.read_text().endswith("# EOF\n")
+    metrics.reset()
+    assert metrics.report()["counters"] == {}
@@ -0,0 +1,75 @@
+import asyncio
+import shutil
+from collections import deque
+
+from app.models.answer_key import AnswerKey
+from app.models.schemas import EvaluationResponse
+from app.services.clustering_service import AnswerClusterer
+from app.services.EvaluationFlowService import EvaluationFlowService
+from app.services.manifest_service import RunManifest
+from app.services.evaluation_service import _round_robin, evaluate_assignments_async
+from app.services.MultiAssignmentFlowService import MultiAssignmentFlowService, discover_assignments
+
+
+class _Client:
+    def __init__(self):
+        self.questions = []
+
+    async def evaluate_async(self, question, model, student):
+        self.questions.append(question)
+        return EvaluationResponse(grade="Fail", explanation="Graded.")
+
+
+def _assignment(name, students):
+    answer_key = AnswerKey.from_records(
+        [{"question_id": 1, "question_text": name, "answer_text": f"{name} answer"}])
+    return answer_key, {f"s{n}": [{"question_id": 1, "student_answer": f"guess {n}"}] for n in range(students)}
+
+
+def test_only_folders_with_submissions_are_discovered(tmp_path):
+    for name in ("b", "a", "notes"):
+        (tmp_path / name).mkdir()
+    (tmp_path / "b" / "submissions").mkdir()
+    (tmp_path / "a" / "submissions").mkdir()
+    (tmp_path / "file.txt").write_text("", encoding='utf-8')
+    assert discover_assignments(tmp_path) == [str(tmp_path / "a"), str(tmp_path / "b")]
+
+
+def test_round_robin_interleaves_until_every_queue_drains():
+    queues = [deque([1, 2, 3]), deque(), deque(["a"]), deque(["x", "y"])]
+    assert list(_round_robin(queues)) == [1, "a", "x", 2, "y", 3]
+
+
+def test_assignments_share_one_fair_queue():
+    client = _Client()
+    assignments = {"big": _assignment("big", 4), "small": _assignment("small", 2)}
+    results = asyncio.run(evaluate_assignments_async(client, assignments, max_concurrency=1))
+    assert client.questions == ["big", "small", "big", "small", "big", "big"]
+    assert {name: len(students) for name, students in results.items()} == {"big": 4, "small": 2}
+
+
+def test_changing_the_clusterer_regrades_reused_results(tmp_path):
+    root = shutil.copytree('./data', tmp_path / 'data')
+
+    def run(clusterer):
+        flow = MultiAssignmentFlowService(save_path=str(tmp_path / 'target'))
+        flow.retrieve_data(root)
+        flow.evaluate_data(_Client(), max_concurrency=2, incremental=True, clusterer=clusterer)
+        flow.export_data()
+        return {name: manifest.report() for name, manifest in flow.manifests.items()}
+
+    run(None)
+    assert all(report["regraded"] == 0 for report in run(None).values())
+    assert all(report["carried_over"] == 0 for report in run(AnswerClusterer()).values())
+    assert all(report["regraded"] == 0 for report in run(AnswerClusterer()).values())
+
+
+def test_single_assignment_manifest_is_keyed_on_the_clusterer(tmp_path):
+    flow = EvaluationFlowService()
+    flow.retrieve_data('./data/Capture Me')
+    configs = []
+    for clusterer in (None, AnswerClusterer()):
+        manifest = RunManifest(str(tmp_path / 'evaluation_results.json'))
+        flow._prepare_manifest(_Client(), manifest, clusterer=clusterer)
+        configs.append(manifest.current["config"])
+    assert configs[0] != configs[1]
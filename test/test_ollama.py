@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from app.clients.OllamaClient import OllamaClient, OllamaError
+from app.clients.RateLimitedClient import RateLimitedClient, estimate_tokens
+from app.clients.transport import SharedTransport
+from app.models.answer_key import AnswerKey
+from app.services.evaluation_service import evaluate_all_students_async
+from benchmarks.ollama_stub import OllamaStubServer
+
+ANSWER_KEY = AnswerKey.from_records([
+    {"question_id": 1, "question_text": "Which RFC defines ICMP?", "answer_text": "RFC 792"},
+    {"question_id": 2, "question_text": "How many bits is the checksum?", "answer_text": "16"},
+])
+STUDENT_ANSWERS = {"s0": [{"question_id": 1, "student_answer": "RFC 792"}, {"question_id": 2, "student_answer": "8"}]}
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = OllamaStubServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    transport = SharedTransport()
+    yield OllamaClient(host=server.url, transport=transport)
+    transport.close()
+
+
+def test_load_and_unload_keep_the_model_resident(server, client):
+    client.load()
+    assert server.loaded == {"llama3.1:8b"}
+    client.unload()
+    assert server.loaded == set()
+
+
+def test_evaluate(client):
+    assert client.evaluate("Q", "RFC 792", "rfc 792").grade == "Pass"
+    assert client.evaluate("Q", "RFC 792", "RFC 793").grade == "Fail"
+
+
+def test_evaluate_async_through_the_engine(server, client):
+    async def run():
+        try:
+            return await evaluate_all_students_async(client, ANSWER_KEY, STUDENT_ANSWERS, max_concurrency=2)
+        finally:
+            await client._transport.aclose()
+
+    requests = server.requests
+    results = asyncio.run(run())
+    assert [item["evaluation"]["grade"] for item in results[0]["evaluations"]] == ["Pass", "Fail"]
+    assert server.requests - requests == 2
+
+
+def test_evaluation_review(client):
+    assert client.evaluation_review("Q", "16", "16", {"grade": "Pass", "explanation": "e"}).agree
+    review = asyncio.run(client.evaluation_review_async("Q", "16", "8", {"grade": "Pass", "explanation": "e"}))
+    assert not review.agree
+
+
+def test_server_errors_carry_their_status(server):
+    transport = SharedTransport()
+    try:
+        with pytest.raises(OllamaError) as error:
+            OllamaClient(host=f"{server.url}/missing", transport=transport).evaluate("Q", "A", "a")
+        assert error.value.status_code == 404
+    finally:
+        transport.close()
+
+
+def test_token_estimates_include_the_completion_budget(client):
+    prompt = client.format_prompt("Q", "A", "a")
+    estimate = RateLimitedClient(client)._estimate('evaluate', ("Q", "A", "a"))
+    assert estimate == estimate_tokens(prompt) + client.get_config()['num_predict']
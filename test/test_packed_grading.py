@@ -0,0 +1,89 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.clients.OpenAPIClient import OpenAPIClient
+from app.models.answer_key import AnswerKey
+from app.models.schemas import EvaluationResponse
+from app.services.evaluation_service import evaluate_all_students, evaluate_all_students_async
+
+ANSWER_KEY = AnswerKey.from_records(
+    {"question_id": question_id, "question_text": f"Question {question_id}", "answer_text": f"Answer {question_id}"}
+    for question_id in range(1, 6))
+STUDENT_ANSWERS = {"s0": [{"question_id": question_id, "student_answer": f"guess {question_id}"}
+                          for question_id in range(1, 6)]}
+ITEMS = [(1, "Q1", "A1", "a1"), (2, "Q2", "A2", "a2")]
+
+
+def _response(content, finish_reason='stop'):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content),
+                                                    finish_reason=finish_reason)])
+
+
+def _packed(*question_ids):
+    return json.dumps({"evaluations": [{"question_id": question_id, "grade": "Pass", "explanation": "ok"}
+                                       for question_id in question_ids]})
+
+
+class _SplittingClient:
+    """ Packed client whose packs of more than `max_pack` answers come back unusable. """
+    def __init__(self, max_pack=2):
+        self.max_pack = max_pack
+        self.packs = []
+        self.single = []
+
+    def _grade(self, student):
+        return EvaluationResponse(grade="Fail", explanation=f"graded {student}")
+
+    def evaluate(self, question, model, student):
+        self.single.append(student)
+        return self._grade(student)
+
+    def evaluate_packed(self, items):
+        if len(items) > self.max_pack:
+            raise ValueError("Packed evaluation response was truncated.")
+        self.packs.append(len(items))
+        return [self._grade(student) for _, _, _, student in items]
+
+    async def evaluate_async(self, question, model, student):
+        return self.evaluate(question, model, student)
+
+    async def evaluate_packed_async(self, items):
+        return self.evaluate_packed(items)
+
+
+def test_parse_packed_keeps_item_order():
+    evaluations = OpenAPIClient._parse_packed_evaluation(_response(_packed(2, 1)), ITEMS)
+    assert [evaluation.grade for evaluation in evaluations] == ["Pass", "Pass"]
+
+
+@pytest.mark.parametrize("response", [
+    _response(_packed(1, 2), finish_reason='length'),
+    _response(_packed(1)),
+    _response("not json"),
+    SimpleNamespace(choices=[]),
+])
+def test_parse_packed_rejects_unusable_responses(response):
+    with pytest.raises(ValueError):
+        OpenAPIClient._parse_packed_evaluation(response, ITEMS)
+
+
+def _explanations(results):
+    return [item["evaluation"]["explanation"] for item in results[0]["evaluations"]]
+
+
+def test_failed_packs_are_split_until_they_parse():
+    client = _SplittingClient(max_pack=2)
+    results = evaluate_all_students(client, ANSWER_KEY, STUDENT_ANSWERS, pack_size=5)
+    assert _explanations(results) == [f"graded guess {question_id}" for question_id in range(1, 6)]
+    assert sorted(client.packs) == [2, 2]
+    assert client.single == ["guess 3"]
+
+
+def test_failed_packs_fall_back_to_single_answers_async():
+    client = _SplittingClient(max_pack=1)
+    results = asyncio.run(evaluate_all_students_async(client, ANSWER_KEY, STUDENT_ANSWERS, pack_size=5))
+    assert _explanations(results) == [f"graded guess {question_id}" for question_id in range(1, 6)]
+    assert sorted(client.single) == [f"guess {question_id}" for question_id in range(1, 6)]
@@ -0,0 +1,68 @@
+import pytest
+
+from app.services.pre_grading_service import PreGrader
+from app.utils.normalization import canonical_form, canonical_number, canonical_tokens, normalize_answer
+
+
+@pytest.mark.parametrize("model, student", [
+    ("192.168.1.3", "192.168.1.30"),
+    ("10.0.0.1", "10.0.0.10"),
+    ("Version 2.10", "Version 2.1"),
+    ("5", "-5"),
+    ("C++", "C"),
+    ("C#", "C"),
+    ("C", "C#"),
+])
+def test_different_answers_are_never_passed(model, student):
+    result = PreGrader().grade(1, model, student)
+    assert result is None or result[0].grade == "Fail"
+
+
+@pytest.mark.parametrize("model, student, stage", [
+    ("192.168.1.3", "192.168.1.3.", "exact"),
+    ("RFC 792", "rfc0792", "numeric"),
+    ("RFC 792", "RFC-792", "exact"),
+    ("87, 134, 135", "135, 134 and 87", "set"),
+    ("0.5", ".5", "numeric"),
+    ("C++", "c++.", "exact"),
+])
+def test_equivalent_answers_pass(model, student, stage):
+    evaluation, result_stage = PreGrader().grade(1, model, student)
+    assert evaluation.grade == "Pass"
+    assert result_stage == stage
+
+
+@pytest.mark.parametrize("model, student", [
+    ("3", "3.0"),
+    ("0.5", "0.50"),
+    ("2.1", "2.10"),
+    ("1, 2", "2.0, 1"),
+])
+def test_equal_values_written_differently_are_left_to_the_llm(model, student):
+    assert PreGrader().grade(1, model, student) is None
+
+
+def test_symbols_stay_significant_for_clustering_and_semantic_keys():
+    assert normalize_answer("C++") != normalize_answer("C") != normalize_answer("C#")
+    assert canonical_form("C++, Java") != canonical_form("C, Java")
+    assert normalize_answer(".NET") == ".net"
+
+
+def test_differing_numbers_fail():
+    evaluation, stage = PreGrader().grade(1, "16", "-16")
+    assert evaluation.grade == "Fail"
+    assert stage == "numeric"
+
+
+def test_dotted_groups_are_one_token():
+    assert canonical_tokens("The host is 192.168.1.3.") == ["the", "host", "is", "192.168.1.3"]
+    assert canonical_tokens("RFC-792") == ["rfc", "792"]
+
+
+def test_canonical_number_only_strips_leading_zeros_and_plus():
+    assert canonical_number("0792") == "792"
+    assert canonical_number("+5") == "5"
+    assert canonical_number(".5") == "0.5"
+    assert canonical_number("-5") == "-5"
+    assert canonical_number("2.10") == "2.10"
+    assert canonical_number("192.168.001.3") == "192.168.001.3"
@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import pytest
+
+import main
+from app.clients.ProviderRouter import ProviderRouter
+from app.clients.RateLimitedClient import RateLimitedClient
+
+
+class _Client:
+    """ Fake provider answering with its name after `delay` seconds, or failing. """
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def get_model(self):
+        return self.name
+
+    def _answer(self):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        return self.name
+
+    def evaluate(self, question, model, student):
+        time.sleep(self.delay)
+        return self._answer()
+
+    async def evaluate_async(self, question, model, student):
+        await asyncio.sleep(self.delay)
+        return self._answer()
+
+
+class _AsyncOnlyClient:
+    async def evaluate_async(self, question, model, student):
+        return "async"
+
+
+def test_fails_over_to_the_next_provider():
+    down, up = _Client("down", fail=True), _Client("up")
+    router = ProviderRouter([down, up])
+    assert router.evaluate("Q", "A", "a") == "up"
+    assert asyncio.run(router.evaluate_async("Q", "A", "a")) == "up"
+    assert router.report()["_Client:down"]["failures"] == 1
+
+
+def test_raises_the_last_error_when_every_provider_fails():
+    router = ProviderRouter([_Client("a", fail=True), _Client("b", fail=True)])
+    with pytest.raises(RuntimeError, match="b is down"):
+        router.evaluate("Q", "A", "a")
+
+
+def test_healthiest_provider_is_ranked_first():
+    slow, fast = _Client("slow"), _Client("fast")
+    router = ProviderRouter([slow, fast])
+    for _ in range(3):
+        router.stats[id(slow)].record(latency=1.0)
+        router.stats[id(fast)].record(latency=0.1)
+    assert router.evaluate("Q", "A", "a") == "fast"
+
+
+def test_failed_provider_is_probed_again_once_it_recovers():
+    flaky, steady = _Client("flaky", fail=True), _Client("steady")
+    router = ProviderRouter([flaky, steady], recovery=0.01)
+    assert router.evaluate("Q", "A", "a") == "steady"
+    assert router._ranked('evaluate')[0] is steady
+    time.sleep(0.2)
+    flaky.fail = False
+    assert router.evaluate("Q", "A", "a") == "flaky"
+
+
+def test_async_only_clients_are_routed_for_async_requests():
+    router = ProviderRouter([_AsyncOnlyClient()])
+    assert asyncio.run(router.evaluate_async("Q", "A", "a")) == "async"
+    with pytest.raises(AttributeError):
+        router.evaluate("Q", "A", "a")
+
+
+def test_hedged_request_returns_the_first_answer():
+    slow, fast = _Client("slow", delay=0.5), _Client("fast")
+    router = ProviderRouter([slow, fast], hedge=True, default_hedge_delay=0.01)
+    try:
+        started = time.monotonic()
+        assert router.evaluate("Q", "A", "a") == "fast"
+        assert time.monotonic() - started < 0.4
+    finally:
+        router.close()
+
+
+def test_losing_hedge_is_cancelled_and_gives_its_slot_back():
+    slow = RateLimitedClient(_Client("slow", delay=10), max_concurrency=1)
+    router = ProviderRouter([slow, _Client("fast")], hedge=True, default_hedge_delay=0.01)
+
+    async def run():
+        answer = await router.evaluate_async("Q", "A", "a")
+        return answer, slow.concurrency.in_flight
+
+    assert asyncio.run(run()) == ("fast", 0)
+    assert router.report()["_Client:slow"]["failures"] == 0
+    router.close()
+
+
+def test_cli_fallback_providers_are_routed(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+    parser = main.argparse.ArgumentParser()
+    main.add_client_arguments(parser)
+    args = parser.parse_args(['--fallback-provider', 'gemini', '--hedge'])
+    client = main.build_client(args)
+    assert isinstance(client, ProviderRouter) and client.hedge
+    assert [type(provider.__wrapped__).__name__ for provider in client.clients] == ["OpenAPIClient", "GeminiClient"]
+    assert main.client_arguments(args)[-3:] == ['--fallback-provider', 'gemini', '--hedge']
+    client.close()
@@ -0,0 +1,90 @@
+import asyncio
+
+import main
+from app.clients.CascadeClient import CascadeClient
+from app.clients.RateLimitedClient import RateLimitedClient
+
+
+class _RateLimitError(Exception):
+    status_code = 429
+
+
+class _FlakyClient:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    async def evaluate_async(self, question, model, student):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise _RateLimitError()
+        return "graded"
+
+
+def test_rate_limited_client_retries_rate_limits():
+    flaky = _FlakyClient(failures=2)
+    client = RateLimitedClient(flaky, base_delay=0.001, max_delay=0.01)
+    assert asyncio.run(client.evaluate_async("Q", "A", "a")) == "graded"
+    assert client.retries == 2
+
+
+def _args(*argv):
+    parser = main.argparse.ArgumentParser()
+    main.add_client_arguments(parser)
+    return parser.parse_args(list(argv))
+
+
+def test_cli_clients_are_rate_limited_without_sdk_retries(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    client = main.build_client(_args('--requests-per-minute', '60', '--request-concurrency', '4'))
+    assert isinstance(client, RateLimitedClient)
+    assert client.concurrency.max_limit == 4
+    assert client.__wrapped__._client.max_retries == 0
+
+
+def test_cascade_tiers_are_rate_limited_separately(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    client = main.build_client(_args('--cascade'))
+    assert isinstance(client, CascadeClient)
+    assert all(isinstance(tier, RateLimitedClient) for tier in client.tiers)
+    assert client.get_model() == "gpt-4o-mini > gpt-4o"
+
+
+class _SlowClient:
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def evaluate_async(self, question, model, student):
+        await asyncio.sleep(self.delay)
+        return student
+
+
+def test_cancelled_calls_give_their_slot_back():
+    client = RateLimitedClient(_SlowClient(10), max_concurrency=2)
+
+    async def run():
+        calls = [asyncio.create_task(client.evaluate_async("Q", "A", str(n))) for n in range(2)]
+        await asyncio.sleep(0.01)
+        assert client.concurrency.in_flight == 2
+        for call in calls:
+            call.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+        assert client.concurrency.in_flight == 0
+        client.__wrapped__.delay = 0
+        return await asyncio.wait_for(client.evaluate_async("Q", "A", "after"), timeout=1)
+
+    assert asyncio.run(run()) == "after"
+
+
+def test_waiters_are_woken_when_a_slot_frees():
+    client = RateLimitedClient(_SlowClient(0.02), max_concurrency=1)
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        results = await asyncio.gather(*(client.evaluate_async("Q", "A", str(n)) for n in range(5)))
+        return results, asyncio.get_running_loop().time() - started
+
+    results, elapsed = asyncio.run(run())
+    assert results == [str(n) for n in range(5)]
+    assert client.concurrency.in_flight == 0
+    assert elapsed < 0.2
@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+from app.models.answer_key import AnswerKey
+from app.models.schemas import EvaluationResponse
+from app.services.evaluation_service import evaluate_all_students_async
+from app.services.result_sink_service import ResultSink
+
+ANSWER_KEY = AnswerKey.from_records([
+    {"question_id": 1, "question_text": "Which port does SSH use?", "answer_text": "22"},
+    {"question_id": 2, "question_text": "Which RFC defines ICMP?", "answer_text": "RFC 792"},
+])
+
+
+def _student_answers(count):
+    return [(f"s{number}", [{"question_id": 1, "student_answer": f"answer {number}"},
+                            {"question_id": 2, "student_answer": f"rfc {number}"}])
+            for number in range(count)]
+
+
+class _ReversedClient:
+    """ Async client whose later students finish first, so completion order is the reverse of input order. """
+    def __init__(self, count, fail_student=None):
+        self.count = count
+        self.fail_student = fail_student
+        self.calls = 0
+
+    async def evaluate_async(self, question, model, student):
+        number = int(student.split()[-1])
+        if number == self.fail_student:
+            raise RuntimeError("connection lost")
+        await asyncio.sleep(0.002 * (self.count - number))
+        self.calls += 1
+        return EvaluationResponse(grade="Fail", explanation=f"graded {student}")
+
+
+def _compact(sink, tmp_path):
+    try:
+        return sink.compact(tmp_path / "evaluation_results.json")
+    finally:
+        sink.close()
+
+
+def test_compact_keeps_input_order(tmp_path):
+    sink = ResultSink(tmp_path / "results.jsonl", fsync_interval=0)
+    asyncio.run(evaluate_all_students_async(_ReversedClient(6), ANSWER_KEY, _student_answers(6), sink=sink))
+    with open(sink.path, encoding='utf-8') as f:
+        logged = [json.loads(line)["student"] for line in f]
+    assert logged[0] != "s0"
+    results = _compact(sink, tmp_path)
+    assert [result["student"] for result in results] == [f"s{number}" for number in range(6)]
+    assert all([item["question_id"] for item in result["evaluations"]] == [1, 2] for result in results)
+
+
+def test_resume_skips_graded_answers_and_keeps_order(tmp_path):
+    path = tmp_path / "results.jsonl"
+    sink = ResultSink(path, fsync_interval=0)
+    try:
+        asyncio.run(evaluate_all_students_async(_ReversedClient(6, fail_student=2), ANSWER_KEY,
+                                                _student_answers(6), sink=sink))
+    except RuntimeError:
+        pass
+    sink.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        # A line torn by a crash mid-write
+        f.write('{"student": "s9", "ord')
+
+    resumed = ResultSink(path, fsync_interval=0, resume=True)
+    client = _ReversedClient(6)
+    asyncio.run(evaluate_all_students_async(client, ANSWER_KEY, _student_answers(6), sink=resumed))
+    assert resumed.skipped == 12 - client.calls
+    assert client.calls >= 2
+    results = _compact(resumed, tmp_path)
+    assert [result["student"] for result in results] == [f"s{number}" for number in range(6)]
+    assert sum(len(result["evaluations"]) for result in results) == 12
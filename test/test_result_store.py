@@ -0,0 +1,65 @@
+import copy
+import json
+
+import pytest
+
+from app.services.result_store_service import ResultStore
+
+
+def _item(question_id, student_answer, grade, **evaluation):
+    return {"question_id": question_id, "question_text": f"Question {question_id}",
+            "model_answer": f"Answer {question_id}", "student_answer": student_answer,
+            "evaluation": {"grade": grade, "explanation": "e", "stage": "llm", **evaluation}}
+
+
+RESULTS = [
+    {"student": "s1", "evaluations": [_item(2, "b", "Fail"), _item(1, "a", "Pass", confidence=0.9, tier="gpt-4o")]},
+    {"student": "s0", "evaluations": [_item(1, "x", "Fail"), _item(10, "y", "Pass")]},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(tmp_path / 'results.sqlite')
+    yield store
+    store.close()
+
+
+def test_results_round_trip_in_order(store, tmp_path):
+    assert store.write("r1", "hw", RESULTS) == 4
+    assert store.results("r1", "hw") == RESULTS
+    exported = store.export_json("r1", "hw", save_path=str(tmp_path))
+    with open(tmp_path / 'evaluation_results.json', encoding='utf-8') as f:
+        assert json.load(f) == exported == RESULTS
+
+
+def test_rewriting_a_run_replaces_its_rows(store):
+    store.write("r1", "hw", RESULTS)
+    store.write("r1", "hw", RESULTS)
+    assert store.results("r1", "hw") == RESULTS
+    assert [run["run"] for run in store.runs()] == ["r1"]
+
+
+def test_pass_rates_per_question(store):
+    store.write("r1", "hw", RESULTS)
+    rates = {row["question_id"]: (row["answers"], row["passed"]) for row in store.pass_rates("hw")}
+    assert list(rates) == ["1", "2", "10"]
+    assert rates == {"1": (2, 1), "2": (1, 0), "10": (1, 1)}
+
+
+def test_diff_runs_lists_changed_and_added_answers(store):
+    store.write("r1", "hw", RESULTS)
+    changed = copy.deepcopy(RESULTS)
+    changed[0]["evaluations"][0]["evaluation"]["grade"] = "Pass"
+    changed[1]["evaluations"].append(_item(3, "z", "Fail"))
+    store.write("r2", "hw", changed)
+    diff = {(row["student"], row["question_id"]): (row["grade_a"], row["grade_b"]) for row in store.diff_runs("r1", "r2")}
+    assert diff == {("s1", "2"): ("Fail", "Pass"), ("s0", "3"): (None, "Fail")}
+    assert store.diff_runs("r1", "r1") == []
+
+
+def test_student_history_across_runs(store):
+    store.write("r1", "hw", RESULTS)
+    store.write("r2", "hw", RESULTS)
+    history = store.student_history("s0")
+    assert [(row["run"], row["question_id"]) for row in history] == [("r1", "1"), ("r1", "10"), ("r2", "1"), ("r2", "10")]
@@ -0,0 +1,61 @@
+from app.models.schemas import ReviewResponse
+from app.services.evaluation_service import _selected_for_review, evaluate_all_evaluations
+
+
+class _Reviewer:
+    def __init__(self):
+        self.reviewed = []
+
+    def evaluation_review(self, question, model, student, evaluation):
+        self.reviewed.append(student)
+        return ReviewResponse(agree=True, reason="Consistent with the model answer.")
+
+
+def _results():
+    grades = [("sure", 0.95, "llm"), ("unsure", 0.55, "llm"), ("unknown", None, "llm"), ("exact", None, "exact")]
+    return [{"student": student, "evaluations": [{
+        "question_id": 1, "question_text": "Q", "model_answer": "A", "student_answer": student,
+        "evaluation": {"grade": "Pass", "explanation": "e", "stage": stage,
+                       **({"confidence": confidence} if confidence is not None else {})}}]}
+        for student, confidence, stage in grades]
+
+
+def test_only_low_confidence_grades_are_reviewed():
+    reviewer = _Reviewer()
+    results = evaluate_all_evaluations(reviewer, _results(), sample_rate=0, confidence_below=0.7)
+    assert reviewer.reviewed == ["unsure"]
+    assert results[1]["evaluations"][0]["evaluation"]["review"]["agree"] is True
+    assert "review" not in results[0]["evaluations"][0]["evaluation"]
+
+
+def test_low_confidence_grades_are_added_to_the_sample():
+    reviewer = _Reviewer()
+    evaluate_all_evaluations(reviewer, _results(), sample_rate=1.0, stages=('llm',), confidence_below=0.7)
+    assert reviewer.reviewed == ["sure", "unsure", "unknown"]
+
+
+def _item(question_id, stage="llm"):
+    return {"question_id": question_id, "evaluation": {"grade": "Pass", "explanation": "e", "stage": stage}}
+
+
+def test_sampling_is_deterministic_per_seed():
+    items = [(f"s{n}", _item(q)) for n in range(200) for q in range(5)]
+
+    def picked(sample_rate, seed):
+        return {(student, item["question_id"]) for student, item in items
+                if _selected_for_review(student, item, sample_rate, None, seed)}
+
+    sample = picked(0.1, seed=0)
+    assert picked(0.1, seed=0) == sample
+    assert 60 < len(sample) < 140
+    assert picked(0.1, seed=1) != sample
+    # A larger sample keeps every item of a smaller one, so their cached reviews are reused
+    assert sample <= picked(0.3, seed=0)
+
+
+def test_only_the_given_stages_are_reviewed():
+    assert _selected_for_review("s", _item(1, "llm"), 1.0, ("llm",), 0)
+    assert not _selected_for_review("s", _item(1, "exact"), 1.0, ("llm",), 0)
+    assert _selected_for_review("s", _item(1, "exact"), 1.0, None, 0)
+    assert not _selected_for_review("s", {"question_id": 1}, 1.0, None, 0)
+    assert not _selected_for_review("s", _item(1), 0, None, 0)
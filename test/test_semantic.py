@@ -0,0 +1,37 @@
+import numpy as np
+
+from app.services.semantic_service import HashingEmbedder, SemanticGrader
+
+
+class _Embedder:
+    """ Embedder of meaning that maps every text to the same vector. """
+    semantic = True
+    name = 'constant'
+    dim = 2
+
+    def embed(self, texts):
+        return np.tile(np.asarray([1.0, 0.0], dtype=np.float32), (len(texts), 1))
+
+
+_NEGATED = {"question_id": 1, "model_answer": "The handshake was completed successfully.",
+            "student_answer": "The handshake was not completed successfully."}
+
+
+def test_hashing_embedder_never_passes_answers(tmp_path):
+    grader = SemanticGrader(tmp_path, embedder=HashingEmbedder())
+    assert grader.pass_threshold is None
+    assert grader.grade([_NEGATED]) == [None]
+
+
+def test_semantic_embedder_passes_similar_answers(tmp_path):
+    grader = SemanticGrader(tmp_path, embedder=_Embedder())
+    evaluation, = grader.grade([_NEGATED])
+    assert evaluation.grade == "Pass"
+
+
+def test_index_is_kept_per_assignment(tmp_path):
+    grader = SemanticGrader(tmp_path, embedder=_Embedder(), assignment='hw1')
+    grader.embed(["an answer"])
+    grader.use_assignment('hw2')
+    assert len(grader.index) == 0
+    assert (tmp_path / 'hw1' / 'constant' / 'keys.txt').exists()
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import warnings
+
+import pytest
+
+from app.clients.OpenAPIClient import OpenAPIClient
+from app.clients.transport import SharedTransport
+from benchmarks.ollama_stub import OllamaStubServer
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = OllamaStubServer().start()
+    yield server
+    server.stop()
+
+
+async def _request(transport, url):
+    client = transport.async_client()
+    assert transport.async_client() is client
+    assert (await client.get(f"{url}/api/tags")).status_code == 200
+    return client
+
+
+def test_async_client_is_reused_within_a_loop_and_closed_with_it(server):
+    transport = SharedTransport()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', ResourceWarning)
+        first = asyncio.run(_request(transport, server.url))
+        assert first.is_closed
+        second = asyncio.run(_request(transport, server.url))
+    assert second is not first and second.is_closed
+    transport.close()
+
+
+def test_close_closes_the_client_of_a_running_loop(server):
+    transport = SharedTransport()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        client = asyncio.run_coroutine_threadsafe(_request(transport, server.url), loop).result(timeout=5)
+        transport.close()
+        assert client.is_closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def test_close_from_within_the_loop(server):
+    transport = SharedTransport()
+
+    async def run():
+        client = await _request(transport, server.url)
+        transport.close()
+        await transport._closing
+        return client
+
+    assert asyncio.run(run()).is_closed
+
+
+def test_sdk_client_follows_the_loop():
+    transport = SharedTransport()
+    client = OpenAPIClient('gpt-4o', 'test-key', transport=transport)
+
+    async def sdk():
+        sdk_client = client._async_client
+        assert client._async_client is sdk_client
+        return sdk_client, transport.async_client()
+
+    first, first_http = asyncio.run(sdk())
+    second, second_http = asyncio.run(sdk())
+    assert second is not first and second_http is not first_http
+    assert first_http.is_closed and second_http.is_closed
+    assert client._client is not None and transport.client() is transport.client()
+    transport.close()
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from app.services.work_queue_service import DONE, FAILED, LEASED, PENDING, WorkQueue
+
+
+def _item(question_id, evaluation=None):
+    item = {"question_id": question_id, "question_text": "Q", "model_answer": "A", "student_answer": "a"}
+    if evaluation is not None:
+        item["evaluation"] = evaluation
+    return item
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite", lease_seconds=60, max_attempts=2, retry_delay=0)
+    yield queue
+    queue.close()
+
+
+def _expire_leases(queue):
+    with queue._lock:
+        queue._conn.execute("UPDATE tasks SET lease_expires = 0 WHERE state = ?", (LEASED,))
+
+
+def test_enqueue_is_idempotent_and_keeps_pre_graded_answers_done(queue):
+    tasks = [("s0", 0, _item(1)), ("s0", 1, _item(2, {"grade": "Pass"}))]
+    assert queue.enqueue("run", "hw", tasks) == 2
+    assert queue.enqueue("run", "hw", tasks) == 0
+    assert queue.counts("run") == {PENDING: 1, DONE: 1}
+
+
+def test_expired_leases_are_handed_out_again(queue):
+    queue.enqueue("run", "hw", [("s0", 0, _item(1))])
+    assert len(queue.lease("w1")) == 1
+    assert queue.lease("w2") == []
+    _expire_leases(queue)
+    assert [item["question_id"] for _, item in queue.lease("w2")] == [1]
+
+
+def test_expired_leases_stop_at_max_attempts(queue):
+    queue.enqueue("run", "hw", [("s0", 0, _item(1))])
+    for _ in range(2):
+        assert len(queue.lease("w1")) == 1
+        _expire_leases(queue)
+    assert queue.lease("w1") == []
+    assert queue.counts("run") == {FAILED: 1}
+    assert queue.remaining("run") == 0
+
+
+def test_released_tasks_back_off_before_the_next_lease(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite", max_attempts=3, retry_delay=0.2)
+    queue.enqueue("run", "hw", [("s0", 0, _item(1))])
+    (task_id, _), = queue.lease("w1")
+    queue.release("w1", [task_id], "boom")
+    assert queue.lease("w1") == []
+    assert queue.remaining("run") == 1
+    time.sleep(0.25)
+    assert len(queue.lease("w1")) == 1
+    queue.close()
+
+
+def test_release_after_max_attempts_fails_the_task(queue):
+    queue.enqueue("run", "hw", [("s0", 0, _item(1))])
+    for _ in range(2):
+        (task_id, _), = queue.lease("w1")
+        queue.release("w1", [task_id], "boom")
+    assert queue.counts("run") == {FAILED: 1}
+
+
+def test_complete_keeps_the_first_result(queue):
+    queue.enqueue("run", "hw", [("s0", 0, _item(1)), ("s1", 0, _item(1))])
+    (first, _), (second, _) = queue.lease("w1")
+    assert queue.complete([(first, {"grade": "Pass"})]) == 1
+    assert queue.complete([(first, {"grade": "Fail"})]) == 0
+    assert queue.complete([(second, {"grade": "Fail"})]) == 1
+    results = queue.results("run", "hw")
+    assert [(result["student"], result["evaluations"][0]["evaluation"]["grade"]) for result in results] == \
+        [("s0", "Pass"), ("s1", "Fail")]
@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+from dotenv import load_dotenv
+from app.clients.transport import shared_transport
+from app.services.evaluation_service import work_queue_async
+from app.services.GradingCache import GradingCache
+from app.services.work_queue_service import DEFAULT_LEASE_SECONDS, DEFAULT_RETRY_DELAY, WorkQueue, default_worker_id
+from main import add_client_arguments, build_client
+
+load_dotenv()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Grade tasks from a shared work queue until it is drained.')
+    parser.add_argument('--queue', required=True, help='work queue file shared with the other workers')
+    parser.add_argument('--run', help='only grade tasks of this run')
+    parser.add_argument('--worker-id', default=None, help='name of this worker in task leases')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='tasks leased at once (default: 4 x --max-concurrency)')
+    parser.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help='how long a leased task stays reserved without a heartbeat')
+    parser.add_argument('--retry-delay', type=float, default=DEFAULT_RETRY_DELAY,
+                        help='seconds before a failed task is retried, doubled on every attempt')
+    parser.add_argument('--wait', action='store_true', help='keep polling for new tasks once the queue is drained')
+    add_client_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    worker_id = args.worker_id or default_worker_id()
+    queue = WorkQueue(args.queue, lease_seconds=args.lease_seconds, retry_delay=args.retry_delay)
+    client = build_client(args)
+    cache = GradingCache()
+    try:
+        committed = asyncio.run(work_queue_async(
+            client,
+            queue,
+            worker_id,
+            run=args.run,
+            max_concurrency=args.max_concurrency,
+            batch_size=args.batch_size,
+            cache=cache,
+            wait=args.wait
+        ))
+        print(f"Worker {worker_id} committed {committed} results: {queue.counts(args.run)}")
+    finally:
+        cache.close()
+        queue.close()
+        shared_transport().close()
+
+
+if __name__ == "__main__":
+    main()